@@ -2,6 +2,7 @@
 -- Replace DATABASE_NAME and TABLE_NAME with your actual database and table names
 
 -- 1. Get latest weather data
+-- Scans every partition; for current conditions per city read _index/latest.json (README "Latest Observations")
 SELECT *
 FROM weather_db_weatherpipelinestack.weather_data
 ORDER BY timestamp DESC
@@ -88,6 +89,8 @@ WHERE year = '2024'
 ORDER BY timestamp;
 
 -- 8. Partition information (verify partitions are working)
+-- Only lists catalog-registered partitions (cdk deploy -c partition_registration=glue);
+-- with the default partition projection the list is empty and pruning still works.
 SHOW PARTITIONS weather_db_weatherpipelinestack.weather_data;
 
 -- 9. Table schema verification
@@ -105,3 +108,63 @@ GROUP BY year, month, day, hour
 ORDER BY year DESC, month DESC, day DESC, hour DESC
 LIMIT 100;
 
+-- Rollup tables (weather_hourly_rollup, weather_daily_rollup)
+-- One row per city per hour/day, maintained after each hourly compaction.
+-- The queries below answer the reports above from kilobytes of rollup data
+-- instead of the raw one-row-per-minute table. Averages over several rows are
+-- computed from the _sum and _count columns so they stay exact.
+
+-- 11. Average temperature by hour for today (rollup version of query 2)
+SELECT 
+    hour,
+    SUM(temperature_sum) / SUM(temperature_count) as avg_temperature,
+    MIN(temperature_min) as min_temperature,
+    MAX(temperature_max) as max_temperature,
+    SUM(record_count) as record_count
+FROM weather_db_weatherpipelinestack.weather_hourly_rollup
+WHERE year = CAST(YEAR(CURRENT_DATE) AS VARCHAR)
+  AND month = LPAD(CAST(MONTH(CURRENT_DATE) AS VARCHAR), 2, '0')
+  AND day = LPAD(CAST(DAY(CURRENT_DATE) AS VARCHAR), 2, '0')
+GROUP BY hour
+ORDER BY hour;
+
+-- 12. Weather statistics by day (rollup version of query 3)
+SELECT 
+    year,
+    month,
+    day,
+    SUM(temperature_sum) / SUM(temperature_count) as avg_temp,
+    SUM(humidity_sum) / SUM(humidity_count) as avg_humidity,
+    SUM(pressure_sum) / SUM(pressure_count) as avg_pressure,
+    SUM(wind_speed_sum) / SUM(wind_speed_count) as avg_wind_speed,
+    SUM(record_count) as record_count
+FROM weather_db_weatherpipelinestack.weather_daily_rollup
+GROUP BY year, month, day
+ORDER BY year DESC, month DESC, day DESC
+LIMIT 30;
+
+-- 13. Hottest and coldest days (rollup version of query 4)
+SELECT 
+    year,
+    month,
+    day,
+    MAX(temperature_max) as max_temp,
+    MIN(temperature_min) as min_temp,
+    SUM(temperature_sum) / SUM(temperature_count) as avg_temp
+FROM weather_db_weatherpipelinestack.weather_daily_rollup
+WHERE year = CAST(YEAR(CURRENT_DATE) AS VARCHAR)
+GROUP BY year, month, day
+ORDER BY max_temp DESC
+LIMIT 10;
+
+-- 14. Wind analysis (rollup version of query 6)
+SELECT 
+    hour,
+    SUM(wind_speed_sum) / SUM(wind_speed_count) as avg_wind_speed,
+    SUM(wind_deg_sum) / SUM(wind_deg_count) as avg_wind_direction,
+    MAX(wind_speed_max) as max_wind_speed
+FROM weather_db_weatherpipelinestack.weather_hourly_rollup
+WHERE year = CAST(YEAR(CURRENT_DATE) AS VARCHAR)
+  AND month = LPAD(CAST(MONTH(CURRENT_DATE) AS VARCHAR), 2, '0')
+GROUP BY hour
+ORDER BY hour;
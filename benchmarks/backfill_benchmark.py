@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the historical backfill
+
+Runs backfill.backfill against the local replay server (synthetic hourly
+archive arrays) and a filesystem S3 stand-in, reports throughput for a range
+of worker counts, re-runs the last configuration to show that completed chunks
+are skipped, and compares the columnar Arrow conversion with building one
+dictionary per row.
+
+Example:
+    python benchmarks/backfill_benchmark.py --locations 200 --days 30 --chunk day --workers 1,8,16
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import ReplayServer, make_locations
+from local_s3 import LocalS3Client
+
+BUCKET = 'weather-data'
+
+
+class SlowS3:
+    """Adds a fixed round trip to every PUT, like uploading to S3 instead of a local disk"""
+
+    def __init__(self, client: LocalS3Client, latency_ms: float):
+        self._client = client
+        self._latency = latency_ms / 1000
+
+    def put_object(self, **kwargs):
+        time.sleep(self._latency)
+        return self._client.put_object(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def compare_conversion(server: ReplayServer, locations: list, days: int) -> None:
+    from backfill import fetch_archive
+    from columnar import hourly_to_table
+    from utils import records_to_table
+    from wmo import WEATHER_DESCRIPTIONS, WEATHER_CATEGORIES, UNKNOWN_DESCRIPTION, OTHER_CATEGORY
+
+    start = date(2024, 1, 1)
+    responses = fetch_archive(locations, start, start + timedelta(days=days - 1), server.url)
+
+    started = time.perf_counter()
+    tables = [hourly_to_table(response, loc) for loc, response in zip(locations, responses)]
+    columnar_s = time.perf_counter() - started
+    rows = sum(table.num_rows for table in tables)
+
+    started = time.perf_counter()
+    records = []
+    for loc, response in zip(locations, responses):
+        hourly = response['hourly']
+        for i, timestamp in enumerate(hourly['time']):
+            code = hourly['weather_code'][i]
+            records.append({
+                'timestamp': timestamp, 'city': loc['city'], 'country_code': loc['country_code'],
+                'weather_id': code, 'weather_main': WEATHER_CATEGORIES.get(code, OTHER_CATEGORY),
+                'weather_description': WEATHER_DESCRIPTIONS.get(code, UNKNOWN_DESCRIPTION),
+                'temperature': hourly['temperature_2m'][i], 'feels_like': hourly['apparent_temperature'][i],
+                'pressure': hourly['pressure_msl'][i], 'humidity': hourly['relative_humidity_2m'][i],
+                'wind_speed': hourly['wind_speed_10m'][i], 'wind_deg': hourly['wind_direction_10m'][i],
+                'clouds': hourly['cloud_cover'][i], 'timezone': response['timezone'],
+                'latitude': loc['latitude'], 'longitude': loc['longitude'],
+            })
+    records_to_table(records)
+    records_s = time.perf_counter() - started
+
+    print(f"Conversion of {rows:,} rows: columnar {columnar_s * 1000:.1f} ms "
+          f"({rows / columnar_s:,.0f} rows/s), per-row dicts {records_s * 1000:.1f} ms "
+          f"({rows / records_s:,.0f} rows/s), {records_s / columnar_s:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--locations', type=int, default=100, help='Number of locations')
+    parser.add_argument('--days', type=int, default=90, help='Days to backfill')
+    parser.add_argument('--chunk', choices=('day', 'month'), default='month', help='Days per archive request')
+    parser.add_argument('--workers', default='1,4,8', help='Comma-separated worker counts to compare')
+    parser.add_argument('--locations-per-request', type=int, default=50, help='Locations per archive request')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Replay server latency per request')
+    parser.add_argument('--put-latency-ms', type=float, default=20.0, help='Simulated S3 PUT latency')
+    args = parser.parse_args()
+
+    import backfill
+
+    locations = make_locations(args.locations)
+    start = date(2024, 1, 1)
+    end = start + timedelta(days=args.days - 1)
+
+    with ReplayServer(latency_ms=args.latency_ms) as server:
+        print(f"{args.locations} locations x {args.days} days ({args.chunk} chunks), "
+              f"{args.locations_per_request} locations per request, API latency {args.latency_ms} ms, "
+              f"PUT latency {args.put_latency_ms} ms")
+        print()
+        print(f"{'workers':>8}{'chunks':>8}{'files':>8}{'rows':>10}{'seconds':>10}{'rows/s':>12}")
+        for workers in (int(value) for value in args.workers.split(',')):
+            root = tempfile.mkdtemp(prefix='backfill-bench-')
+            try:
+                client = SlowS3(LocalS3Client(root), args.put_latency_ms)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = backfill.backfill(client, BUCKET, locations, start, end, chunk=args.chunk,
+                                               max_workers=workers, api_url=server.url,
+                                               locations_per_request=args.locations_per_request)
+                print(f"{workers:>8}{result['chunks']:>8}{result['files']:>8}{result['rows']:>10}"
+                      f"{result['elapsed_s']:>10.2f}{result['rows'] / result['elapsed_s']:>12,.0f}")
+
+                # Resume: every chunk has its marker, so nothing is fetched again
+                requests_before = server.requests
+                resumed = backfill.backfill(client, BUCKET, locations, start, end, chunk=args.chunk,
+                                            max_workers=workers, api_url=server.url,
+                                            locations_per_request=args.locations_per_request)
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+
+        print()
+        print(f"Re-run: {resumed['skipped_chunks']}/{resumed['chunks']} chunks skipped, "
+              f"{server.requests - requests_before} API requests, {resumed['elapsed_s']:.2f} s")
+        compare_conversion(server, locations[:10], min(args.days, 31))
+
+
+if __name__ == '__main__':
+    main()
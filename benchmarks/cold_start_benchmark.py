@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Lambda modules
+
+Imports a handler module in fresh interpreters with `python -X importtime`,
+parses the per-module timings from stderr and reports the median self and
+cumulative import time of the heaviest modules.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+LAMBDA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'lambda', 'weather_ingestion'))
+
+# Measures module init inside the child process
+CHILD_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import {module}
+init_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{'init_ms': init_ms, 'modules_loaded': len(sys.modules)}}))
+'''
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Parse `-X importtime` output into {module: (self_us, cumulative_us, depth)}
+
+    Lines look like: 'import time:       341 |     195460 |   boto3'
+    """
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Header line
+        name = fields[2].rstrip()
+        # One leading space at the top level, two more per nesting level
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        timings[name.strip()] = (int(fields[0]), int(fields[1]), depth)
+    return timings
+
+
+def run_once(module: str) -> tuple:
+    env = dict(os.environ)
+    env.setdefault('S3_BUCKET', 'cold-start-benchmark')
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    env['PYTHONPATH'] = LAMBDA_DIR + os.pathsep + env.get('PYTHONPATH', '')
+    # -X importtime writes to stderr; bytecode is already compiled after the first run,
+    # matching a Lambda package that ships .pyc files
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT.format(module=module)],
+        capture_output=True, text=True, env=env, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--module', default='lambda_function', help='Handler module to import')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters to start')
+    parser.add_argument('--top', type=int, default=15, help='Modules to show')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    # Modules imported by interpreter startup and the child script itself are not the handler's cost
+    _, baseline = run_once('sys')
+
+    init_ms = []
+    modules_loaded = []
+    per_module = defaultdict(lambda: {'self': [], 'cumulative': [], 'depth': 0})
+    for _ in range(args.runs):
+        summary, timings = run_once(args.module)
+        init_ms.append(summary['init_ms'])
+        modules_loaded.append(summary['modules_loaded'])
+        for name, (self_us, cumulative_us, depth) in timings.items():
+            if name in baseline:
+                continue
+            per_module[name]['self'].append(self_us)
+            per_module[name]['cumulative'].append(cumulative_us)
+            per_module[name]['depth'] = depth
+
+    rows = sorted(
+        ((name, statistics.median(t['cumulative']) / 1000, statistics.median(t['self']) / 1000, t['depth'])
+         for name, t in per_module.items()),
+        key=lambda row: row[1], reverse=True
+    )
+
+    print(f"Module: {args.module} ({args.runs} runs)")
+    print(f"Median init time: {statistics.median(init_ms):.1f} ms, modules loaded: {statistics.median(modules_loaded):.0f}")
+    print()
+    print(f"{'module':<50}{'cumulative ms':>15}{'self ms':>10}")
+    for name, cumulative_ms, self_ms, depth in rows[:args.top]:
+        print(f"{('  ' * depth + name)[:50]:<50}{cumulative_ms:>15.2f}{self_ms:>10.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'module': args.module,
+                'runs': args.runs,
+                'init_ms_median': statistics.median(init_ms),
+                'modules_loaded_median': statistics.median(modules_loaded),
+                'imports': [
+                    {'module': name, 'cumulative_ms': c, 'self_ms': s, 'depth': d} for name, c, s, d in rows
+                ],
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
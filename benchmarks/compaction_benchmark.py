@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark Athena-style scans before and after hourly compaction
+
+Generates one single-row Parquet file per city per minute (what the ingestion
+Lambda produces) in a local directory, runs a filtered, projected scan over the
+partitioned dataset, compacts every hour and runs the same scan again. Finally
+builds the hourly/daily rollups and compares a daily-statistics query over the
+raw data with the same query over the daily rollup.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pyarrow.dataset as ds
+
+# Add lambda directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'weather_ingestion'))
+from compaction import compact_hour
+from local_s3 import LocalS3Client
+from rollups import update_rollups
+from utils import convert_to_parquet, create_s3_key
+
+BUCKET = 'weather-data'
+CITIES = [('London', 'GB'), ('Paris', 'FR'), ('Berlin', 'DE'), ('Madrid', 'ES'), ('Rome', 'IT')]
+
+
+def make_record(city: str, country_code: str, timestamp: datetime) -> dict:
+    return {
+        'timestamp': timestamp.isoformat(),
+        'city': city,
+        'country_code': country_code,
+        'weather_id': 3,
+        'weather_main': 'Clouds',
+        'weather_description': 'Overcast',
+        'temperature': random.uniform(-5, 30),
+        'feels_like': random.uniform(-5, 30),
+        'temp_min': random.uniform(-5, 30),
+        'temp_max': random.uniform(-5, 30),
+        'pressure': random.randint(980, 1040),
+        'humidity': random.randint(20, 100),
+        'visibility': random.randint(1, 30),
+        'wind_speed': random.uniform(0, 40),
+        'wind_deg': random.randint(0, 359),
+        'clouds': random.randint(0, 100),
+        'sunrise': None,
+        'sunset': None,
+        'timezone': 'UTC',
+        'latitude': 0.0,
+        'longitude': 0.0,
+    }
+
+
+def generate(client: LocalS3Client, start: datetime, hours: int) -> int:
+    files = 0
+    for minute in range(hours * 60):
+        timestamp = start + timedelta(minutes=minute)
+        for city, country_code in CITIES:
+            client.put_object(
+                Bucket=BUCKET,
+                Key=create_s3_key(city, country_code, timestamp),
+                Body=convert_to_parquet([make_record(city, country_code, timestamp)])
+            )
+            files += 1
+    return files
+
+
+def scan(root: str, repeat: int) -> dict:
+    """Filtered, projected scan similar to an Athena per-city hourly query"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        dataset = ds.dataset(os.path.join(root, BUCKET), format='parquet', partitioning='hive')
+        table = dataset.to_table(
+            columns=['timestamp', 'temperature', 'humidity', 'hour'],
+            filter=(ds.field('city') == 'London') & (ds.field('day') == 1)
+        )
+        timings.append(time.perf_counter() - started)
+    return {
+        'files': len(dataset.files),
+        'rows': table.num_rows,
+        'best_s': min(timings),
+        'mean_s': sum(timings) / len(timings),
+    }
+
+
+def daily_stats(path: str, columns: list, repeat: int) -> dict:
+    """Per-city daily statistics query (athena_queries.sql #3) against raw data or the daily rollup"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        table = dataset.to_table(columns=columns)
+        if 'temperature' in columns:
+            table = table.group_by(['city', 'day']).aggregate(
+                [('temperature', 'mean'), ('humidity', 'mean'), ('pressure', 'mean'), ('wind_speed', 'mean')]
+            )
+        timings.append(time.perf_counter() - started)
+    return {
+        'files': len(dataset.files),
+        'bytes': sum(os.path.getsize(path) for path in dataset.files),
+        'rows': table.num_rows,
+        'best_s': min(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=int, default=6, help='Hours of data to generate')
+    parser.add_argument('--repeat', type=int, default=5, help='Scan repetitions')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='compaction-bench-')
+    try:
+        client = LocalS3Client(root)
+        start = datetime(2024, 1, 1)
+
+        print(f"Generating {args.hours}h x {len(CITIES)} cities of per-minute files...")
+        files = generate(client, start, args.hours)
+        print(f"Wrote {files} files")
+
+        before = scan(root, args.repeat)
+
+        started = time.perf_counter()
+        for hour in range(args.hours):
+            compact_hour(client, BUCKET, start + timedelta(hours=hour))
+        compaction_s = time.perf_counter() - started
+
+        after = scan(root, args.repeat)
+
+        print()
+        print(f"{'':<10}{'files':>8}{'rows':>8}{'best (s)':>12}{'mean (s)':>12}")
+        for label, result in (('before', before), ('after', after)):
+            print(f"{label:<10}{result['files']:>8}{result['rows']:>8}{result['best_s']:>12.4f}{result['mean_s']:>12.4f}")
+        print()
+        print(f"Compaction of {args.hours} hours took {compaction_s:.2f}s; "
+              f"scan speed-up {before['best_s'] / after['best_s']:.1f}x")
+
+        started = time.perf_counter()
+        for hour in range(args.hours):
+            update_rollups(client, BUCKET, start + timedelta(hours=hour))
+        rollup_s = time.perf_counter() - started
+
+        raw = daily_stats(os.path.join(root, BUCKET, f'year={start.year}'),
+                          ['city', 'day', 'temperature', 'humidity', 'pressure', 'wind_speed'], args.repeat)
+        rollup = daily_stats(os.path.join(root, BUCKET, 'rollups', 'daily'),
+                             ['city', 'day', 'temperature_avg', 'humidity_avg', 'pressure_avg', 'wind_speed_avg'],
+                             args.repeat)
+
+        print()
+        print(f"{'daily stats':<12}{'files':>8}{'bytes':>12}{'rows':>8}{'best (s)':>12}")
+        for label, result in (('raw', raw), ('rollup', rollup)):
+            print(f"{label:<12}{result['files']:>8}{result['bytes']:>12}{result['rows']:>8}{result['best_s']:>12.4f}")
+        print()
+        print(f"Rollups for {args.hours} hours took {rollup_s:.2f}s; "
+              f"query speed-up {raw['best_s'] / rollup['best_s']:.1f}x")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark for the ingestion Lambda
+
+Drives lambda_handler against a local replay of the Open-Meteo API and a
+filesystem S3 stand-in, at a configurable concurrency and batch sizes, and
+reports p50/p95/p99 per stage (fetch, Parquet encode, upload), throughput
+and peak memory. Results can be exported as JSON and compared between commits.
+
+Example:
+    python benchmarks/e2e_benchmark.py --batch-sizes 1,10,50 --concurrency 4 --json results.json
+    python benchmarks/e2e_benchmark.py --compare results.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import (
+    MockContext, MetricsCapture, ReplayServer, load_lambda, make_locations, summarize, DEFAULT_FIXTURE
+)
+from local_s3 import LocalS3Client
+
+BUCKET = 'weather-data'
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_batch_size(lambda_module, capture: MetricsCapture, batch_size: int, invocations: int, concurrency: int) -> dict:
+    # A batch size of 1 exercises the original single-location event
+    if batch_size == 1:
+        event = {'city': 'London', 'country_code': 'GB', 'latitude': 51.5074, 'longitude': -0.1278}
+    else:
+        event = {'locations': make_locations(batch_size)}
+
+    totals = []
+
+    def invoke(_):
+        started = time.perf_counter()
+        result = lambda_module.lambda_handler(event, MockContext())
+        totals.append(time.perf_counter() - started)
+        return result['statusCode']
+
+    # The first invocation pays for deferred imports and client setup; report it on its own
+    started = time.perf_counter()
+    invoke(None)
+    first_invocation_s = time.perf_counter() - started
+    capture.reset()
+    totals.clear()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(invoke, range(invocations)))
+    elapsed = time.perf_counter() - started
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'batch_size': batch_size,
+        'invocations': invocations,
+        'errors': sum(1 for status in statuses if status != 200),
+        'first_invocation_ms': first_invocation_s * 1000,
+        'elapsed_s': elapsed,
+        'invocations_per_s': invocations / elapsed,
+        'records_per_s': invocations * batch_size / elapsed,
+        'python_heap_peak_mb': traced_peak / (1024 * 1024),
+        'http_retries': sum(capture.values('HttpRetries')),
+        'skipped_writes': sum(capture.values('SkippedWrites')),
+        'parquet_bytes_mean': sum(capture.values('ParquetBytes')) / max(1, len(capture.values('ParquetBytes'))),
+        'stages': {
+            **{stage: summarize(capture.durations(stage)) for stage in MetricsCapture.STAGES},
+            'total': summarize(totals),
+        },
+    }
+
+
+def print_results(results: dict) -> None:
+    print(f"Revision {results['revision']}, concurrency {results['concurrency']}, "
+          f"API latency {results['latency_ms']} ms")
+    for run in results['runs']:
+        print()
+        print(f"batch size {run['batch_size']}: {run['invocations']} invocations, {run['errors']} errors, "
+              f"{run['invocations_per_s']:.1f} inv/s, {run['records_per_s']:.1f} records/s, "
+              f"first invocation {run['first_invocation_ms']:.1f} ms, heap peak {run['python_heap_peak_mb']:.1f} MB, "
+              f"{run['http_retries']} HTTP retries, {run['skipped_writes']} skipped writes, "
+              f"{run['parquet_bytes_mean']:.0f} B/object")
+        print(f"  {'stage':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for stage, stats in run['stages'].items():
+            print(f"  {stage:<8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                  f"{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+    print()
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+
+
+def print_comparison(baseline: dict, current: dict) -> None:
+    print()
+    print(f"Comparison against {baseline['revision']} (p95, negative is faster)")
+    baseline_runs = {run['batch_size']: run for run in baseline['runs']}
+    for run in current['runs']:
+        before = baseline_runs.get(run['batch_size'])
+        if before is None:
+            continue
+        deltas = []
+        for stage, stats in run['stages'].items():
+            old = before['stages'].get(stage, {}).get('p95_ms')
+            if old:
+                deltas.append(f"{stage} {(stats['p95_ms'] - old) / old * 100:+.1f}%")
+        print(f"  batch size {run['batch_size']}: " + ', '.join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-sizes', default='1,10,50', help='Comma-separated locations per invocation')
+    parser.add_argument('--invocations', type=int, default=100, help='Invocations per batch size')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent invocations')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Replay server base latency')
+    parser.add_argument('--jitter-ms', type=float, default=10.0, help='Uniform extra latency')
+    parser.add_argument('--slow-fraction', type=float, default=0.0, help='Fraction of slow responses')
+    parser.add_argument('--slow-ms', type=float, default=0.0, help='Extra latency of slow responses')
+    parser.add_argument('--fixture', default=DEFAULT_FIXTURE, help='Recorded API response to replay')
+    parser.add_argument('--change-detection', action='store_true',
+                        help='Keep change detection on (measures the skip path after the first write)')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--compare', help='Baseline JSON results to compare against')
+    parser.add_argument('--verbose', action='store_true', help='Show the handler\'s own output')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='e2e-bench-')
+    try:
+        with ReplayServer(args.fixture, args.latency_ms, args.jitter_ms, args.slow_fraction, args.slow_ms) as server:
+            lambda_module = load_lambda(server.url, LocalS3Client(root), BUCKET, args.change_detection)
+            capture = MetricsCapture()
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                runs = [
+                    run_batch_size(lambda_module, capture, int(batch_size), args.invocations, args.concurrency)
+                    for batch_size in args.batch_sizes.split(',')
+                ]
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    results = {
+        'revision': git_revision(),
+        'concurrency': args.concurrency,
+        'latency_ms': args.latency_ms,
+        # ru_maxrss is KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'runs': runs,
+    }
+    print_results(results)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for columnar forecast ingestion
+
+Fetches synthetic forecast arrays from the local replay server, then converts
+them to the forecast table two ways: the columnar path (forecast.forecast_table,
+Arrow arrays and compute kernels) and the dict path (one record per time step
+through lambda_function._build_weather_record and utils.records_to_table).
+Reports rows/sec for each, then runs the forecast handler end to end against
+a filesystem S3 stand-in.
+
+Example:
+    python benchmarks/forecast_benchmark.py --locations 100 --days 16 --resolution minutely_15
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import ReplayServer, load_lambda, make_locations
+from local_s3 import LocalS3Client
+
+BUCKET = 'weather-data'
+
+
+def dict_path(locations: list, responses: list, issued_at: datetime, resolution: str):
+    from forecast import get_forecast_schema
+    from lambda_function import _build_weather_record
+    from utils import records_to_table
+
+    records = []
+    for loc, response in zip(locations, responses):
+        block = response[resolution]
+        names = [name for name in block if name != 'time']
+        for i, step in enumerate(block['time']):
+            timestamp = datetime.strptime(step, '%Y-%m-%dT%H:%M')
+            record = _build_weather_record({name: block[name][i] for name in names}, response['timezone'],
+                                           loc['latitude'], loc['longitude'], loc['city'], loc['country_code'],
+                                           timestamp)
+            record['timestamp'] = timestamp
+            record['issued_at'] = issued_at
+            record['lead_minutes'] = int((timestamp - issued_at).total_seconds() // 60)
+            records.append(record)
+    return records_to_table(records, get_forecast_schema())
+
+
+def best_of(repeat: int, func, *args):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--locations', type=int, default=50, help='Number of locations')
+    parser.add_argument('--days', type=int, default=7, help='Forecast days')
+    parser.add_argument('--resolution', choices=('hourly', 'minutely_15'), default='hourly')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per path (best is reported)')
+    args = parser.parse_args()
+
+    locations = make_locations(args.locations)
+    issued_at = datetime.utcnow().replace(microsecond=0)
+
+    root = tempfile.mkdtemp(prefix='forecast-bench-')
+    with ReplayServer() as server:
+        load_lambda(server.url, LocalS3Client(root), BUCKET)
+        import forecast
+        responses = forecast.fetch_forecast(locations, server.url, args.resolution, args.days)
+
+        columnar_s, columnar = best_of(args.repeat, forecast.forecast_table, locations, responses, issued_at,
+                                       args.resolution)
+        records_s, _ = best_of(args.repeat, dict_path, locations, responses, issued_at, args.resolution)
+        rows = columnar.num_rows
+
+        print(f"{args.locations} locations x {args.days} days ({args.resolution}): {rows:,} rows")
+        print(f"  columnar:      {columnar_s * 1000:9.1f} ms  {rows / columnar_s:>12,.0f} rows/s")
+        print(f"  per-row dicts: {records_s * 1000:9.1f} ms  {rows / records_s:>12,.0f} rows/s")
+        print(f"  speedup:       {records_s / columnar_s:9.1f}x")
+
+        # End to end through the handler: fetch, encode, upload
+        try:
+            forecast.S3_BUCKET = BUCKET
+            forecast.WEATHER_API_URL = server.url
+            forecast.FORECAST_RESOLUTION = args.resolution
+            forecast.FORECAST_DAYS = args.days
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                result = forecast.lambda_handler({'locations': locations}, None)
+                elapsed = time.perf_counter() - started
+            body = json.loads(result['body'])
+            print(f"Handler: status {result['statusCode']}, {body.get('rows', 0):,} rows in {elapsed * 1000:.0f} ms "
+                  f"-> {body.get('s3_location', body.get('error'))}")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
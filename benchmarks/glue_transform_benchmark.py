@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Glue transformation stage on synthetic data with local PySpark
+
+Compares weather_transforms.apply_transforms (native column expressions) with
+the per-record Python functions the job used before (the Filter.apply/Map.apply
+pattern, emulated on the RDD since awsglue is not available locally).
+
+Requires pyspark and a Java runtime (pip install pyspark).
+
+Example:
+    python benchmarks/glue_transform_benchmark.py --rows 5000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'glue', 'scripts'))
+
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+
+from weather_transforms import apply_transforms
+
+
+def synthetic_weather(spark, rows: int, null_fraction: float):
+    """Weather-like rows; null_fraction of temperatures are NULL"""
+    temperature = F.round(F.rand(seed=1) * 50 - 15, 1)
+    return spark.range(rows).select(
+        F.expr("timestamp_seconds(1704067200 + id * 60)").alias('timestamp'),
+        F.concat(F.lit('Site '), (F.col('id') % 500).cast('string')).alias('city'),
+        F.lit('XX').alias('country_code'),
+        F.when(F.rand(seed=2) < null_fraction, F.lit(None).cast('double')).otherwise(temperature).alias('temperature'),
+        F.round(temperature - F.rand(seed=3) * 3, 1).alias('feels_like'),
+        (F.rand(seed=4) * 100).cast('int').alias('humidity'),
+        F.round(F.rand(seed=5) * 60, 1).alias('wind_speed'),
+    )
+
+
+def python_per_record(df):
+    """The previous implementation: Python functions called once per row"""
+    def filter_positive_temp(record):
+        return (record.get("temperature") or 0) > 0
+
+    def add_fahrenheit(record):
+        temp_c = record.get("temperature") or 0
+        record["temperature_f"] = (temp_c * 9/5) + 32
+        return record
+
+    return df.rdd.map(lambda row: row.asDict()).filter(filter_positive_temp).map(add_fahrenheit)
+
+
+def timed(label: str, rows: int, action) -> float:
+    started = time.perf_counter()
+    result = action()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28}{elapsed:>10.2f} s{rows / elapsed:>16,.0f} rows/s   -> {result:,} rows kept")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5_000_000, help='Synthetic input rows')
+    parser.add_argument('--null-fraction', type=float, default=0.01, help='Fraction of NULL temperatures')
+    parser.add_argument('--partitions', type=int, default=8, help='Input partitions')
+    parser.add_argument('--skip-python', action='store_true', help='Only run the native transforms')
+    args = parser.parse_args()
+
+    spark = (
+        SparkSession.builder.master(f"local[{args.partitions}]")
+        .appName('glue-transform-benchmark')
+        .config('spark.ui.enabled', 'false')
+        .getOrCreate()
+    )
+    spark.sparkContext.setLogLevel('ERROR')
+
+    df = synthetic_weather(spark, args.rows, args.null_fraction).repartition(args.partitions).cache()
+    df.count()  # Materialize the input so both runs measure only the transformation
+    print(f"{args.rows:,} rows in {args.partitions} partitions, {args.null_fraction:.1%} NULL temperatures")
+    print()
+
+    # Aggregate the derived column so Spark cannot prune it away
+    native = timed('native column expressions', args.rows,
+                   lambda: apply_transforms(df).agg(F.count('*'), F.sum('temperature_f')).first()[0])
+    if not args.skip_python:
+        python = timed('python per-record', args.rows, lambda: python_per_record(df).count())
+        print()
+        print(f"Speedup: {python / native:.1f}x")
+
+    spark.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""
+Offline stand-ins for driving the ingestion Lambda locally
+
+- ReplayServer: local HTTP server that replays a recorded Open-Meteo response,
+  with configurable latency (and optional 503 errors or a 429 rate limit), for any number of
+  comma-separated coordinates; requests for `hourly` (or `minutely_15`)
+  variables get synthetic arrays (archive/forecast)
+- load_lambda: imports lambda_function pointed at the replay server and a
+  filesystem S3 stand-in, with the HTTP rate limiter, circuit breaker and
+  location fetch cache off unless requested
+- MetricsCapture: collects the handler's per-stage metrics (fetch, Parquet
+  encode, upload) through the metrics module's in-memory sink
+"""
+
+import json
+import math
+import os
+import random
+from datetime import date, datetime, timedelta
+import socket
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List
+from urllib.parse import urlparse, parse_qs
+
+LAMBDA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'lambda', 'weather_ingestion'))
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DEFAULT_FIXTURE = os.path.join(FIXTURES_DIR, 'open_meteo_current.json')
+
+if LAMBDA_DIR not in sys.path:
+    sys.path.insert(0, LAMBDA_DIR)
+
+
+class ReplayServer:
+    """Replays a recorded Open-Meteo response on a local port"""
+
+    def __init__(self, fixture_path: str = DEFAULT_FIXTURE, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, slow_fraction: float = 0.0, slow_ms: float = 0.0,
+                 error_fraction: float = 0.0, rate_limit_per_minute: float = 0.0):
+        with open(fixture_path) as f:
+            self.fixture = json.load(f)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_fraction = slow_fraction
+        self.slow_ms = slow_ms
+        self.error_fraction = error_fraction  # Share of requests answered with 503
+        # Requests per minute before answering 429 with Retry-After (one second of burst); 0 = unlimited
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self.requests = 0
+        self.throttled = 0
+        self._tokens = rate_limit_per_minute / 60
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/v1/forecast"
+
+    def _take_token(self) -> bool:
+        if not self.rate_limit_per_minute:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            rate = self.rate_limit_per_minute / 60
+            self._tokens = min(rate, self._tokens + (now - self._refilled) * rate)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+    def _delay(self) -> float:
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if self.slow_fraction and random.random() < self.slow_fraction:
+            delay += self.slow_ms
+        return delay / 1000
+
+    @staticmethod
+    def _hourly(query: Dict[str, List[str]], seed: str, block: str = 'hourly') -> Dict[str, List]:
+        """Synthetic hourly (or 15-minutely) arrays covering start_date..end_date (or forecast_days from today)"""
+        if 'start_date' in query:
+            first = date.fromisoformat(query['start_date'][0])
+            days = (date.fromisoformat(query['end_date'][0]) - first).days + 1
+        else:
+            first = datetime.utcnow().date()
+            days = int(query.get('forecast_days', ['7'])[0])
+        rng = random.Random(seed)
+        step = 15 if block == 'minutely_15' else 60
+        hours = days * 24 * 60 // step
+        start = datetime(first.year, first.month, first.day)
+        hourly = {'time': [(start + timedelta(minutes=h * step)).strftime('%Y-%m-%dT%H:%M') for h in range(hours)]}
+        for variable in query[block][0].split(','):
+            if variable == 'weather_code':
+                hourly[variable] = [rng.choice((0, 1, 2, 3, 45, 61, 63, 71, 95)) for _ in range(hours)]
+            else:
+                hourly[variable] = [round(rng.uniform(0, 100), 1) for _ in range(hours)]
+        return hourly
+
+    def _body(self, query: Dict[str, List[str]]) -> bytes:
+        latitudes = query.get('latitude', ['0'])[0].split(',')
+        longitudes = query.get('longitude', ['0'])[0].split(',')
+        results = []
+        for latitude, longitude in zip(latitudes, longitudes):
+            result = dict(self.fixture)
+            result['latitude'] = float(latitude)
+            result['longitude'] = float(longitude)
+            for block in ('hourly', 'minutely_15'):
+                if block in query:
+                    result.pop('current', None)
+                    result['timezone'] = query.get('timezone', ['GMT'])[0]
+                    result[block] = self._hourly(query, f"{latitude},{longitude}", block)
+            results.append(result)
+        # Open-Meteo answers a single coordinate pair with an object, several with a list
+        return json.dumps(results[0] if len(results) == 1 else results).encode('utf-8')
+
+    def __enter__(self) -> 'ReplayServer':
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+            def setup(self):
+                super().setup()
+                # Headers and body are separate writes; avoid Nagle/delayed-ACK stalls
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with replay._lock:
+                    replay.requests += 1
+                if not replay._take_token():
+                    # Rejected before any work, like an API gateway
+                    body = b'{"error": true, "reason": "Too many requests"}'
+                    self.send_response(429)
+                    self.send_header('Retry-After', '1')
+                else:
+                    time.sleep(replay._delay())
+                    if replay.error_fraction and random.random() < replay.error_fraction:
+                        body = b'{"error": true, "reason": "Service unavailable"}'
+                        self.send_response(503)
+                    else:
+                        body = replay._body(parse_qs(urlparse(self.path).query))
+                        self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def load_lambda(api_url: str, s3_client, bucket: str, detect_changes: bool = False,
+                rate_limit_per_minute: float = 0.0, breaker_threshold: int = 0, cache_ttl: float = 0.0):
+    """
+    Import lambda_function configured for offline use
+
+    Args:
+        api_url: Weather API URL (usually ReplayServer.url)
+        s3_client: S3 client to upload with (usually a LocalS3Client)
+        bucket: Bucket name
+        detect_changes: Enable change detection. Off by default: the replayed
+            observation never changes, so every invocation after the first would skip
+        rate_limit_per_minute: Client-side request rate limit (0 = off, so benchmarks
+            measure the pipeline rather than the production limit)
+        breaker_threshold: Consecutive failures that open the circuit breaker (0 = off)
+        cache_ttl: Seconds grid-cell responses stay cached (0 = off, so repeated runs keep
+            measuring the fetch; sites in one batch and concurrent lookups still share)
+
+    Returns:
+        The lambda_function module
+    """
+    os.environ['WEATHER_API_URL'] = api_url
+    os.environ['S3_BUCKET'] = bucket
+    import lambda_function
+    lambda_function.WEATHER_API_URL = api_url
+    lambda_function.S3_BUCKET = bucket
+    lambda_function.s3_client = s3_client
+    import change_detection
+    change_detection.CHANGE_DETECTION = detect_changes
+    import http_client
+    http_client.rate_limiter = (http_client.TokenBucket(rate_limit_per_minute, http_client.HTTP_RATE_LIMIT_BURST)
+                                if rate_limit_per_minute else None)
+    http_client.circuit_breaker = (http_client.CircuitBreaker(breaker_threshold, http_client.HTTP_BREAKER_COOLDOWN)
+                                   if breaker_threshold else None)
+    import location_grid
+    location_grid.cache = location_grid.FetchCache(cache_ttl)
+    return lambda_function
+
+
+class MetricsCapture:
+    """Captures the handler's EMF metrics in memory instead of printing them"""
+
+    STAGES = {'fetch': 'FetchDuration', 'encode': 'EncodeDuration', 'upload': 'UploadDuration'}
+
+    def __init__(self):
+        import metrics
+        metrics.METRICS_ENABLED = True
+        self.sink = metrics.ListSink()
+        metrics.set_sink(self.sink)
+
+    def reset(self) -> None:
+        self.sink.clear()
+
+    def values(self, metric: str) -> List[float]:
+        """All recorded values of a metric, one per invocation that emitted it"""
+        return [document[metric] for document in self.sink.documents if metric in document]
+
+    def durations(self, stage: str) -> List[float]:
+        """Stage durations in seconds"""
+        return [ms / 1000 for ms in self.values(self.STAGES[stage])]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (pct in 0-100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(seconds: List[float]) -> Dict[str, float]:
+    return {
+        'count': len(seconds),
+        'p50_ms': percentile(seconds, 50) * 1000,
+        'p95_ms': percentile(seconds, 95) * 1000,
+        'p99_ms': percentile(seconds, 99) * 1000,
+        'max_ms': max(seconds) * 1000 if seconds else 0.0,
+    }
+
+
+def make_locations(count: int) -> List[Dict]:
+    """Synthetic, distinct locations spread over Europe"""
+    rng = random.Random(count)
+    return [{
+        'city': f'Site {i}',
+        'country_code': 'XX',
+        'latitude': round(rng.uniform(36.0, 60.0), 4),
+        'longitude': round(rng.uniform(-10.0, 25.0), 4),
+    } for i in range(count)]
+
+
+class MockContext:
+    """Minimal Lambda context"""
+
+    def __init__(self):
+        self.function_name = 'test-weather-ingestion'
+        self.function_version = '$LATEST'
+        self.memory_limit_in_mb = 256
+        self.invoked_function_arn = 'arn:aws:lambda:us-east-1:123456789012:function:test'
+        self.aws_request_id = 'test-request-id'
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Hive layout vs the Iceberg table: query planning, compaction and snapshot expiry
+
+Writes the same history (--appends-per-day batches of --locations records per
+day for --days days) twice in a temporary directory: as the Hive-layout Parquet
+objects the ingestion Lambda writes by default, and as appends to an Iceberg
+table in a local SQL catalog (TABLE_FORMAT=iceberg). Then compares, for a
+one-day, a one-city and a city-and-day query:
+
+    Hive      files listed, footers opened and bytes scanned (query_local.py)
+    Iceberg   manifests read and files/bytes planned from their statistics
+
+before and after iceberg_table.maintain, which runs as if --age-hours had
+passed so snapshot expiry and orphan removal have something to do. Row counts
+of both formats are checked against each other. A small --target-file-mb
+makes compaction write several files per day, so per-city pruning between
+files shows at this scale.
+
+Example:
+    python benchmarks/iceberg_benchmark.py --locations 100 --days 4 --appends-per-day 48
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pyarrow.fs as pafs
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambda', 'weather_ingestion'))
+sys.path.insert(0, ROOT)
+
+BUCKET = 'weather-data'
+
+
+def make_record(city: str, timestamp: datetime) -> dict:
+    return {
+        'timestamp': timestamp.isoformat(),
+        'city': city,
+        'country_code': 'GB',
+        'weather_id': 3,
+        'weather_main': 'Clouds',
+        'weather_description': 'Overcast',
+        'temperature': random.uniform(-5, 30),
+        'feels_like': random.uniform(-5, 30),
+        'temp_min': random.uniform(-5, 30),
+        'temp_max': random.uniform(-5, 30),
+        'pressure': random.randint(980, 1040),
+        'humidity': random.randint(20, 100),
+        'visibility': random.randint(1, 30000),
+        'wind_speed': random.uniform(0, 40),
+        'wind_deg': random.randint(0, 359),
+        'clouds': random.randint(0, 100),
+        'sunrise': None,
+        'sunset': None,
+        'timezone': 'UTC',
+        'latitude': 0.0,
+        'longitude': 0.0,
+    }
+
+
+def directory_stats(path: str) -> tuple:
+    files, size = 0, 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(directory, name))
+    return files, size
+
+
+def hive_query(query_local, base: str, sql: str) -> dict:
+    table, stats = query_local.run_statement(sql, pafs.LocalFileSystem(), base, datetime.utcnow().date())
+    return {'rows': table.column(0)[0].as_py(), **stats}
+
+
+def iceberg_query(iceberg_table, table, city, start, end) -> dict:
+    from pyiceberg.expressions import AlwaysTrue, And, EqualTo, GreaterThanOrEqual, LessThan
+    plan = iceberg_table.plan_query(table, city, start, end)
+    row_filter = AlwaysTrue()
+    if city is not None:
+        row_filter = And(row_filter, EqualTo('city', city))
+    if start is not None:
+        row_filter = And(row_filter, GreaterThanOrEqual('timestamp', start.isoformat()),
+                         LessThan('timestamp', end.isoformat()))
+    plan['rows'] = table.scan(row_filter=row_filter, selected_fields=('city',)).to_arrow().num_rows
+    plan['manifests'] = len(table.current_snapshot().manifests(table.io))
+    return plan
+
+
+def report(name: str, hive: dict, iceberg: dict) -> None:
+    check = 'ok' if hive['rows'] == iceberg['rows'] else f"MISMATCH ({hive['rows']} vs {iceberg['rows']})"
+    print(f"{name:<14}{hive['files_total']:>8}{hive['files_opened']:>8}{hive['bytes_scanned'] / 1024:>10.0f}"
+          f"{iceberg['manifests']:>11}{iceberg['files_planned']:>8}/{iceberg['files_total']:<6}"
+          f"{iceberg['bytes_planned'] / 1024:>10.0f}{iceberg['rows']:>8}  {check}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--locations', type=int, default=100, help='Records per append')
+    parser.add_argument('--days', type=int, default=4, help='Days of history')
+    parser.add_argument('--appends-per-day', type=int, default=48, help='Ingestion batches per day')
+    parser.add_argument('--target-file-mb', type=float, default=0.25, help='write.target-file-size-bytes in MiB')
+    parser.add_argument('--age-hours', type=float, default=24.0, help='Run maintenance this many hours later')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='iceberg-bench-')
+    os.environ.update({
+        'ICEBERG_CATALOG': 'sql',
+        'ICEBERG_CATALOG_URI': f"sqlite:///{os.path.join(root, 'catalog.db')}",
+        'ICEBERG_WAREHOUSE': f"file://{os.path.join(root, 'warehouse')}",
+        'ICEBERG_TARGET_FILE_SIZE_BYTES': str(int(args.target_file_mb * 1024 * 1024)),
+    })
+    import iceberg_table
+    import query_local
+    from local_s3 import LocalS3Client
+    from utils import convert_to_parquet, create_batch_s3_key
+
+    try:
+        client = LocalS3Client(os.path.join(root, 's3'))
+        table = iceberg_table.get_table()
+        cities = [f"Site {index:04d}" for index in range(args.locations)]
+        start = datetime.combine(datetime.utcnow().date() - timedelta(days=args.days), datetime.min.time())
+        hive_seconds, iceberg_seconds = [], []
+        for day in range(args.days):
+            for append in range(args.appends_per_day):
+                timestamp = start + timedelta(days=day, seconds=append * 86400 // args.appends_per_day)
+                records = [make_record(city, timestamp) for city in cities]
+                started = time.perf_counter()
+                client.put_object(Bucket=BUCKET, Key=create_batch_s3_key(len(records), timestamp),
+                                  Body=convert_to_parquet(records))
+                hive_seconds.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                iceberg_table.append_records(records, table)
+                iceberg_seconds.append(time.perf_counter() - started)
+
+        batches = args.days * args.appends_per_day
+        print(f"{batches} batches of {args.locations} records over {args.days} days")
+        print(f"Write per batch: Hive {sum(hive_seconds) / batches * 1000:.1f} ms (local put), "
+              f"Iceberg {sum(iceberg_seconds) / batches * 1000:.1f} ms (write + commit)")
+
+        day = start + timedelta(days=args.days // 2)
+        city = cities[len(cities) // 2]
+        base = os.path.join(root, 's3', BUCKET)
+        day_sql = f"year = '{day:%Y}' AND month = '{day:%m}' AND day = '{day:%d}'"
+        queries = [
+            ('one day', f"SELECT COUNT(*) FROM weather_data WHERE {day_sql}", None, day),
+            ('one city', f"SELECT COUNT(*) FROM weather_data WHERE city = '{city}'", city, None),
+            ('city and day', f"SELECT COUNT(*) FROM weather_data WHERE city = '{city}' AND {day_sql}", city, day),
+        ]
+
+        table_dir = table.location()[len('file://'):]
+        for label in ('before maintenance', 'after maintenance'):
+            table.refresh()
+            files, size = directory_stats(table_dir)
+            print()
+            print(f"{label}: {len(table.snapshots())} snapshots, {files} files ({size / 1024:.0f} KiB) under the table")
+            print(f"{'':<14}{'--------- Hive ---------':>26}{'------------- Iceberg --------------':>43}")
+            print(f"{'query':<14}{'listed':>8}{'opened':>8}{'KiB read':>10}{'manifests':>11}{'planned':>15}"
+                  f"{'KiB':>10}{'rows':>8}")
+            for name, sql, query_city, query_day in queries:
+                hive = hive_query(query_local, base, sql)
+                iceberg = iceberg_query(iceberg_table, table, query_city, query_day,
+                                        query_day + timedelta(days=1) if query_day else None)
+                report(name, hive, iceberg)
+
+            if label == 'before maintenance':
+                started = time.perf_counter()
+                result = iceberg_table.maintain(table, now=datetime.utcnow() + timedelta(hours=args.age_hours))
+                print()
+                print(f"Maintenance ({time.perf_counter() - started:.1f} s, as if {args.age_hours:g} h later): "
+                      f"{result['partitions_rewritten']} days rewritten, {result['files_before']} -> "
+                      f"{result['files_after']} data files, {result['snapshots_expired']} snapshots expired "
+                      f"({result['snapshots_kept']} kept), {result['files_deleted']} unreferenced files deleted "
+                      f"({result['bytes_deleted'] / 1024:.0f} KiB)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
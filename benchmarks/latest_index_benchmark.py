@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark the latest-observation index against scanning weather_data
+
+Writes --days of hourly partitions for --cities locations into a local bucket,
+seeds _index/latest.json from the newest hour, then compares query 1 of
+athena_queries.sql (latest rows, ORDER BY timestamp DESC LIMIT 10) run by
+query_local over every partition with a cold and a warm (ETag-revalidated)
+read of the index. Finally --writers threads update the index concurrently
+with conditional writes and the result is checked for lost updates.
+
+Example:
+    python benchmarks/latest_index_benchmark.py --days 14 --cities 100 --writers 8
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.fs as pafs
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT_DIR, 'lambda', 'weather_ingestion'))
+sys.path.insert(0, ROOT_DIR)
+import latest_index
+from local_s3 import LocalS3Client
+from query_local import run_statement
+from utils import conform_table, create_partition_path, get_weather_schema, location_slug, table_to_parquet
+
+BUCKET = 'weather-data'
+LATEST_QUERY = "SELECT * FROM weather_db_weatherpipelinestack.weather_data ORDER BY timestamp DESC LIMIT 10"
+
+
+def hour_table(hour: datetime, cities: int, rng) -> pa.Table:
+    """Five-minute observations of every city for one hour"""
+    times = [hour + timedelta(minutes=5 * step) for step in range(12)]
+    rows = cities * len(times)
+    columns = {
+        'timestamp': pa.array([t for _ in range(cities) for t in times], pa.timestamp('ms')),
+        'city': [f'Site {i}' for i in range(cities) for _ in times],
+        'country_code': ['XX'] * rows,
+        'temperature': rng.uniform(-10, 35, rows),
+        'humidity': rng.integers(20, 100, rows).astype('int32'),
+        'weather_main': ['Clouds'] * rows,
+    }
+    for field in get_weather_schema():
+        columns.setdefault(field.name, pa.nulls(rows, field.type))
+    return conform_table(pa.table(columns))
+
+
+def generate(client: LocalS3Client, days: int, cities: int) -> datetime:
+    rng = np.random.default_rng(days)
+    start = datetime.combine(date.today() - timedelta(days=days - 1), datetime.min.time())
+    for offset in range(days * 24):
+        hour = start + timedelta(hours=offset)
+        client.put_object(Bucket=BUCKET, Key=f"{create_partition_path(hour)}/compacted_bench.parquet",
+                          Body=table_to_parquet(hour_table(hour, cities, rng), 'archive-compact'))
+    return start + timedelta(hours=days * 24 - 1)
+
+
+def timed(function, repeat: int) -> float:
+    """Median milliseconds per call"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def concurrent_writers(client: LocalS3Client, writers: int, updates: int) -> dict:
+    """Each writer owns one city and also writes a shared city; every final entry must be the newest"""
+    key = '_index/concurrency.json'
+    base = datetime(2030, 1, 1)
+
+    def writer(number: int) -> int:
+        conflicts = 0
+        for step in range(updates):
+            timestamp = (base + timedelta(seconds=step * writers + number)).isoformat()
+            records = [{'city': f'Writer {number}', 'country_code': 'XX', 'timestamp': timestamp, 'step': step},
+                       {'city': 'Shared', 'country_code': 'XX', 'timestamp': timestamp, 'writer': number}]
+            conflicts += latest_index.update_latest(client, BUCKET, records, key, max_attempts=50)['conflicts']
+        return conflicts
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        conflicts = sum(executor.map(writer, range(writers)))
+    elapsed = time.perf_counter() - started
+
+    index = latest_index.get_latest(client, BUCKET, key)['locations']
+    newest = (base + timedelta(seconds=(updates - 1) * writers + writers - 1)).isoformat()
+    lost = sum(1 for number in range(writers)
+               if index.get(location_slug(f'Writer {number}', 'XX'), {}).get('step') != updates - 1)
+    lost += index[location_slug('Shared', 'XX')]['timestamp'] != newest
+    return {'updates': writers * updates, 'conflicts': conflicts, 'lost': lost, 'elapsed_s': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=14, help='Days of hourly partitions')
+    parser.add_argument('--cities', type=int, default=100, help='Locations')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per read')
+    parser.add_argument('--writers', type=int, default=8, help='Concurrent index writers')
+    parser.add_argument('--updates', type=int, default=25, help='Updates per writer')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='latest-index-bench-')
+    try:
+        client = LocalS3Client(root)
+        newest_hour = generate(client, args.days, args.cities)
+        seeded = latest_index.rebuild(client, BUCKET, 1, newest_hour)
+        filesystem = pafs.LocalFileSystem()
+        base = os.path.join(root, BUCKET)
+        today = date.today()
+        result, stats = run_statement(LATEST_QUERY, filesystem, base, today)
+
+        def cold_read():
+            latest_index._cache.clear()
+            return latest_index.get_latest(client, BUCKET)
+
+        scan_ms = timed(lambda: run_statement(LATEST_QUERY, filesystem, base, today), args.repeat)
+        cold_ms = timed(cold_read, args.repeat)
+        warm_ms = timed(lambda: latest_index.get_latest(client, BUCKET), args.repeat)
+        one_ms = timed(lambda: latest_index.find_location(latest_index.get_latest(client, BUCKET), 'Site 7', 'XX'),
+                       args.repeat)
+        index_bytes = client.head_object(Bucket=BUCKET, Key=latest_index.LATEST_INDEX_KEY)['ContentLength']
+
+        print(f"{args.days} days x 24 hours x {args.cities} cities; index seeded with {seeded['updated']} locations")
+        print()
+        print(f"{'read':<34}{'median ms':>10}{'files':>7}{'bytes':>12}")
+        print(f"{'query 1 scan (query_local)':<34}{scan_ms:>10.1f}{stats['files_opened']:>7}{stats['bytes_scanned']:>12,}")
+        print(f"{'index, cold GET':<34}{cold_ms:>10.2f}{1:>7}{index_bytes:>12,}")
+        print(f"{'index, warm (304 revalidation)':<34}{warm_ms:>10.2f}{1:>7}{0:>12,}")
+        print(f"{'index, one city':<34}{one_ms:>10.2f}{1:>7}{0:>12,}")
+        newest = result.column('timestamp')[0].as_py()
+        print(f"Newest row from the scan: {newest}; from the index: "
+              f"{max(r['timestamp'] for r in latest_index.get_latest(client, BUCKET)['locations'].values())}")
+
+        print()
+        stats = concurrent_writers(client, args.writers, args.updates)
+        print(f"{args.writers} concurrent writers: {stats['updates']} updates in {stats['elapsed_s']:.2f} s, "
+              f"{stats['conflicts']} conflicts retried, {stats['lost']} lost updates")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Upstream calls saved by grid-based location deduplication
+
+Builds a dense urban site list (--sites-per-city sites scattered within
+--radius-km of each of --cities city centres) and ingests it against the
+local replay server for several grid sizes: once as a batch invocation
+(multi-coordinate requests) and once through the SQS fan-out consumer in
+batches of --batch-size, where one container's cache is shared across batches.
+Reports coordinates fetched, HTTP requests, the dedup ratio and the largest
+distance between a site and the site whose coordinates its cell was fetched at.
+
+Example:
+    python benchmarks/location_grid_benchmark.py --cities 5 --sites-per-city 60 --grids 0,0.025,0.05,0.1
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import MockContext, ReplayServer, load_lambda
+from local_s3 import LocalS3Client
+
+BUCKET = 'weather-data'
+CENTRES = [(51.5074, -0.1278), (48.8566, 2.3522), (52.52, 13.405), (40.4168, -3.7038), (41.9028, 12.4964),
+           (45.4642, 9.19), (50.1109, 8.6821), (53.5511, 9.9937), (48.1351, 11.582), (52.3676, 4.9041)]
+
+
+def make_sites(cities: int, per_city: int, radius_km: float) -> list:
+    rng = random.Random(cities * 1000 + per_city)
+    sites = []
+    for c, (latitude, longitude) in enumerate(CENTRES[:cities]):
+        for i in range(per_city):
+            distance = radius_km * math.sqrt(rng.random())
+            bearing = rng.uniform(0, 2 * math.pi)
+            sites.append({
+                'city': f'Site {c}-{i}',
+                'country_code': 'XX',
+                'latitude': round(latitude + distance * math.cos(bearing) / 111.0, 4),
+                'longitude': round(longitude + distance * math.sin(bearing) / (111.0 * math.cos(math.radians(latitude))), 4),
+            })
+    return sites
+
+
+def max_offset_km(location_grid, sites: list) -> float:
+    def km(site, fetched):
+        dy = (fetched['latitude'] - site['latitude']) * 111.0
+        dx = (fetched['longitude'] - site['longitude']) * 111.0 * math.cos(math.radians(site['latitude']))
+        return math.hypot(dx, dy)
+    # Each cell is fetched at its first site's coordinates
+    return max(km(sites[index], sites[indexes[0]])
+               for indexes in location_grid.group_by_cell(sites).values() for index in indexes)
+
+
+def sqs_records(sites: list) -> list:
+    return [{'messageId': str(i), 'receiptHandle': str(i), 'body': json.dumps(site),
+             'attributes': {'ApproximateReceiveCount': '1'}, 'eventSource': 'aws:sqs'}
+            for i, site in enumerate(sites)]
+
+
+def run(server: ReplayServer, sites: list, mode: str, batch_size: int, cache_ttl: float) -> dict:
+    root = tempfile.mkdtemp(prefix='location-grid-bench-')
+    try:
+        load_lambda(server.url, LocalS3Client(root), BUCKET, cache_ttl=cache_ttl)
+        import fanout
+        import lambda_function
+        import location_grid
+        before, requests_before = location_grid.get_counters(), server.requests
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if mode == 'batch':
+                result = lambda_function.lambda_handler({'locations': sites}, MockContext())
+                if result['statusCode'] != 200:
+                    raise RuntimeError(result['body'])
+            else:
+                records = sqs_records(sites)
+                for start in range(0, len(records), batch_size):
+                    response = fanout.consume_handler({'Records': records[start:start + batch_size]}, MockContext())
+                    if response['batchItemFailures']:
+                        raise RuntimeError(f"{len(response['batchItemFailures'])} items failed")
+        elapsed = time.perf_counter() - started
+        after = location_grid.get_counters()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    fetches = after['fetches'] - before['fetches']
+    return {'fetches': fetches, 'requests': server.requests - requests_before,
+            'dedup': 100.0 * (len(sites) - fetches) / len(sites), 'elapsed_s': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cities', type=int, default=5, help='City centres (up to 10)')
+    parser.add_argument('--sites-per-city', type=int, default=60, help='Sites around each centre')
+    parser.add_argument('--radius-km', type=float, default=8.0, help='Sites lie within this distance of the centre')
+    parser.add_argument('--grids', default='0,0.025,0.05,0.1', help='Comma-separated grid sizes in degrees')
+    parser.add_argument('--batch-size', type=int, default=25, help='SQS batch size for the fan-out run')
+    parser.add_argument('--latency-ms', type=float, default=30.0, help='Replay server latency per request')
+    args = parser.parse_args()
+
+    sites = make_sites(args.cities, args.sites_per_city, args.radius_km)
+    print(f"{len(sites)} sites around {args.cities} cities (radius {args.radius_km} km), "
+          f"API latency {args.latency_ms} ms")
+    print()
+    print(f"{'grid':>6}{'max km':>8}{'mode':>9}{'fetched':>9}{'requests':>10}{'dedup %':>9}{'seconds':>9}")
+    with ReplayServer(latency_ms=args.latency_ms) as server:
+        for grid in (float(value) for value in args.grids.split(',')):
+            import location_grid
+            location_grid.LOCATION_GRID_DEGREES = grid
+            offset = max_offset_km(location_grid, sites)
+            for mode in ('batch', 'fan-out'):
+                # One container consuming the batches of one cycle back to back
+                stats = run(server, sites, mode, args.batch_size, 0 if mode == 'batch' else 55)
+                print(f"{grid:>6}{offset:>8.2f}{mode:>9}{stats['fetches']:>9}{stats['requests']:>10}"
+                      f"{stats['dedup']:>9.1f}{stats['elapsed_s']:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
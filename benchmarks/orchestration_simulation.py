@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Local simulation of the sharded Step Functions orchestration
+
+Runs the state machine's steps in process against the replay server and a
+local bucket: sharding.plan_handler cuts --locations sites into shards, then a
+thread pool of --max-concurrency workers plays the Map state, calling
+sharding.shard_handler per shard and retrying a failed shard once as the Map's
+Retry would, and sharding.publish_handler merges the shards' partial indexes.
+Every S3 call is delayed by --s3-latency-ms.
+
+Checks that no grid cell is split across shards, that every site is in exactly
+one shard and written exactly once (Parquet rows and latest index entries),
+and reports the end-to-end time against the one-minute schedule window along
+with shard durations and latest-index write conflicts. Shards share one
+interpreter here, so CPU-bound work (record building, Parquet encoding) is
+serialized by the GIL and the times are pessimistic compared with one Lambda
+container per shard.
+
+Example:
+    python benchmarks/orchestration_simulation.py --locations 10000 --shard-sizes 100,250,1000 --max-concurrency 40
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import MetricsCapture, MockContext, ReplayServer, load_lambda, make_locations, percentile
+from local_s3 import LocalS3Client
+
+BUCKET = 'weather-data'
+
+
+class LatentS3Client:
+    """LocalS3Client whose calls each take at least latency_ms, like a round trip to S3"""
+
+    def __init__(self, client: LocalS3Client, latency_ms: float):
+        self._client = client
+        self._latency = latency_ms / 1000
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+        if not callable(method) or name == 'get_paginator':
+            return method
+
+        def call(*args, **kwargs):
+            time.sleep(self._latency)
+            return method(*args, **kwargs)
+        return call
+
+
+def check_plan(sharding, location_grid, sites: list, shards: list) -> str:
+    """Every site in exactly one shard and no cell in two shards"""
+    seen = {}
+    for number, shard in enumerate(shards):
+        for site in shard:
+            seen.setdefault(site['city'], []).append(number)
+    duplicated = sum(1 for numbers in seen.values() if len(numbers) > 1)
+    missing = len(sites) - len(seen)
+    cells = {}
+    for number, shard in enumerate(shards):
+        for site in shard:
+            cells.setdefault(location_grid.snap(site['latitude'], site['longitude']), set()).add(number)
+    split = sum(1 for numbers in cells.values() if len(numbers) > 1)
+    if duplicated or missing or split:
+        return f"FAILED ({missing} missing, {duplicated} duplicated, {split} cells split)"
+    return f"ok ({len(cells)} cells)"
+
+
+def count_written(client: LocalS3Client) -> int:
+    rows = 0
+    for page in client.get_paginator('list_objects_v2').paginate(Bucket=BUCKET):
+        for item in page.get('Contents', []):
+            if item['Key'].endswith('.parquet'):
+                body = client.get_object(Bucket=BUCKET, Key=item['Key'])['Body'].read()
+                rows += pq.read_metadata(io.BytesIO(body)).num_rows
+    return rows
+
+
+def run(server: ReplayServer, sites: list, shard_size: int, max_concurrency: int, s3_latency_ms: float) -> dict:
+    root = tempfile.mkdtemp(prefix='orchestration-sim-')
+    try:
+        local = LocalS3Client(root)
+        load_lambda(server.url, LatentS3Client(local, s3_latency_ms), BUCKET)
+        import latest_index
+        import location_grid
+        import sharding
+        capture = MetricsCapture()
+        context = MockContext()
+
+        def run_shard(entry: dict) -> tuple:
+            started = time.perf_counter()
+            for attempt in range(2):
+                try:
+                    sharding.shard_handler(entry, context)
+                    return time.perf_counter() - started, attempt
+                except Exception:
+                    if attempt:
+                        raise
+            raise AssertionError('unreachable')
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = sharding.plan_handler({'locations': sites, 'shard_size': shard_size}, context)
+            planned = time.perf_counter() - started
+            with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                results = list(executor.map(run_shard, plan['shards']))
+            published = sharding.publish_handler(plan, context)
+        elapsed = time.perf_counter() - started
+
+        shards = sharding.plan_shards(sharding.lambda_function.parse_locations({'locations': sites}), shard_size)
+        durations = [duration for duration, _ in results]
+        indexed = len(latest_index.get_latest(local, BUCKET)['locations'])
+        return {
+            'shards': len(plan['shards']),
+            'largest': max(entry['locations'] for entry in plan['shards']),
+            'plan_check': check_plan(sharding, location_grid, sites, shards),
+            'plan_s': planned,
+            'elapsed_s': elapsed,
+            'shard_p50_s': percentile(durations, 50),
+            'shard_max_s': max(durations),
+            'retried': sum(attempt for _, attempt in results),
+            'conflicts': sum(capture.values('LatestIndexConflicts')) + published['conflicts'],
+            'index_errors': sum(capture.values('LatestIndexErrors')),
+            'rows': count_written(local),
+            'indexed': indexed,
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--locations', type=int, default=10000, help='Sites to ingest')
+    parser.add_argument('--shard-sizes', default='100,250,1000', help='Comma-separated target locations per shard')
+    parser.add_argument('--max-concurrency', type=int, default=40, help='Map state max concurrency')
+    parser.add_argument('--latency-ms', type=float, default=30.0, help='Replay server latency per request')
+    parser.add_argument('--s3-latency-ms', type=float, default=20.0, help='Added latency per S3 call')
+    parser.add_argument('--window', type=float, default=60.0, help='Schedule window in seconds')
+    args = parser.parse_args()
+
+    sites = make_locations(args.locations)
+    print(f"{len(sites)} sites, max concurrency {args.max_concurrency}, API latency {args.latency_ms} ms, "
+          f"S3 latency {args.s3_latency_ms} ms")
+    print()
+    print(f"{'shard size':>10}{'shards':>8}{'largest':>9}{'plan s':>8}{'total s':>9}{'shard p50':>11}"
+          f"{'shard max':>11}{'retried':>9}{'conflicts':>11}{'rows':>8}{'indexed':>9}  fits  plan check")
+    with ReplayServer(latency_ms=args.latency_ms) as server:
+        for shard_size in (int(value) for value in args.shard_sizes.split(',')):
+            stats = run(server, sites, shard_size, args.max_concurrency, args.s3_latency_ms)
+            fits = 'yes' if stats['elapsed_s'] < args.window and stats['rows'] == len(sites) else 'NO'
+            print(f"{shard_size:>10}{stats['shards']:>8}{stats['largest']:>9}{stats['plan_s']:>8.2f}"
+                  f"{stats['elapsed_s']:>9.2f}{stats['shard_p50_s']:>11.2f}{stats['shard_max_s']:>11.2f}"
+                  f"{stats['retried']:>9}{stats['conflicts']:>11.0f}{stats['rows']:>8}{stats['indexed']:>9}"
+                  f"  {fits:<4}  {stats['plan_check']}")
+            if stats['index_errors']:
+                print(f"{'':>10}{stats['index_errors']:.0f} shards gave up updating the latest index")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Compare the Parquet writer profiles in utils.WRITER_PROFILES on a synthetic month
+
+Generates a month of 15-minute observations for many cities, writes it with
+each profile and reports file size, encode time and two Athena-style filtered
+reads (one city; one day). For each read, the row groups whose min/max statistics
+can match the predicate are counted, together with the compressed bytes of the
+columns the query touches in them, which approximates what Athena scans. The
+read time uses pyarrow with the same filter pushed down.
+
+Example:
+    python benchmarks/parquet_profile_benchmark.py --cities 100 --days 30 --row-group-size 50000
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'weather_ingestion'))
+from columnar import map_weather_codes
+from utils import WRITER_PROFILES, get_weather_schema, table_to_parquet
+
+START = datetime(2024, 1, 1)
+
+
+def synthetic_month(cities: int, days: int, step_minutes: int = 15) -> pa.Table:
+    """Rows in arrival order: every city's observation for one step, then the next step"""
+    rng = np.random.default_rng(7)
+    steps = days * 24 * 60 // step_minutes
+    rows = steps * cities
+    timestamps = np.repeat(np.datetime64(START, 'ms') + np.arange(steps) * np.timedelta64(step_minutes, 'm'), cities)
+    city_index = np.tile(np.arange(cities), steps)
+    codes = pa.array(rng.choice(np.array([0, 1, 2, 3, 45, 61, 63, 71, 95], dtype=np.int32), rows))
+    temperature = np.round(rng.normal(12, 8, rows), 1)
+    columns = {
+        'timestamp': pa.array(timestamps, type=pa.timestamp('ms')),
+        'city': pa.array([f'Site {i}' for i in range(cities)]).take(pa.array(city_index)),
+        'country_code': pa.array(['XX'] * rows),
+        'weather_id': codes,
+        **map_weather_codes(codes),
+        'temperature': pa.array(temperature),
+        'feels_like': pa.array(np.round(temperature - rng.uniform(0, 4, rows), 1)),
+        'temp_min': pa.array(temperature),
+        'temp_max': pa.array(temperature),
+        'pressure': pa.array(rng.integers(980, 1040, rows, dtype=np.int32)),
+        'humidity': pa.array(rng.integers(20, 100, rows, dtype=np.int32)),
+        'visibility': pa.array(rng.integers(1, 50, rows, dtype=np.int32)),
+        'wind_speed': pa.array(np.round(rng.uniform(0, 40, rows), 1)),
+        'wind_deg': pa.array(rng.integers(0, 360, rows, dtype=np.int32)),
+        'clouds': pa.array(rng.integers(0, 100, rows, dtype=np.int32)),
+        'timezone': pa.array(['GMT'] * rows),
+        'latitude': pa.array(rng.uniform(36, 60, cities)[city_index]),
+        'longitude': pa.array(rng.uniform(-10, 25, cities)[city_index]),
+    }
+    schema = get_weather_schema()
+    return pa.Table.from_arrays(
+        [columns[field.name].cast(field.type) if field.name in columns else pa.nulls(rows, field.type)
+         for field in schema],
+        schema=schema
+    )
+
+
+def scanned(metadata: pq.FileMetaData, column: str, low, high, columns: list) -> tuple:
+    """Row groups whose statistics for `column` overlap [low, high], and their bytes for `columns`"""
+    names = [metadata.schema.column(i).name for i in range(metadata.num_columns)]
+    index = names.index(column)
+    groups = 0
+    size = 0
+    for rg in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg)
+        stats = row_group.column(index).statistics
+        if stats is not None and stats.has_min_max and (stats.max < low or stats.min > high):
+            continue
+        groups += 1
+        size += sum(row_group.column(names.index(name)).total_compressed_size for name in columns)
+    return groups, size
+
+
+def best_of(repeat: int, func, *args, **kwargs):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cities', type=int, default=100, help='Number of cities')
+    parser.add_argument('--days', type=int, default=30, help='Days of data')
+    parser.add_argument('--row-group-size', type=int, default=50000, help='Rows per row group')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    parser.add_argument('--profiles', default=','.join(WRITER_PROFILES), help='Comma-separated profile names')
+    args = parser.parse_args()
+
+    table = synthetic_month(args.cities, args.days)
+    city = f'Site {args.cities // 2}'
+    day_start = START + timedelta(days=args.days // 2)
+    day_end = day_start + timedelta(days=1) - timedelta(milliseconds=1)
+    queries = [
+        ('city', f"city = '{city}'", 'city', city, city, [('city', '=', city)]),
+        ('day', f"timestamp within {day_start.date()}", 'timestamp', day_start, day_end,
+         [('timestamp', '>=', day_start), ('timestamp', '<=', day_end)]),
+    ]
+    read_columns = ['timestamp', 'city', 'temperature', 'humidity']
+
+    print(f"{table.num_rows:,} rows ({args.cities} cities x {args.days} days, 15-minute steps), "
+          f"row groups of {args.row_group_size:,} rows")
+    for name, predicate, *_ in queries:
+        print(f"  {name}: SELECT {', '.join(read_columns)} WHERE {predicate}")
+    print()
+    header = f"{'profile':<17}{'size (KiB)':>11}{'encode ms':>11}"
+    for name, *_ in queries:
+        header += f" |{name + ' rg':>9}{name + ' KiB':>10}{name + ' ms':>9}"
+    print(header)
+    for profile in args.profiles.split(','):
+        encode_s, data = best_of(args.repeat, table_to_parquet, table, profile, args.row_group_size)
+        metadata = pq.ParquetFile(io.BytesIO(data)).metadata
+        line = f"{profile:<17}{len(data) / 1024:>11,.0f}{encode_s * 1000:>11.1f}"
+        for _, _, column, low, high, filters in queries:
+            groups, size = scanned(metadata, column, low, high, read_columns)
+            read_s, _ = best_of(args.repeat, pq.read_table, io.BytesIO(data), columns=read_columns, filters=filters)
+            line += f" |{groups:>9}{size / 1024:>10,.0f}{read_s * 1000:>9.1f}"
+        print(line)
+    print()
+    print("rg = row groups read after min/max pruning; KiB = compressed bytes of the selected columns in them")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark the schema-fixed Arrow Parquet writer against the previous pandas writer
+
+Each writer runs in a fresh interpreter so import time and peak RSS are measured
+from a cold start, the way a Lambda container would see them.
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'weather_ingestion')
+
+
+def legacy_convert_to_parquet(data):
+    """The pandas-based implementation this benchmark compares against"""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = pd.DataFrame(data)
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    table = pa.Table.from_pandas(df)
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression='snappy')
+    return buffer.getvalue()
+
+
+class _BlockPandas:
+    """Import hook that makes pandas unimportable, as in the deployed Lambda package"""
+
+    def find_spec(self, name, path=None, target=None):
+        if name == 'pandas' or name.startswith('pandas.'):
+            raise ImportError(name)
+        return None
+
+
+def make_records(count: int) -> list:
+    start = datetime(2024, 1, 1)
+    return [{
+        'timestamp': (start + timedelta(minutes=i)).isoformat(),
+        'city': 'London',
+        'country_code': 'GB',
+        'weather_id': 3,
+        'weather_main': 'Clouds',
+        'weather_description': 'Overcast',
+        'temperature': 10.0 + (i % 7),
+        'feels_like': 8.0,
+        'temp_min': 10.0,
+        'temp_max': 10.0,
+        'pressure': 1012,
+        'humidity': 80,
+        'visibility': 24,
+        'wind_speed': 12.5,
+        'wind_deg': 270,
+        'clouds': 75,
+        'sunrise': None,
+        'sunset': None,
+        'timezone': 'Europe/London',
+        'latitude': 51.5074,
+        'longitude': -0.1278,
+    } for i in range(count)]
+
+
+def worker(writer: str, batch_sizes: list, iterations: int) -> dict:
+    """Runs inside the child interpreter and reports its measurements as JSON"""
+    started = time.perf_counter()
+    if writer == 'arrow':
+        # pandas is no longer packaged with the Lambda; pyarrow would otherwise probe it when installed
+        sys.meta_path.insert(0, _BlockPandas())
+        sys.path.insert(0, LAMBDA_DIR)
+        from utils import convert_to_parquet
+    else:
+        import pandas  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+        convert_to_parquet = legacy_convert_to_parquet
+    import_s = time.perf_counter() - started
+
+    encode = {}
+    for batch_size in batch_sizes:
+        records = make_records(batch_size)
+        convert_to_parquet(records)  # Warm-up
+        timings = []
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            convert_to_parquet(records)
+            timings.append(time.perf_counter() - t0)
+        encode[str(batch_size)] = {
+            'best_ms': min(timings) * 1000,
+            'mean_ms': sum(timings) / len(timings) * 1000,
+        }
+
+    return {
+        'writer': writer,
+        'pandas_imported': 'pandas' in sys.modules,
+        'import_ms': import_s * 1000,
+        # ru_maxrss is KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'encode': encode,
+    }
+
+
+def run_child(writer: str, batch_sizes: list, iterations: int) -> dict:
+    output = subprocess.check_output([
+        sys.executable, __file__, '--worker', writer,
+        '--batch-sizes', ','.join(map(str, batch_sizes)),
+        '--iterations', str(iterations),
+    ])
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-sizes', default='1,100,1000', help='Comma-separated records per batch')
+    parser.add_argument('--iterations', type=int, default=50, help='Encodes per batch size')
+    parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters per writer')
+    parser.add_argument('--worker', choices=['arrow', 'legacy'], help=argparse.SUPPRESS)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, batch_sizes, args.iterations)))
+        return
+
+    results = {}
+    for writer in ('legacy', 'arrow'):
+        runs = [run_child(writer, batch_sizes, args.iterations) for _ in range(args.runs)]
+        results[writer] = {
+            'pandas_imported': runs[0]['pandas_imported'],
+            'import_ms': min(r['import_ms'] for r in runs),
+            'peak_rss_mb': min(r['peak_rss_mb'] for r in runs),
+            'encode_ms': {b: min(r['encode'][b]['best_ms'] for r in runs) for b in map(str, batch_sizes)},
+        }
+
+    print(f"{'writer':<10}{'pandas':>8}{'import ms':>12}{'peak RSS MB':>14}" +
+          ''.join(f"{'encode ' + b + ' ms':>16}" for b in map(str, batch_sizes)))
+    for writer, r in results.items():
+        print(f"{writer:<10}{str(r['pandas_imported']):>8}{r['import_ms']:>12.1f}{r['peak_rss_mb']:>14.1f}" +
+              ''.join(f"{r['encode_ms'][b]:>16.3f}" for b in map(str, batch_sizes)))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
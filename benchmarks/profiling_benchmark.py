@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Overhead of the opt-in profiling hooks
+
+Runs the batch ingestion handler against the local replay server --invocations
+times per mode: `off` is the handler as deployed with PROFILING_ENABLED=false
+(profiling.profiled returned it unchanged), `sampled 0` is the wrapper that
+never samples, then sample rates of 0.1 and 1.0 with cProfile alone and with
+tracemalloc as well. Profiles go to a temporary directory; the last one is
+summarized (top functions, heaviest collapsed stacks, allocation report).
+
+Example:
+    python benchmarks/profiling_benchmark.py --locations 50 --invocations 40
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import MockContext, ReplayServer, load_lambda, make_locations, percentile
+from local_s3 import LocalS3Client
+
+BUCKET = 'weather-data'
+
+
+def timed(handler, event, invocations: int) -> list:
+    context = MockContext()
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(invocations):
+            started = time.perf_counter()
+            result = handler(event, context)
+            timings.append(time.perf_counter() - started)
+            if result['statusCode'] != 200:
+                raise RuntimeError(result['body'])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--locations', type=int, default=50, help='Locations per invocation')
+    parser.add_argument('--invocations', type=int, default=40, help='Invocations per mode')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Replay server latency per request')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='profiling-bench-')
+    sink = os.path.join(root, 'profiles')
+    try:
+        with ReplayServer(latency_ms=args.latency_ms) as server:
+            lambda_function = load_lambda(server.url, LocalS3Client(os.path.join(root, 's3')), BUCKET)
+            import profiling
+            handler = lambda_function.lambda_handler
+            if profiling.PROFILING_ENABLED:
+                raise SystemExit("Unset PROFILING_ENABLED: the benchmark wraps the handler itself")
+            print(f"PROFILING_ENABLED=false returns the handler unchanged: "
+                  f"{profiling.profiled(handler) is handler}")
+
+            event = {'locations': make_locations(args.locations)}
+            modes = [
+                ('off', handler),
+                ('sampled 0', profiling.wrap(handler, 0.0, sink)),
+                ('cProfile 0.1', profiling.wrap(handler, 0.1, sink, trace_memory=False)),
+                ('cProfile 1.0', profiling.wrap(handler, 1.0, sink, trace_memory=False)),
+                ('+tracemalloc 0.1', profiling.wrap(handler, 0.1, sink, trace_memory=True)),
+                ('+tracemalloc 1.0', profiling.wrap(handler, 1.0, sink, trace_memory=True)),
+            ]
+            timed(handler, event, 3)  # Warm up
+
+            print(f"{args.locations} locations per invocation, {args.invocations} invocations per mode")
+            print()
+            print(f"{'mode':<18}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}{'overhead':>10}{'profiles':>10}")
+            baseline = None
+            for name, wrapped in modes:
+                before = len(glob.glob(os.path.join(sink, '*', '*')))
+                timings = timed(wrapped, event, args.invocations)
+                mean = sum(timings) / len(timings)
+                baseline = baseline or mean
+                written = len(glob.glob(os.path.join(sink, '*', '*'))) - before
+                print(f"{name:<18}{percentile(timings, 50) * 1000:>9.2f}{percentile(timings, 95) * 1000:>9.2f}"
+                      f"{mean * 1000:>9.2f}{(mean / baseline - 1) * 100:>9.1f}%{written:>10}")
+
+        latest = sorted(glob.glob(os.path.join(sink, '*', '*')))[-1]
+        print()
+        print(f"Last profile: {sorted(os.listdir(latest))}")
+        stats = pstats.Stats(os.path.join(latest, 'profile.pstats'), stream=sys.stdout)
+        stats.sort_stats('cumulative').print_stats(12)
+        with open(os.path.join(latest, 'profile.collapsed')) as f:
+            stacks = f.read().splitlines()
+        total = sum(int(line.rsplit(' ', 1)[1]) for line in stacks)
+        print(f"{len(stacks)} collapsed stacks, {total / 1000:.1f} ms in total; heaviest:")
+        for line in stacks[:5]:
+            print(f"  ...{line[-150:]}")
+        print()
+        with open(os.path.join(latest, 'allocations.txt')) as f:
+            print(''.join(f.readlines()[:12]))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
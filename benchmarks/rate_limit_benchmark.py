@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the HTTP client's rate limiter and circuit breaker
+
+Throttling: worker threads fetch current conditions for every location from a
+replay server that answers 429 (Retry-After: 1) above --server-limit requests
+per minute; once without the client-side token bucket (each worker retries on
+its own) and once with it. Outage: every request fails with 503 after
+--outage-latency-ms, with and without the circuit breaker. Reports successes,
+failures, requests sent, 429s and achieved throughput.
+
+Example:
+    python benchmarks/rate_limit_benchmark.py --locations 300 --workers 20 --server-limit 1200
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import ReplayServer, load_lambda, make_locations
+from local_s3 import LocalS3Client
+
+BUCKET = 'weather-data'
+
+
+def run(server: ReplayServer, locations: list, workers: int, rate_limit_per_minute: float,
+        breaker_threshold: int) -> dict:
+    root = tempfile.mkdtemp(prefix='rate-limit-bench-')
+    try:
+        lambda_function = load_lambda(server.url, LocalS3Client(root), BUCKET,
+                                      rate_limit_per_minute=rate_limit_per_minute,
+                                      breaker_threshold=breaker_threshold)
+        import http_client
+
+        def fetch(location):
+            try:
+                lambda_function.fetch_current(location['latitude'], location['longitude'], server.url)
+                return True
+            except Exception:
+                return False
+
+        requests_before, throttled_before = server.requests, server.throttled
+        counters_before = http_client.get_counters()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(fetch, locations))
+        elapsed = time.perf_counter() - started
+        counters = http_client.get_counters()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        'ok': sum(results),
+        'failed': len(results) - sum(results),
+        'requests': server.requests - requests_before,
+        'throttled': server.throttled - throttled_before,
+        'rejected': counters['breaker_rejections'] - counters_before['breaker_rejections'],
+        'elapsed_s': elapsed,
+    }
+
+
+def report(label: str, stats: dict) -> None:
+    print(f"{label:<28}{stats['ok']:>6}{stats['failed']:>8}{stats['requests']:>10}{stats['throttled']:>7}"
+          f"{stats['rejected']:>10}{stats['elapsed_s']:>10.2f}{stats['ok'] / stats['elapsed_s']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--locations', type=int, default=300, help='Locations fetched per run')
+    parser.add_argument('--workers', type=int, default=20, help='Concurrent fetches')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Replay server latency per request')
+    parser.add_argument('--server-limit', type=float, default=1200, help='Server requests per minute before 429s')
+    parser.add_argument('--client-limit', type=float, default=0,
+                        help='Client token bucket rate (default: 95%% of --server-limit)')
+    parser.add_argument('--outage-latency-ms', type=float, default=200.0, help='Latency of the failing requests')
+    parser.add_argument('--breaker-threshold', type=int, default=5, help='Failures that open the circuit')
+    args = parser.parse_args()
+
+    locations = make_locations(args.locations)
+    client_limit = args.client_limit or args.server_limit * 0.95
+    print(f"{args.locations} locations, {args.workers} workers, server limit {args.server_limit:.0f}/min, "
+          f"client limit {client_limit:.0f}/min")
+    print()
+    print(f"{'scenario':<28}{'ok':>6}{'failed':>8}{'requests':>10}{'429s':>7}{'rejected':>10}"
+          f"{'elapsed s':>10}{'ok/s':>8}")
+
+    with ReplayServer(latency_ms=args.latency_ms, rate_limit_per_minute=args.server_limit) as server:
+        report('throttled, no limiter', run(server, locations, args.workers, 0, 0))
+        time.sleep(1)  # Let the server's bucket refill between runs
+        report('throttled, token bucket', run(server, locations, args.workers, client_limit, 0))
+
+    with ReplayServer(latency_ms=args.outage_latency_ms, error_fraction=1.0) as server:
+        report('outage, no breaker', run(server, locations, args.workers, 0, 0))
+        report('outage, circuit breaker', run(server, locations, args.workers, 0, args.breaker_threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the SQS fan-out topology
+
+The scheduler (fanout.schedule_handler) enqueues one work item per location into
+an in-memory queue; the queue is then drained in batches of the configured size
+as synthetic SQS events for fanout.consume_handler, against the local replay
+server and a filesystem S3 stand-in. Items reported in `batchItemFailures` are
+redelivered until --max-receives, then moved to a dead-letter list, like an SQS
+redrive policy. Reports throughput, invocations, redeliveries and dead-lettered
+items per batch size.
+
+Example:
+    python benchmarks/sqs_benchmark.py --locations 500 --batch-sizes 1,10,25,100 --error-fraction 0.2
+"""
+
+import argparse
+import collections
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import MockContext, ReplayServer, load_lambda, make_locations
+from local_s3 import LocalS3Client
+
+BUCKET = 'weather-data'
+QUEUE_URL = 'https://sqs.local/000000000000/weather-work'
+
+
+class LocalQueue:
+    """In-memory stand-in for the SQS calls the scheduler makes, plus a receive side"""
+
+    def __init__(self):
+        self.messages = collections.deque()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        for entry in Entries:
+            self.messages.append({'messageId': str(uuid.uuid4()), 'body': entry['MessageBody'], 'receives': 0})
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries], 'Failed': []}
+
+    def receive(self, max_messages: int) -> list:
+        batch = []
+        while self.messages and len(batch) < max_messages:
+            message = self.messages.popleft()
+            message['receives'] += 1
+            batch.append(message)
+        return batch
+
+
+def sqs_event(messages: list) -> dict:
+    return {'Records': [{
+        'messageId': message['messageId'],
+        'receiptHandle': message['messageId'],
+        'body': message['body'],
+        'attributes': {'ApproximateReceiveCount': str(message['receives'])},
+        'eventSource': 'aws:sqs',
+        'eventSourceARN': 'arn:aws:sqs:us-east-1:000000000000:weather-work',
+    } for message in messages]}
+
+
+def run(fanout, queue: LocalQueue, locations: list, batch_size: int, max_receives: int, invalid: int) -> dict:
+    started = time.perf_counter()
+    result = fanout.schedule_handler({'locations': locations}, MockContext())
+    if result['statusCode'] != 200:
+        raise RuntimeError(result['body'])
+    for _ in range(invalid):
+        queue.send_message_batch(QUEUE_URL, [{'Id': '0', 'MessageBody': '{"city": "no coordinates"}'}])
+    enqueue_s = time.perf_counter() - started
+
+    invocations = redeliveries = dead_lettered = 0
+    consume_started = time.perf_counter()
+    while queue.messages:
+        messages = queue.receive(batch_size)
+        response = fanout.consume_handler(sqs_event(messages), MockContext())
+        invocations += 1
+        failed = {item['itemIdentifier'] for item in response['batchItemFailures']}
+        for message in messages:
+            if message['messageId'] not in failed:
+                continue
+            if message['receives'] >= max_receives:
+                dead_lettered += 1
+            else:
+                redeliveries += 1
+                queue.messages.append(message)
+    consume_s = time.perf_counter() - consume_started
+    return {
+        'enqueue_s': enqueue_s,
+        'consume_s': consume_s,
+        'invocations': invocations,
+        'redeliveries': redeliveries,
+        'dead_lettered': dead_lettered,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--locations', type=int, default=200, help='Locations enqueued per run')
+    parser.add_argument('--batch-sizes', default='1,10,25,100', help='Comma-separated SQS batch sizes')
+    parser.add_argument('--workers', type=int, default=10, help='Concurrent fetches per batch (FANOUT_MAX_WORKERS)')
+    parser.add_argument('--latency-ms', type=float, default=30.0, help='Replay server latency per request')
+    parser.add_argument('--error-fraction', type=float, default=0.0, help='Share of API requests failing with 503')
+    parser.add_argument('--max-receives', type=int, default=3, help='Receives before an item is dead-lettered')
+    parser.add_argument('--invalid', type=int, default=0, help='Malformed work items added to each run')
+    args = parser.parse_args()
+
+    # Without retries every injected API error becomes an item failure
+    os.environ.setdefault('HTTP_MAX_RETRIES', '0' if args.error_fraction else '2')
+    locations = make_locations(args.locations)
+
+    with ReplayServer(latency_ms=args.latency_ms, error_fraction=args.error_fraction) as server:
+        print(f"{args.locations} locations, {args.workers} workers per batch, API latency {args.latency_ms} ms, "
+              f"error fraction {args.error_fraction}, {args.invalid} malformed items")
+        print()
+        print(f"{'batch':>6}{'invocations':>13}{'redelivered':>13}{'dead':>6}{'enqueue ms':>12}"
+              f"{'consume s':>11}{'locations/s':>13}")
+        for batch_size in (int(value) for value in args.batch_sizes.split(',')):
+            root = tempfile.mkdtemp(prefix='sqs-bench-')
+            try:
+                load_lambda(server.url, LocalS3Client(root), BUCKET)
+                import fanout
+                queue = LocalQueue()
+                fanout.sqs_client = queue
+                fanout.QUEUE_URL = QUEUE_URL
+                fanout.FANOUT_MAX_WORKERS = args.workers
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stats = run(fanout, queue, locations, batch_size, args.max_receives, args.invalid)
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+            print(f"{batch_size:>6}{stats['invocations']:>13}{stats['redeliveries']:>13}{stats['dead_lettered']:>6}"
+                  f"{stats['enqueue_s'] * 1000:>12.1f}{stats['consume_s']:>11.2f}"
+                  f"{args.locations / stats['consume_s']:>13,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Peak memory of buffered vs streaming Parquet writes
+
+Generates one hour partition of large input files in a local bucket, then
+compacts a copy of it in a fresh subprocess per mode: `buffered` reads every
+input, serializes the whole file with table_to_parquet and PUTs it (the
+previous compaction path); `streaming` is compaction.compact_prefix, which
+streams row groups into a multipart upload. Reports peak RSS above the
+post-import baseline, time, output size and parts. Finally checks that a write
+failing halfway aborts its multipart upload and leaves no object behind.
+
+Example:
+    python benchmarks/streaming_benchmark.py --files 40 --rows-per-file 50000
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pyarrow as pa
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'weather_ingestion'))
+from local_s3 import LocalS3Client
+from utils import conform_table, get_weather_schema, table_to_parquet
+
+BUCKET = 'weather-data'
+PREFIX = 'year=2024/month=01/day=01/hour=05/'
+
+
+def synthetic_table(rows: int, seed: int) -> pa.Table:
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1, 5)
+    columns = {
+        'timestamp': pa.array([start + timedelta(milliseconds=int(ms)) for ms in rng.integers(0, 3600000, rows)],
+                              pa.timestamp('ms')),
+        'city': pa.array([f'Site {i}' for i in rng.integers(0, 2000, rows)]),
+        'country_code': pa.array(['XX'] * rows),
+    }
+    for field in get_weather_schema():
+        if field.name in columns:
+            continue
+        if pa.types.is_floating(field.type):
+            columns[field.name] = pa.array(rng.uniform(-50, 50, rows), field.type)
+        elif pa.types.is_integer(field.type):
+            columns[field.name] = pa.array(rng.integers(0, 1000, rows), field.type)
+        else:
+            columns[field.name] = pa.array(['UTC'] * rows)
+    return conform_table(pa.table(columns))
+
+
+def generate(root: str, files: int, rows_per_file: int) -> int:
+    client = LocalS3Client(root)
+    size = 0
+    for i in range(files):
+        data = table_to_parquet(synthetic_table(rows_per_file, i))
+        client.put_object(Bucket=BUCKET, Key=f"{PREFIX}input_{i:04d}.parquet", Body=data)
+        size += len(data)
+    return size
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode: str, root: str) -> None:
+    import compaction
+    client = LocalS3Client(root)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if mode == 'buffered':
+        keys = compaction.list_parquet_keys(client, BUCKET, PREFIX)
+        table = pa.concat_tables([conform_table(compaction._read_table(client, BUCKET, key)) for key in keys])
+        data = table_to_parquet(table, compaction.COMPACTION_PARQUET_PROFILE, compaction.COMPACTION_ROW_GROUP_SIZE)
+        client.put_object(Bucket=BUCKET, Key=f"{PREFIX}compacted.parquet", Body=data)
+        result = {'rows': table.num_rows, 'bytes': len(data), 'parts': 0}
+    else:
+        result = compaction.compact_prefix(client, BUCKET, PREFIX)
+    result['elapsed_s'] = time.perf_counter() - started
+    result['peak_mb'] = peak_rss_mb() - baseline
+    print(json.dumps(result))
+
+
+def check_abort(root: str) -> str:
+    from streaming import stream_parquet
+
+    def failing_tables():
+        yield synthetic_table(200000, 1)
+        yield synthetic_table(200000, 2)
+        raise IOError("input read failed")
+
+    client = LocalS3Client(root)
+    key = 'aborted/compacted.parquet'
+    try:
+        stream_parquet(client, BUCKET, key, failing_tables(), 'ingest-fast', 50000)
+    except IOError:
+        pass
+    uploads = client.list_multipart_uploads(Bucket=BUCKET)['Uploads']
+    exists = bool(client.list_objects_v2(Bucket=BUCKET, Prefix=key).get('Contents'))
+    return 'ok' if not uploads and not exists else f"FAILED ({len(uploads)} open uploads, object exists: {exists})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=40, help='Input files in the partition')
+    parser.add_argument('--rows-per-file', type=int, default=50000, help='Rows per input file')
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'ROOT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    source = tempfile.mkdtemp(prefix='streaming-bench-')
+    try:
+        input_bytes = generate(source, args.files, args.rows_per_file)
+        print(f"{args.files} input files, {args.files * args.rows_per_file:,} rows, "
+              f"{input_bytes / 1024 / 1024:.1f} MiB")
+        print()
+        print(f"{'mode':<12}{'peak MiB':>10}{'seconds':>9}{'output MiB':>12}{'parts':>7}")
+        for mode in ('buffered', 'streaming'):
+            root = tempfile.mkdtemp(prefix=f'streaming-bench-{mode}-')
+            try:
+                shutil.copytree(os.path.join(source, BUCKET), os.path.join(root, BUCKET))
+                output = subprocess.run([sys.executable, __file__, '--child', mode, root],
+                                        check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+            print(f"{mode:<12}{result['peak_mb']:>10.1f}{result['elapsed_s']:>9.2f}"
+                  f"{result['bytes'] / 1024 / 1024:>12.1f}{result['parts']:>7}")
+        print()
+        print(f"Abort on failure: {check_abort(source)}")
+    finally:
+        shutil.rmtree(source, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,9 +4,16 @@ echo "Building Lambda dependencies for Python 3.11..."
 
 cd lambda/weather_ingestion
 
+# pyiceberg is only needed with TABLE_FORMAT=iceberg
+REQUIREMENTS="-r requirements.txt"
+if [ "${TABLE_FORMAT:-hive}" = "iceberg" ]; then
+    REQUIREMENTS="$REQUIREMENTS -r requirements-iceberg.txt"
+fi
+
 # Clean existing dependencies
 rm -rf boto3 botocore certifi charset_normalizer dateutil idna jmespath \
        numpy pandas pyarrow pytz requests s3transfer tzdata urllib3 six.py \
+       pyiceberg pyiceberg_core pydantic pydantic_core \
        bin numpy.libs __pycache__ *.pyc *.pyo *.pyd *.so *-*.dist-info *-*.egg-info 2>/dev/null || true
 
 # Try Docker first, fallback to local Python 3.11
@@ -14,7 +21,7 @@ if command -v docker &> /dev/null && docker ps &> /dev/null; then
     echo "Using Docker to build dependencies..."
     docker run --rm -v "$(pwd)":/var/task \
         public.ecr.aws/lambda/python:3.11 \
-        /bin/bash -c "pip install --no-cache-dir -r requirements.txt -t ."
+        /bin/bash -c "pip install --no-cache-dir $REQUIREMENTS -t ."
 else
     echo "Docker not available, using local Python 3.11..."
     if ! command -v python3.11 &> /dev/null; then
@@ -24,7 +31,7 @@ else
         exit 1
     fi
     python3.11 -m pip install --upgrade pip --user 2>/dev/null || true
-    python3.11 -m pip install --no-cache-dir -r requirements.txt -t .
+    python3.11 -m pip install --no-cache-dir $REQUIREMENTS -t .
 fi
 
 echo "✅ Dependencies built successfully!"
@@ -99,12 +99,6 @@ else
     echo "WARNING: Lambda requests not installed"
 fi
 
-if [ -d "lambda/weather_ingestion/pandas" ]; then
-    echo "OK: Lambda pandas installed"
-else
-    echo "WARNING: Lambda pandas not installed"
-fi
-
 if [ -d "lambda/weather_ingestion/pyarrow" ]; then
     echo "OK: Lambda pyarrow installed"
 else
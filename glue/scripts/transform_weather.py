@@ -1,15 +1,74 @@
 """
 AWS Glue ETL Script for Weather Data Transformation
 This script can be used to transform, clean, or aggregate weather data
+
+Transformations are defined in weather_transforms.py (pass it with
+--extra-py-files) as native Spark column expressions.
+
+Optional job arguments:
+    --MODE incremental   Only read partitions at or after the watermark (default: full)
+    --WATERMARK <hour>   Override the stored watermark, e.g. 2024-01-01T05 (backfills)
+
+In incremental mode the watermark is the latest hour written by the previous
+run, stored in <OUTPUT_PATH>/_watermark.json. That hour is read again in full
+because it may have received more data since. Output is written with dynamic
+partition overwrite, so only the partitions present in this run are replaced,
+and re-running a range is idempotent. File-level job bookmarks are deliberately
+not used on the source: a bookmark would hand the job only the new files of a
+partially processed hour, and the overwrite would then drop the older ones.
 """
 
+import json
 import sys
-from awsglue.transforms import *
+from urllib.parse import urlparse
+
+import boto3
+from botocore.exceptions import ClientError
 from awsglue.utils import getResolvedOptions
+from pyspark import StorageLevel
 from pyspark.context import SparkContext
 from awsglue.context import GlueContext
 from awsglue.job import Job
-from awsglue.dynamicframe import DynamicFrame
+
+from weather_transforms import (
+    PARTITION_KEYS, apply_transforms, format_watermark, latest_partition_hour, parse_watermark, partition_predicate
+)
+
+WATERMARK_FILE = '_watermark.json'  # Leading underscore: ignored by Spark and Athena readers
+
+
+def optional_arg(name, default=None):
+    """getResolvedOptions fails on missing arguments, so only resolve the ones passed"""
+    if f'--{name}' in sys.argv:
+        return getResolvedOptions(sys.argv, [name])[name]
+    return default
+
+
+def watermark_location(output_path):
+    location = urlparse(output_path)
+    return location.netloc, f"{location.path.strip('/')}/{WATERMARK_FILE}".lstrip('/')
+
+
+def read_watermark(output_path):
+    bucket, key = watermark_location(output_path)
+    try:
+        response = boto3.client('s3').get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            return None
+        raise
+    return parse_watermark(json.loads(response['Body'].read())['watermark'])
+
+
+def write_watermark(output_path, hour):
+    bucket, key = watermark_location(output_path)
+    boto3.client('s3').put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps({'watermark': format_watermark(hour)}).encode('utf-8'),
+        ContentType='application/json'
+    )
+
 
 # Initialize Glue context
 args = getResolvedOptions(sys.argv, ['JOB_NAME', 'DATABASE_NAME', 'TABLE_NAME', 'OUTPUT_PATH'])
@@ -23,61 +82,47 @@ job.init(args['JOB_NAME'], args)
 database_name = args['DATABASE_NAME']
 table_name = args['TABLE_NAME']
 output_path = args.get('OUTPUT_PATH', 's3://your-bucket/transformed/')
+mode = optional_arg('MODE', 'full')
+if mode not in ('full', 'incremental'):
+    raise Exception(f"MODE must be 'full' or 'incremental', got {mode!r}")
+
+# Incremental runs prune partitions in the catalog before any S3 listing
+watermark = None
+if mode == 'incremental':
+    watermark_arg = optional_arg('WATERMARK')
+    watermark = parse_watermark(watermark_arg) if watermark_arg else read_watermark(output_path)
+    print(f"Incremental run from {format_watermark(watermark) if watermark else 'the beginning'}")
 
 # Read data from Glue catalog
+# Glue ETL reads catalog partitions, not Athena projection: deploy with -c partition_registration=both
+# No transformation_ctx, so job bookmarks never filter files out of a partition being overwritten
 datasource = glueContext.create_dynamic_frame.from_catalog(
     database=database_name,
     table_name=table_name,
-    transformation_ctx="datasource"
+    push_down_predicate=partition_predicate(watermark) if watermark else ""
 )
+# Cached: the watermark and the write both need the input, and S3 should be read once
+source_df = datasource.toDF().persist(StorageLevel.MEMORY_AND_DISK)
 
-# Example transformations
-# 1. Filter data (e.g., only records with temperature > 0)
-def filter_positive_temp(record):
-    return record.get("temperature", 0) > 0
+# Advance from the input, not the filtered output, so hours with no kept rows still count as done.
+# Full runs record it too, so a later incremental run starts where they ended. Computing it fills
+# the cache that the write then reads; it is stored only once the write has succeeded.
+latest = latest_partition_hour(source_df)
 
-filtered_dyf = Filter.apply(
-    frame=datasource,
-    f=filter_positive_temp,
-    transformation_ctx="filtered"
-)
+# Filters and derived columns (e.g. temperature > 0, temperature in Fahrenheit)
+# run as Spark expressions; see weather_transforms.FILTERS and DERIVED_COLUMNS
+df = apply_transforms(source_df)
 
-# 2. Add calculated fields (e.g., temperature in Fahrenheit)
-def add_fahrenheit(record):
-    temp_c = record.get("temperature", 0)
-    record["temperature_f"] = (temp_c * 9/5) + 32
-    return record
+# Hourly and daily aggregates per city are maintained by the compaction Lambda
+# (lambda/weather_ingestion/rollups.py, Glue tables weather_hourly_rollup / weather_daily_rollup)
 
-transformed_dyf = Map.apply(
-    frame=filtered_dyf,
-    f=add_fahrenheit,
-    transformation_ctx="transformed"
-)
+# Write to S3 in Parquet format, replacing only the partitions produced by this run
+spark.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
+df.write.mode("overwrite").partitionBy(*PARTITION_KEYS).parquet(output_path)
 
-# Convert to Spark DataFrame for more complex operations if needed
-df = transformed_dyf.toDF()
-
-# Example: Aggregate by hour
-# df_hourly = df.groupBy("year", "month", "day", "hour").agg({
-#     "temperature": "avg",
-#     "humidity": "avg",
-#     "pressure": "avg"
-# })
-
-# Convert back to DynamicFrame
-final_dyf = DynamicFrame.fromDF(df, glueContext, "final_dyf")
-
-# Write to S3 in Parquet format
-glueContext.write_dynamic_frame.from_options(
-    frame=final_dyf,
-    connection_type="s3",
-    connection_options={
-        "path": output_path,
-        "partitionKeys": ["year", "month", "day", "hour"]
-    },
-    format="parquet",
-    transformation_ctx="datasink"
-)
+if latest is not None and (watermark is None or latest > watermark):
+    write_watermark(output_path, latest)
+    print(f"Watermark advanced to {format_watermark(latest)}")
+source_df.unpersist()
 
 job.commit()
-
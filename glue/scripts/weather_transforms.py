@@ -0,0 +1,154 @@
+"""
+Weather data transformations as native Spark column expressions
+
+Derived columns and row filters are declared as lists of specs and applied with
+DataFrame operations, so Spark evaluates them in the JVM (and can push filters
+down to the Parquet scan) instead of serializing every row through a Python worker.
+
+It also builds the partition predicates for incremental runs. This module depends
+only on PySpark, not awsglue, so it can be imported and run against a local
+SparkSession. Ship it to Glue with --extra-py-files.
+"""
+
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+from pyspark.sql import Column, DataFrame
+from pyspark.sql import functions as F
+
+
+class DerivedColumn(NamedTuple):
+    """A column added to every row"""
+    name: str
+    # Builds the expression; deferred because column functions need an active SparkContext
+    expression: Callable[[], Column]
+
+
+class RowFilter(NamedTuple):
+    """A predicate rows must satisfy to be kept"""
+    name: str
+    condition: Callable[[], Column]
+    # Rows whose condition evaluates to NULL (e.g. a missing input column value)
+    keep_nulls: bool = False
+
+
+# Derived columns see NULL inputs as NULL (no silent 0 substitution)
+DERIVED_COLUMNS: List[DerivedColumn] = [
+    DerivedColumn('temperature_f', lambda: F.col('temperature') * 9 / 5 + 32),
+]
+
+PARTITION_KEYS = ['year', 'month', 'day', 'hour']
+
+# Only records with temperature above 0 °C; records without a temperature are dropped
+FILTERS: List[RowFilter] = [
+    RowFilter('positive_temperature', lambda: F.col('temperature') > 0),
+]
+
+
+def filter_condition(filters: List[RowFilter]) -> Optional[Column]:
+    """
+    Combine row filters into one predicate with explicit NULL handling
+
+    Args:
+        filters: Row filters to AND together
+
+    Returns:
+        Combined predicate, or None if there are no filters
+    """
+    condition = None
+    for row_filter in filters:
+        predicate = F.coalesce(row_filter.condition(), F.lit(row_filter.keep_nulls))
+        condition = predicate if condition is None else condition & predicate
+    return condition
+
+
+def apply_transforms(
+    df: DataFrame,
+    derived_columns: Optional[List[DerivedColumn]] = None,
+    filters: Optional[List[RowFilter]] = None
+) -> DataFrame:
+    """
+    Apply filters, then derived columns, to a weather DataFrame
+
+    Filters run first so derived columns are only computed for kept rows, and
+    they are combined into a single predicate Spark can push into the scan.
+
+    Args:
+        df: Input DataFrame (weather_data schema)
+        derived_columns: Columns to add (defaults to DERIVED_COLUMNS)
+        filters: Row filters (defaults to FILTERS)
+
+    Returns:
+        Transformed DataFrame
+    """
+    derived_columns = DERIVED_COLUMNS if derived_columns is None else derived_columns
+    filters = FILTERS if filters is None else filters
+
+    condition = filter_condition(filters)
+    if condition is not None:
+        df = df.where(condition)
+
+    if derived_columns:
+        df = df.select('*', *[column.expression().alias(column.name) for column in derived_columns])
+    return df
+
+
+def partition_values(hour: datetime) -> List[str]:
+    """Zero-padded year/month/day/hour partition values, as written by the ingestion Lambda"""
+    return [f"{hour.year:04d}", f"{hour.month:02d}", f"{hour.day:02d}", f"{hour.hour:02d}"]
+
+
+def parse_watermark(value: str) -> datetime:
+    """
+    Parse a watermark hour such as 2024-01-01T05 (minutes and seconds are dropped)
+
+    Args:
+        value: ISO 8601 date or date-hour
+
+    Returns:
+        Datetime truncated to the hour
+    """
+    return datetime.fromisoformat(value).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def format_watermark(hour: datetime) -> str:
+    return hour.strftime('%Y-%m-%dT%H')
+
+
+def partition_predicate(watermark: datetime) -> str:
+    """
+    Partition predicate selecting hours at or after the watermark
+
+    The comparison is expanded column by column (year > Y OR year = Y AND month > M ...)
+    so the Glue catalog can evaluate it on partition values alone and never lists
+    older partitions. Values are zero-padded strings, so string comparison orders them.
+
+    Args:
+        watermark: First hour to include
+
+    Returns:
+        SQL predicate over PARTITION_KEYS, usable as push_down_predicate
+    """
+    values = partition_values(watermark)
+    clauses = []
+    for position, key in enumerate(PARTITION_KEYS):
+        operator = '>=' if position == len(PARTITION_KEYS) - 1 else '>'
+        equalities = [f"{PARTITION_KEYS[i]} = '{values[i]}'" for i in range(position)]
+        clauses.append('(' + ' AND '.join(equalities + [f"{key} {operator} '{values[position]}'"]) + ')')
+    return ' OR '.join(clauses)
+
+
+def latest_partition_hour(df: DataFrame) -> Optional[datetime]:
+    """
+    Most recent year/month/day/hour partition present in a DataFrame
+
+    Args:
+        df: DataFrame with PARTITION_KEYS columns
+
+    Returns:
+        The partition's hour, or None if the DataFrame is empty
+    """
+    row = df.select(F.max(F.concat(*[F.col(key) for key in PARTITION_KEYS])).alias('latest')).first()
+    if row is None or row['latest'] is None:
+        return None
+    return datetime.strptime(row['latest'], '%Y%m%d%H')
@@ -6,12 +6,106 @@ from aws_cdk import (
     BundlingOptions,
     aws_s3 as s3,
     aws_lambda as lambda_,
+    aws_lambda_event_sources as lambda_event_sources,
     aws_events as events,
     aws_events_targets as targets,
     aws_glue as glue,
+    aws_iam as iam,
+    aws_sqs as sqs,
+    aws_stepfunctions as sfn,
+    aws_stepfunctions_tasks as tasks,
 )
 from constructs import Construct
+import json
 import os
+import re
+from typing import Dict, List, Optional
+
+# Measures aggregated by lambda/weather_ingestion/rollups.py
+ROLLUP_MEASURES = ["temperature", "feels_like", "humidity", "pressure", "wind_speed", "wind_deg"]
+
+# Ranges of the zero-padded partition keys below year
+PROJECTED_KEY_RANGES = {"month": "1,12", "day": "1,31", "hour": "0,23"}
+
+# Concurrent iterations an inline Map state runs at most; beyond it use sfn_map=distributed
+INLINE_MAP_MAX_CONCURRENCY = 40
+
+# Iceberg types of the Glue column types (table_format=iceberg)
+ICEBERG_TYPES = {"timestamp": "timestamp", "string": "string", "int": "int", "bigint": "long", "double": "double"}
+
+# Same as lambda/weather_ingestion/iceberg_table.table_properties()
+ICEBERG_TABLE_PROPERTIES = {
+    "write.format.default": "parquet",
+    "write.parquet.compression-codec": "zstd",
+    "write.target-file-size-bytes": str(128 * 1024 * 1024),
+    "commit.manifest-merge.enabled": "true",
+    "commit.manifest.min-count-to-merge": "16",
+    "write.metadata.delete-after-commit.enabled": "true",
+    "write.metadata.previous-versions-max": "20",
+    "commit.retry.num-retries": "10",
+    "commit.retry.max-wait-ms": "2000",
+    "commit.retry.total-timeout-ms": "20000",
+    "history.expire.max-snapshot-age-ms": str(6 * 3600 * 1000),
+    "history.expire.min-snapshots-to-keep": "10",
+}
+
+# weather_data partition keys below the optional shard key (utils.KEY_LAYOUTS)
+KEY_LAYOUTS = {
+    "time": ["year", "month", "day", "hour"],
+    "location": ["year", "month", "day", "hour", "location"],
+}
+
+
+def location_slug(city: str, country_code: Optional[str]) -> str:
+    """location= partition value for a city; must match utils.location_slug"""
+    slug = re.sub(r"[^a-z0-9]+", "_", f"{city}_{country_code or ''}".lower()).strip("_")
+    return slug or "unknown"
+
+
+def partition_projection(location: str, partition_keys: List[str], start_year: str,
+                         shards: int = 0, location_values: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Athena partition projection parameters for [shard=/]year=/month=/day=[/hour=][/location=] prefixes
+
+    Args:
+        location: S3 location the partition prefixes live under, ending in '/'
+        partition_keys: Partition keys in path order
+        start_year: First projected year (projection runs up to the current year)
+        shards: Number of hash prefixes, when partition_keys has shard
+        location_values: Location slugs, when partition_keys has location
+
+    Returns:
+        Table parameters enabling projection
+    """
+    parameters = {
+        "projection.enabled": "true",
+        "projection.year.type": "date",
+        "projection.year.format": "yyyy",
+        "projection.year.range": f"{start_year},NOW",
+        "projection.year.interval": "1",
+        "projection.year.interval.unit": "YEARS",
+    }
+    for key in partition_keys:
+        if key in PROJECTED_KEY_RANGES:
+            parameters.update({
+                f"projection.{key}.type": "integer",
+                f"projection.{key}.range": PROJECTED_KEY_RANGES[key],
+                f"projection.{key}.digits": "2",
+            })
+        elif key == "shard":
+            parameters.update({
+                "projection.shard.type": "integer",
+                "projection.shard.range": f"0,{shards - 1}",
+                "projection.shard.digits": "2",
+            })
+        elif key == "location":
+            # Athena only reads the listed locations; redeploy when the location list changes
+            parameters.update({
+                "projection.location.type": "enum",
+                "projection.location.values": ",".join(location_values),
+            })
+    parameters["storage.location.template"] = location + "/".join(f"{key}=${{{key}}}" for key in partition_keys) + "/"
+    return parameters
 
 
 class WeatherPipelineStack(Stack):
@@ -33,44 +127,112 @@ class WeatherPipelineStack(Stack):
             removal_policy=RemovalPolicy.RETAIN,  # Retain bucket on stack deletion
             auto_delete_objects=False,
         )
+        # Streaming writes (compaction, backfill) use multipart uploads; clear any a crash left behind
+        weather_bucket.add_lifecycle_rule(abort_incomplete_multipart_upload_after=Duration.days(1))
         
         # Get coordinates from context or use defaults (London)
         # Open-Meteo doesn't require API key
         latitude = float(self.node.try_get_context("latitude") or os.getenv("LATITUDE", "51.5074"))
         longitude = float(self.node.try_get_context("longitude") or os.getenv("LONGITUDE", "-0.1278"))
         
-        # Create Lambda function for weather ingestion
+        # Optional list of locations for batch ingestion (one invocation, one Parquet object)
+        # e.g. cdk deploy -c locations='[{"city":"Paris","country_code":"FR","latitude":48.85,"longitude":2.35}]'
+        locations = self.node.try_get_context("locations") or os.getenv("LOCATIONS")
+        if locations is not None and not isinstance(locations, str):
+            locations = json.dumps(locations)
+        
+        # Table format of new observations: "hive" (default) writes Parquet objects under the
+        # key layout below for the weather_data table; "iceberg" appends them to the
+        # weather_iceberg table instead, whose manifests let queries skip files without listing.
+        # Only this mode ships pyiceberg (requirements-iceberg.txt) in the Lambda package
+        table_format = self.node.try_get_context("table_format") or os.getenv("TABLE_FORMAT", "hive")
+        if table_format not in ("hive", "iceberg"):
+            raise ValueError(f"table_format must be 'hive' or 'iceberg', got {table_format!r}")
+        
+        # Lambda deployment package shared by the ingestion and compaction functions
         # Use Docker bundling with exclusions to reduce package size
+        requirements = ["requirements.txt"] + (["requirements-iceberg.txt"] if table_format == "iceberg" else [])
+        pip_requirements = " ".join(f"-r /asset-output/{name}" for name in requirements)
+        lambda_code = lambda_.Code.from_asset(
+            "lambda/weather_ingestion",
+            bundling=BundlingOptions(
+                image=lambda_.Runtime.PYTHON_3_11.bundling_image,
+                command=[
+                    "bash", "-c",
+                    "cp -r /asset-input/* /asset-output/ && "
+                    f"pip install --no-cache-dir {pip_requirements} -t /asset-output && "
+                    "find /asset-output -type d -name '__pycache__' -exec rm -rf {} + 2>/dev/null || true && "
+                    "find /asset-output -type f -name '*.pyc' -delete && "
+                    "find /asset-output -type f -name '*.pyo' -delete && "
+                    "find /asset-output -type d -name '*.dist-info' -exec rm -rf {} + 2>/dev/null || true && "
+                    "find /asset-output -type d -name 'tests' -exec rm -rf {} + 2>/dev/null || true && "
+                    "find /asset-output -type d -name 'test' -exec rm -rf {} + 2>/dev/null || true && "
+                    "find /asset-output -type d -name 'doc' -exec rm -rf {} + 2>/dev/null || true && "
+                    "find /asset-output -type d -name 'docs' -exec rm -rf {} + 2>/dev/null || true && "
+                    "find /asset-output -type f -name '*.md' -delete && "
+                    "find /asset-output -type f -name '*.txt' ! -name 'requirements.txt' -delete && "
+                    "find /asset-output -type f -name 'LICENSE*' -delete && "
+                    "find /asset-output -type f -name '*.so.*' -delete"
+                ],
+            ),
+        )
+        
+        # Location lists beyond Lambda's 4 KB of environment variables can be stored as a JSON
+        # object in the bucket instead (read by the fanout=stepfunctions planner)
+        locations_key = self.node.try_get_context("locations_key") or os.getenv("LOCATIONS_KEY")
+        
+        # Trigger topology: "rule" (default) has EventBridge invoke the ingestion function
+        # directly; "sqs" has it invoke a scheduler that enqueues one work item per location,
+        # which the ingestion function consumes in batches (failed locations are retried alone);
+        # "stepfunctions" has it start a state machine that splits the locations into shards
+        # and ingests them in parallel through a Map state (lambda/weather_ingestion/sharding.py)
+        fanout = self.node.try_get_context("fanout") or os.getenv("FANOUT", "rule")
+        if fanout not in ("rule", "sqs", "stepfunctions"):
+            raise ValueError(f"fanout must be 'rule', 'sqs' or 'stepfunctions', got {fanout!r}")
+        if fanout == "sqs" and not locations:
+            raise ValueError("fanout=sqs needs a locations list to enqueue")
+        if fanout == "stepfunctions" and not (locations or locations_key):
+            raise ValueError("fanout=stepfunctions needs a locations list or locations_key to shard")
+        
+        # Orchestration settings (fanout=stepfunctions): "inline" Map iterations run inside one
+        # Express execution (up to 40 at once); "distributed" runs each shard as a child
+        # execution of a Standard workflow, for higher concurrency
+        sfn_map = self.node.try_get_context("sfn_map") or "inline"
+        if sfn_map not in ("inline", "distributed"):
+            raise ValueError(f"sfn_map must be 'inline' or 'distributed', got {sfn_map!r}")
+        sfn_shard_size = int(self.node.try_get_context("sfn_shard_size") or 250)
+        sfn_max_concurrency = int(self.node.try_get_context("sfn_max_concurrency") or INLINE_MAP_MAX_CONCURRENCY)
+        if sfn_map == "inline" and sfn_max_concurrency > INLINE_MAP_MAX_CONCURRENCY:
+            raise ValueError(f"sfn_map=inline runs at most {INLINE_MAP_MAX_CONCURRENCY} shards at once; "
+                             f"use sfn_map=distributed for sfn_max_concurrency={sfn_max_concurrency}")
+        sfn_shard_memory = int(self.node.try_get_context("sfn_shard_memory") or 512)
+        sfn_shard_timeout = int(self.node.try_get_context("sfn_shard_timeout_seconds") or 50)
+        
+        # Object key layout of weather_data: "time" (default) puts every city of an hour under
+        # year=/month=/day=/hour=; "location" adds a location=<city>_<country> partition below
+        # the hour. key_shards > 0 prefixes keys with shard=NN/ to spread writes over more S3
+        # prefixes. Move existing data with lambda/weather_ingestion/migrate_layout.py.
+        key_layout = self.node.try_get_context("key_layout") or os.getenv("KEY_LAYOUT", "time")
+        if key_layout not in KEY_LAYOUTS:
+            raise ValueError(f"key_layout must be one of {sorted(KEY_LAYOUTS)}, got {key_layout!r}")
+        key_shards = int(self.node.try_get_context("key_shards") or os.getenv("KEY_SHARDS", "0"))
+        data_partition_keys = (["shard"] if key_shards else []) + KEY_LAYOUTS[key_layout]
+        layout_environment = {"KEY_LAYOUT": key_layout, "KEY_SHARDS": str(key_shards)}
+        
+        # Create Lambda function for weather ingestion (one shard per invocation with fanout=stepfunctions)
+        ingestion_handlers = {
+            "rule": "lambda_function.lambda_handler",
+            "sqs": "fanout.consume_handler",
+            "stepfunctions": "sharding.shard_handler",
+        }
         weather_lambda = lambda_.Function(
             self,
             "WeatherIngestionFunction",
             runtime=lambda_.Runtime.PYTHON_3_11,
-            handler="lambda_function.lambda_handler",
-            code=lambda_.Code.from_asset(
-                "lambda/weather_ingestion",
-                bundling=BundlingOptions(
-                    image=lambda_.Runtime.PYTHON_3_11.bundling_image,
-                    command=[
-                        "bash", "-c",
-                        "cp -r /asset-input/* /asset-output/ && "
-                        "pip install --no-cache-dir -r /asset-output/requirements.txt -t /asset-output && "
-                        "find /asset-output -type d -name '__pycache__' -exec rm -rf {} + 2>/dev/null || true && "
-                        "find /asset-output -type f -name '*.pyc' -delete && "
-                        "find /asset-output -type f -name '*.pyo' -delete && "
-                        "find /asset-output -type d -name '*.dist-info' -exec rm -rf {} + 2>/dev/null || true && "
-                        "find /asset-output -type d -name 'tests' -exec rm -rf {} + 2>/dev/null || true && "
-                        "find /asset-output -type d -name 'test' -exec rm -rf {} + 2>/dev/null || true && "
-                        "find /asset-output -type d -name 'doc' -exec rm -rf {} + 2>/dev/null || true && "
-                        "find /asset-output -type d -name 'docs' -exec rm -rf {} + 2>/dev/null || true && "
-                        "find /asset-output -type f -name '*.md' -delete && "
-                        "find /asset-output -type f -name '*.txt' ! -name 'requirements.txt' -delete && "
-                        "find /asset-output -type f -name 'LICENSE*' -delete && "
-                        "find /asset-output -type f -name '*.so.*' -delete"
-                    ],
-                ),
-            ),
-            timeout=Duration.seconds(30),
-            memory_size=256,
+            handler=ingestion_handlers[fanout],
+            code=lambda_code,
+            timeout=Duration.seconds(sfn_shard_timeout if fanout == "stepfunctions" else 30),
+            memory_size=sfn_shard_memory if fanout == "stepfunctions" else 256,
             environment={
                 "WEATHER_API_URL": "https://api.open-meteo.com/v1/forecast",
                 "S3_BUCKET": weather_bucket.bucket_name,
@@ -78,11 +240,171 @@ class WeatherPipelineStack(Stack):
                 "LONGITUDE": str(longitude),
                 "CITY": self.node.try_get_context("city") or "London",
                 "COUNTRY_CODE": self.node.try_get_context("country_code") or "GB",
+                **layout_environment,
             },
         )
+        if locations:
+            weather_lambda.add_environment("LOCATIONS", locations)
+        
+        # Opt-in profiling (lambda/weather_ingestion/profiling.py): cProfile and tracemalloc
+        # reports for this fraction of ingestion invocations, written under _profiles/.
+        # With the default of 0 the handler is not wrapped at all.
+        profiling_sample_rate = float(self.node.try_get_context("profiling_sample_rate") or 0)
+        if profiling_sample_rate > 0:
+            weather_lambda.add_environment("PROFILING_ENABLED", "true")
+            weather_lambda.add_environment("PROFILING_SAMPLE_RATE", str(profiling_sample_rate))
+            weather_lambda.add_environment("PROFILING_SINK", f"s3://{weather_bucket.bucket_name}/_profiles")
+        # Also clears reports left behind after profiling is turned off
+        weather_bucket.add_lifecycle_rule(prefix="_profiles/", expiration=Duration.days(7))
         
         # Grant Lambda permission to write to S3 bucket
         weather_bucket.grant_write(weather_lambda)
+        # Change detection reads back its marker of the last written observations, and the
+        # latest-observation index is updated with a conditional read-merge-write
+        weather_bucket.grant_read(weather_lambda, "_state/*")
+        weather_bucket.grant_read(weather_lambda, "_index/*")
+        
+        schedule_target = targets.LambdaFunction(weather_lambda)
+        if fanout == "sqs":
+            # Items that keep failing (e.g. malformed locations) move to the dead-letter queue
+            dead_letter_queue = sqs.Queue(
+                self,
+                "WeatherWorkDeadLetterQueue",
+                retention_period=Duration.days(14),
+            )
+            work_queue = sqs.Queue(
+                self,
+                "WeatherWorkQueue",
+                # At least six times the consumer timeout, as recommended for Lambda event sources
+                visibility_timeout=Duration.seconds(180),
+                dead_letter_queue=sqs.DeadLetterQueue(
+                    max_receive_count=int(self.node.try_get_context("sqs_max_receive_count") or 3),
+                    queue=dead_letter_queue,
+                ),
+            )
+            weather_lambda.add_event_source(lambda_event_sources.SqsEventSource(
+                work_queue,
+                batch_size=int(self.node.try_get_context("sqs_batch_size") or 25),
+                max_batching_window=Duration.seconds(int(self.node.try_get_context("sqs_batching_window_seconds") or 5)),
+                report_batch_item_failures=True,
+            ))
+            
+            scheduler_lambda = lambda_.Function(
+                self,
+                "WeatherSchedulerFunction",
+                runtime=lambda_.Runtime.PYTHON_3_11,
+                handler="fanout.schedule_handler",
+                code=lambda_code,
+                timeout=Duration.minutes(1),
+                memory_size=256,
+                environment={
+                    "QUEUE_URL": work_queue.queue_url,
+                    "LOCATIONS": locations,
+                },
+            )
+            work_queue.grant_send_messages(scheduler_lambda)
+            schedule_target = targets.LambdaFunction(scheduler_lambda)
+            
+            # Change detection markers are keyed by each batch's set of locations, which
+            # varies from batch to batch; they are only useful for about 15 minutes
+            weather_bucket.add_lifecycle_rule(prefix="_state/observations/", expiration=Duration.days(1))
+        
+        if fanout == "stepfunctions":
+            planner_environment = {
+                "S3_BUCKET": weather_bucket.bucket_name,
+                "SHARD_SIZE": str(sfn_shard_size),
+            }
+            if locations:
+                planner_environment["LOCATIONS"] = locations
+            if locations_key:
+                planner_environment["LOCATIONS_KEY"] = locations_key
+            planner_lambda = lambda_.Function(
+                self,
+                "WeatherShardPlannerFunction",
+                runtime=lambda_.Runtime.PYTHON_3_11,
+                handler="sharding.plan_handler",
+                code=lambda_code,
+                timeout=Duration.seconds(30),
+                memory_size=512,
+                environment=planner_environment,
+            )
+            weather_bucket.grant_read_write(planner_lambda, "_state/shards/*")
+            if locations_key:
+                weather_bucket.grant_read(planner_lambda, locations_key)
+            
+            publisher_lambda = lambda_.Function(
+                self,
+                "WeatherIndexPublisherFunction",
+                runtime=lambda_.Runtime.PYTHON_3_11,
+                handler="sharding.publish_handler",
+                code=lambda_code,
+                timeout=Duration.seconds(30),
+                memory_size=512,
+                environment={
+                    "S3_BUCKET": weather_bucket.bucket_name,
+                },
+            )
+            weather_bucket.grant_read(publisher_lambda, "_state/shards/*")
+            weather_bucket.grant_read_write(publisher_lambda, "_index/*")
+            
+            # Plan -> ingest every shard -> merge the shards' partial indexes. Shards and their
+            # results travel by S3 key, so the state stays small for any number of locations.
+            plan_task = tasks.LambdaInvoke(
+                self,
+                "PlanShards",
+                lambda_function=planner_lambda,
+                payload_response_only=True,
+            )
+            shard_task = tasks.LambdaInvoke(
+                self,
+                "IngestShard",
+                lambda_function=weather_lambda,
+                payload_response_only=True,
+                result_path=sfn.JsonPath.DISCARD,
+            )
+            # One quick retry fits in the minute; a shard that still fails is skipped this cycle
+            # (it shows in the function's Errors metric) so the other shards and the index publish
+            shard_task.add_retry(errors=["States.ALL"], max_attempts=1, interval=Duration.seconds(1))
+            shard_task.add_catch(sfn.Pass(self, "ShardFailed"), result_path=sfn.JsonPath.DISCARD)
+            if sfn_map == "distributed":
+                shard_map = sfn.DistributedMap(
+                    self,
+                    "IngestShards",
+                    items_path="$.shards",
+                    max_concurrency=sfn_max_concurrency,
+                    map_execution_type=sfn.StateMachineType.EXPRESS,
+                    result_path=sfn.JsonPath.DISCARD,
+                )
+            else:
+                shard_map = sfn.Map(
+                    self,
+                    "IngestShards",
+                    items_path="$.shards",
+                    max_concurrency=sfn_max_concurrency,
+                    result_path=sfn.JsonPath.DISCARD,
+                )
+            shard_map.item_processor(shard_task)
+            publish_task = tasks.LambdaInvoke(
+                self,
+                "PublishLatestIndex",
+                lambda_function=publisher_lambda,
+                payload_response_only=True,
+            )
+            
+            orchestration = sfn.StateMachine(
+                self,
+                "WeatherOrchestrationStateMachine",
+                definition_body=sfn.DefinitionBody.from_chainable(plan_task.next(shard_map).next(publish_task)),
+                # Distributed Map needs a Standard workflow; inline runs are cheaper as Express
+                state_machine_type=(sfn.StateMachineType.STANDARD if sfn_map == "distributed"
+                                    else sfn.StateMachineType.EXPRESS),
+                # A run still going when the next one is scheduled is stopped
+                timeout=Duration.minutes(1),
+            )
+            schedule_target = targets.SfnStateMachine(orchestration)
+            
+            # Planned shards are rewritten hourly by a warm planner, and on every cold start
+            weather_bucket.add_lifecycle_rule(prefix="_state/shards/", expiration=Duration.days(2))
         
         # Stage 3: EventBridge Schedule - Trigger Lambda every minute
         event_rule = events.Rule(
@@ -92,7 +414,139 @@ class WeatherPipelineStack(Stack):
             schedule=events.Schedule.rate(Duration.minutes(1)),
             enabled=True,
         )
-        event_rule.add_target(targets.LambdaFunction(weather_lambda))
+        event_rule.add_target(schedule_target)
+        
+        # Hourly compaction: merge the closed hour's per-minute files into one Parquet object
+        compaction_lambda = lambda_.Function(
+            self,
+            "WeatherCompactionFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="compaction.lambda_handler",
+            code=lambda_code,
+            timeout=Duration.minutes(5),
+            memory_size=512,
+            environment={
+                "S3_BUCKET": weather_bucket.bucket_name,
+                **layout_environment,
+            },
+        )
+        weather_bucket.grant_read_write(compaction_lambda)
+        weather_bucket.grant_delete(compaction_lambda)
+        
+        compaction_rule = events.Rule(
+            self,
+            "WeatherCompactionSchedule",
+            description="Compact the previous hour's weather data files",
+            schedule=events.Schedule.cron(minute="10"),
+            enabled=True,
+        )
+        compaction_rule.add_target(targets.LambdaFunction(compaction_lambda))
+        
+        # Partition discovery for Athena: "projection" (default) computes partitions from the
+        # key template at query time; "glue" has the ingestion Lambda register each new
+        # partition in the catalog; "both" does both (Athena uses projection, Glue ETL jobs,
+        # which ignore projection, read the registered partitions). MSCK REPAIR TABLE is never needed.
+        partition_registration = (
+            self.node.try_get_context("partition_registration") or os.getenv("PARTITION_REGISTRATION", "projection")
+        )
+        if partition_registration not in ("projection", "glue", "both"):
+            raise ValueError(
+                f"partition_registration must be 'projection', 'glue' or 'both', got {partition_registration!r}"
+            )
+        projection_start_year = str(self.node.try_get_context("projection_start_year") or "2024")
+        
+        table_parameters = {
+            "classification": "parquet",
+            "typeOfData": "file"
+        }
+        if partition_registration in ("projection", "both"):
+            location_values = None
+            if "location" in data_partition_keys:
+                configured = json.loads(locations) if locations else [{
+                    "city": self.node.try_get_context("city") or "London",
+                    "country_code": self.node.try_get_context("country_code") or "GB",
+                }]
+                # Same city default as lambda_function.parse_locations
+                location_values = sorted({
+                    location_slug(loc.get("city") or f"{float(loc['latitude']):.4f},{float(loc['longitude']):.4f}",
+                                  loc.get("country_code"))
+                    for loc in configured
+                })
+            table_parameters.update(partition_projection(
+                f"s3://{weather_bucket.bucket_name}/", data_partition_keys, projection_start_year,
+                key_shards, location_values
+            ))
+        
+        # Historical backfill from the Open-Meteo archive (invoked manually, no schedule)
+        backfill_lambda = lambda_.Function(
+            self,
+            "WeatherBackfillFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="backfill.lambda_handler",
+            code=lambda_code,
+            timeout=Duration.minutes(15),
+            memory_size=1024,
+            environment={
+                "S3_BUCKET": weather_bucket.bucket_name,
+                **layout_environment,
+            },
+        )
+        if locations:
+            backfill_lambda.add_environment("LOCATIONS", locations)
+        weather_bucket.grant_read_write(backfill_lambda)
+        
+        # Hourly forecast ingestion (Open-Meteo refreshes its forecasts hourly)
+        forecast_resolution = self.node.try_get_context("forecast_resolution") or "hourly"
+        forecast_lambda = lambda_.Function(
+            self,
+            "WeatherForecastFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="forecast.lambda_handler",
+            code=lambda_code,
+            timeout=Duration.minutes(2),
+            memory_size=512,
+            environment={
+                "WEATHER_API_URL": "https://api.open-meteo.com/v1/forecast",
+                "S3_BUCKET": weather_bucket.bucket_name,
+                "LATITUDE": str(latitude),
+                "LONGITUDE": str(longitude),
+                "CITY": self.node.try_get_context("city") or "London",
+                "COUNTRY_CODE": self.node.try_get_context("country_code") or "GB",
+                "FORECAST_RESOLUTION": forecast_resolution,
+                "FORECAST_DAYS": str(self.node.try_get_context("forecast_days") or 7),
+            },
+        )
+        if locations:
+            forecast_lambda.add_environment("LOCATIONS", locations)
+        weather_bucket.grant_write(forecast_lambda, "forecasts/*")
+        
+        forecast_rule = events.Rule(
+            self,
+            "WeatherForecastSchedule",
+            description="Ingest the latest weather forecast",
+            schedule=events.Schedule.cron(minute="5"),
+            enabled=True,
+        )
+        forecast_rule.add_target(targets.LambdaFunction(forecast_lambda))
+        
+        # Optional read API over the latest-observation index: current conditions for one
+        # city (?city=London&country_code=GB) or all cities with one S3 GET, no Athena query
+        latest_api = str(self.node.try_get_context("latest_api") or os.getenv("LATEST_API", "false")).lower() == "true"
+        if latest_api:
+            latest_lambda = lambda_.Function(
+                self,
+                "WeatherLatestFunction",
+                runtime=lambda_.Runtime.PYTHON_3_11,
+                handler="latest_index.lambda_handler",
+                code=lambda_code,
+                timeout=Duration.seconds(10),
+                memory_size=128,
+                environment={
+                    "S3_BUCKET": weather_bucket.bucket_name,
+                },
+            )
+            weather_bucket.grant_read(latest_lambda, "_index/*")
+            latest_url = latest_lambda.add_function_url(auth_type=lambda_.FunctionUrlAuthType.AWS_IAM)
         
         # Stage 5: Glue Catalog & Table (No Crawler)
         # Create Glue Database
@@ -106,6 +560,31 @@ class WeatherPipelineStack(Stack):
             )
         )
         
+        # Columns written by the Lambda functions (the forecast table extends them)
+        weather_columns = [
+            glue.CfnTable.ColumnProperty(name="timestamp", type="timestamp", comment="Data collection timestamp"),
+            glue.CfnTable.ColumnProperty(name="city", type="string", comment="City name"),
+            glue.CfnTable.ColumnProperty(name="country_code", type="string", comment="Country code"),
+            glue.CfnTable.ColumnProperty(name="weather_id", type="int", comment="Weather condition ID"),
+            glue.CfnTable.ColumnProperty(name="weather_main", type="string", comment="Weather main condition"),
+            glue.CfnTable.ColumnProperty(name="weather_description", type="string", comment="Weather description"),
+            glue.CfnTable.ColumnProperty(name="temperature", type="double", comment="Temperature in Celsius"),
+            glue.CfnTable.ColumnProperty(name="feels_like", type="double", comment="Feels like temperature"),
+            glue.CfnTable.ColumnProperty(name="temp_min", type="double", comment="Minimum temperature"),
+            glue.CfnTable.ColumnProperty(name="temp_max", type="double", comment="Maximum temperature"),
+            glue.CfnTable.ColumnProperty(name="pressure", type="int", comment="Atmospheric pressure"),
+            glue.CfnTable.ColumnProperty(name="humidity", type="int", comment="Humidity percentage"),
+            glue.CfnTable.ColumnProperty(name="visibility", type="int", comment="Visibility in meters"),
+            glue.CfnTable.ColumnProperty(name="wind_speed", type="double", comment="Wind speed"),
+            glue.CfnTable.ColumnProperty(name="wind_deg", type="int", comment="Wind direction in degrees"),
+            glue.CfnTable.ColumnProperty(name="clouds", type="int", comment="Cloud coverage percentage"),
+            glue.CfnTable.ColumnProperty(name="sunrise", type="bigint", comment="Sunrise timestamp"),
+            glue.CfnTable.ColumnProperty(name="sunset", type="bigint", comment="Sunset timestamp"),
+            glue.CfnTable.ColumnProperty(name="timezone", type="string", comment="Timezone"),
+            glue.CfnTable.ColumnProperty(name="latitude", type="double", comment="Latitude"),
+            glue.CfnTable.ColumnProperty(name="longitude", type="double", comment="Longitude"),
+        ]
+        
         # Create Glue Table for weather data
         # Define schema based on the Lambda function output
         glue_table = glue.CfnTable(
@@ -117,35 +596,114 @@ class WeatherPipelineStack(Stack):
                 name="weather_data",
                 description="Weather data table with Parquet format",
                 table_type="EXTERNAL_TABLE",
+                parameters=table_parameters,
+                storage_descriptor=glue.CfnTable.StorageDescriptorProperty(
+                    columns=weather_columns,
+                    location=f"s3://{weather_bucket.bucket_name}/",
+                    input_format="org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat",
+                    output_format="org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat",
+                    serde_info=glue.CfnTable.SerdeInfoProperty(
+                        serialization_library="org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe",
+                        parameters={
+                            "serialization.format": "1"
+                        }
+                ),
+                    compressed=False,
+                    stored_as_sub_directories=True
+            ),
+                partition_keys=[
+                    glue.CfnTable.ColumnProperty(name=key, type="string", comment={
+                        "shard": "Hash prefix partition",
+                        "location": "Location partition (city and country code)",
+                    }.get(key, f"{key.capitalize()} partition"))
+                    for key in data_partition_keys
+                ]
+            )
+        )
+        glue_table.add_dependency(glue_database)
+        
+        # Hourly and daily rollups written after each hourly compaction (one row per city).
+        # Only Athena reads them, so they always use partition projection.
+        rollup_columns = [
+            glue.CfnTable.ColumnProperty(name="city", type="string", comment="City name"),
+            glue.CfnTable.ColumnProperty(name="country_code", type="string", comment="Country code"),
+            glue.CfnTable.ColumnProperty(name="period_start", type="timestamp", comment="Start of the hour or day"),
+            glue.CfnTable.ColumnProperty(name="record_count", type="bigint", comment="Raw records aggregated"),
+        ]
+        for measure in ROLLUP_MEASURES:
+            rollup_columns += [
+                glue.CfnTable.ColumnProperty(name=f"{measure}_avg", type="double", comment=f"Average {measure}"),
+                glue.CfnTable.ColumnProperty(name=f"{measure}_min", type="double", comment=f"Minimum {measure}"),
+                glue.CfnTable.ColumnProperty(name=f"{measure}_max", type="double", comment=f"Maximum {measure}"),
+                glue.CfnTable.ColumnProperty(name=f"{measure}_sum", type="double", comment=f"Sum of {measure}"),
+                glue.CfnTable.ColumnProperty(name=f"{measure}_count", type="bigint", comment=f"Non-null {measure} values"),
+            ]
+        
+        rollup_tables = {}
+        for grain, partition_keys in (("hourly", ["year", "month", "day", "hour"]), ("daily", ["year", "month", "day"])):
+            location = f"s3://{weather_bucket.bucket_name}/rollups/{grain}/"
+            rollup_table = glue.CfnTable(
+                self,
+                f"Weather{grain.capitalize()}RollupTable",
+                catalog_id=self.account,
+                database_name=glue_database.database_input.name,
+                table_input=glue.CfnTable.TableInputProperty(
+                    name=f"weather_{grain}_rollup",
+                    description=f"{grain.capitalize()} weather aggregates per city",
+                    table_type="EXTERNAL_TABLE",
+                    parameters={
+                        "classification": "parquet",
+                        "typeOfData": "file",
+                        **partition_projection(location, partition_keys, projection_start_year),
+                    },
+                    storage_descriptor=glue.CfnTable.StorageDescriptorProperty(
+                        columns=rollup_columns,
+                        location=location,
+                        input_format="org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat",
+                        output_format="org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat",
+                        serde_info=glue.CfnTable.SerdeInfoProperty(
+                            serialization_library="org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe",
+                            parameters={
+                                "serialization.format": "1"
+                            }
+                        ),
+                        compressed=False,
+                        stored_as_sub_directories=True
+                    ),
+                    partition_keys=[
+                        glue.CfnTable.ColumnProperty(name=key, type="string", comment=f"{key.capitalize()} partition")
+                        for key in partition_keys
+                    ]
+                )
+            )
+            rollup_table.add_resource_dependency(glue_database)
+            rollup_tables[grain] = rollup_table
+        
+        # Forecasts, partitioned by the hour they were issued. Each row is one valid time
+        # (timestamp) of one forecast run; issued_at and lead_minutes identify the run.
+        forecast_location = f"s3://{weather_bucket.bucket_name}/forecasts/"
+        forecast_table = glue.CfnTable(
+            self,
+            "WeatherForecastTable",
+            catalog_id=self.account,
+            database_name=glue_database.database_input.name,
+            table_input=glue.CfnTable.TableInputProperty(
+                name="weather_forecast",
+                description="Hourly weather forecasts with Parquet format",
+                table_type="EXTERNAL_TABLE",
                 parameters={
                     "classification": "parquet",
-                    "typeOfData": "file"
+                    "typeOfData": "file",
+                    **partition_projection(forecast_location, ["year", "month", "day", "hour"], projection_start_year),
                 },
                 storage_descriptor=glue.CfnTable.StorageDescriptorProperty(
                     columns=[
-                        glue.CfnTable.ColumnProperty(name="timestamp", type="timestamp", comment="Data collection timestamp"),
-                        glue.CfnTable.ColumnProperty(name="city", type="string", comment="City name"),
-                        glue.CfnTable.ColumnProperty(name="country_code", type="string", comment="Country code"),
-                        glue.CfnTable.ColumnProperty(name="weather_id", type="int", comment="Weather condition ID"),
-                        glue.CfnTable.ColumnProperty(name="weather_main", type="string", comment="Weather main condition"),
-                        glue.CfnTable.ColumnProperty(name="weather_description", type="string", comment="Weather description"),
-                        glue.CfnTable.ColumnProperty(name="temperature", type="double", comment="Temperature in Celsius"),
-                        glue.CfnTable.ColumnProperty(name="feels_like", type="double", comment="Feels like temperature"),
-                        glue.CfnTable.ColumnProperty(name="temp_min", type="double", comment="Minimum temperature"),
-                        glue.CfnTable.ColumnProperty(name="temp_max", type="double", comment="Maximum temperature"),
-                        glue.CfnTable.ColumnProperty(name="pressure", type="int", comment="Atmospheric pressure"),
-                        glue.CfnTable.ColumnProperty(name="humidity", type="int", comment="Humidity percentage"),
-                        glue.CfnTable.ColumnProperty(name="visibility", type="int", comment="Visibility in meters"),
-                        glue.CfnTable.ColumnProperty(name="wind_speed", type="double", comment="Wind speed"),
-                        glue.CfnTable.ColumnProperty(name="wind_deg", type="int", comment="Wind direction in degrees"),
-                        glue.CfnTable.ColumnProperty(name="clouds", type="int", comment="Cloud coverage percentage"),
-                        glue.CfnTable.ColumnProperty(name="sunrise", type="bigint", comment="Sunrise timestamp"),
-                        glue.CfnTable.ColumnProperty(name="sunset", type="bigint", comment="Sunset timestamp"),
-                        glue.CfnTable.ColumnProperty(name="timezone", type="string", comment="Timezone"),
-                        glue.CfnTable.ColumnProperty(name="latitude", type="double", comment="Latitude"),
-                        glue.CfnTable.ColumnProperty(name="longitude", type="double", comment="Longitude"),
+                        glue.CfnTable.ColumnProperty(name="timestamp", type="timestamp", comment="Forecast valid time"),
+                        *weather_columns[1:],
+                        glue.CfnTable.ColumnProperty(name="issued_at", type="timestamp", comment="When the forecast was fetched"),
+                        glue.CfnTable.ColumnProperty(name="lead_minutes", type="int", comment="Minutes from issue to valid time"),
                     ],
-                    location=f"s3://{weather_bucket.bucket_name}/",
+                    location=forecast_location,
                     input_format="org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat",
                     output_format="org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat",
                     serde_info=glue.CfnTable.SerdeInfoProperty(
@@ -153,19 +711,125 @@ class WeatherPipelineStack(Stack):
                         parameters={
                             "serialization.format": "1"
                         }
-                ),
+                    ),
                     compressed=False,
                     stored_as_sub_directories=True
-            ),
+                ),
                 partition_keys=[
-                    glue.CfnTable.ColumnProperty(name="year", type="string", comment="Year partition"),
-                    glue.CfnTable.ColumnProperty(name="month", type="string", comment="Month partition"),
-                    glue.CfnTable.ColumnProperty(name="day", type="string", comment="Day partition"),
-                    glue.CfnTable.ColumnProperty(name="hour", type="string", comment="Hour partition"),
+                    glue.CfnTable.ColumnProperty(name=key, type="string", comment=f"{key.capitalize()} partition")
+                    for key in ["year", "month", "day", "hour"]
                 ]
             )
         )
-        glue_table.add_dependency(glue_database)
+        forecast_table.add_resource_dependency(glue_database)
+        
+        # Iceberg table written by the ingestion function with table_format=iceberg. Glue creates
+        # the table's first metadata file; lambda/weather_ingestion/iceberg_table.py declares
+        # the same schema, partitioning (one partition per day), sort order and properties.
+        if table_format == "iceberg":
+            field_ids = {column.name: position + 1 for position, column in enumerate(weather_columns)}
+            iceberg_table = glue.CfnTable(
+                self,
+                "WeatherIcebergTable",
+                catalog_id=self.account,
+                database_name=glue_database.database_input.name,
+                name="weather_iceberg",
+                open_table_format_input=glue.CfnTable.OpenTableFormatInputProperty(
+                    iceberg_input=glue.CfnTable.IcebergInputProperty(
+                        metadata_operation="CREATE",
+                        version="2",
+                        iceberg_table_input=glue.CfnTable.IcebergTableInputProperty(
+                            location=f"s3://{weather_bucket.bucket_name}/iceberg/weather_iceberg",
+                            schema=glue.CfnTable.IcebergSchemaProperty(
+                                schema_id=0,
+                                type="struct",
+                                fields=[
+                                    glue.CfnTable.IcebergStructFieldProperty(
+                                        id=field_ids[column.name], name=column.name, required=False,
+                                        type=ICEBERG_TYPES[column.type], doc=column.comment,
+                                    )
+                                    for column in weather_columns
+                                ],
+                            ),
+                            partition_spec=glue.CfnTable.IcebergPartitionSpecProperty(
+                                spec_id=0,
+                                fields=[glue.CfnTable.IcebergPartitionFieldProperty(
+                                    name="timestamp_day", source_id=field_ids["timestamp"], transform="day", field_id=1000,
+                                )],
+                            ),
+                            write_order=glue.CfnTable.IcebergSortOrderProperty(
+                                order_id=1,
+                                fields=[
+                                    glue.CfnTable.IcebergSortFieldProperty(
+                                        source_id=field_ids[name], transform="identity", direction="asc",
+                                        null_order="nulls-first",
+                                    )
+                                    for name in ("city", "timestamp")
+                                ],
+                            ),
+                            properties=ICEBERG_TABLE_PROPERTIES,
+                        ),
+                    ),
+                ),
+            )
+            iceberg_table.add_resource_dependency(glue_database)
+            
+            iceberg_environment = {
+                "TABLE_FORMAT": "iceberg",
+                "ICEBERG_DATABASE": glue_database.database_input.name,
+                "ICEBERG_TABLE": iceberg_table.name,
+            }
+            iceberg_catalog_policy = iam.PolicyStatement(
+                actions=["glue:GetDatabase", "glue:GetTable", "glue:UpdateTable"],
+                resources=[
+                    f"arn:aws:glue:{self.region}:{self.account}:catalog",
+                    f"arn:aws:glue:{self.region}:{self.account}:database/{glue_database.database_input.name}",
+                    f"arn:aws:glue:{self.region}:{self.account}:table/{glue_database.database_input.name}/{iceberg_table.name}",
+                ],
+            )
+            for name, value in iceberg_environment.items():
+                weather_lambda.add_environment(name, value)
+            weather_lambda.add_to_role_policy(iceberg_catalog_policy)
+            # Commits read the current metadata and manifests (the bucket-wide write grant
+            # covers deleting metadata files beyond write.metadata.previous-versions-max)
+            weather_bucket.grant_read(weather_lambda, "iceberg/*")
+            
+            # Hourly maintenance: rewrite days with many small files as sorted files, expire
+            # old snapshots and delete the files no snapshot references any more
+            iceberg_maintenance_lambda = lambda_.Function(
+                self,
+                "WeatherIcebergMaintenanceFunction",
+                runtime=lambda_.Runtime.PYTHON_3_11,
+                handler="iceberg_table.maintenance_handler",
+                code=lambda_code,
+                timeout=Duration.minutes(15),
+                memory_size=2048,
+                environment=iceberg_environment,
+            )
+            iceberg_maintenance_lambda.add_to_role_policy(iceberg_catalog_policy)
+            weather_bucket.grant_read_write(iceberg_maintenance_lambda, "iceberg/*")
+            
+            iceberg_maintenance_rule = events.Rule(
+                self,
+                "WeatherIcebergMaintenanceSchedule",
+                description="Compact the Iceberg weather table and expire its old snapshots",
+                schedule=events.Schedule.cron(minute="20"),
+                enabled=True,
+            )
+            iceberg_maintenance_rule.add_target(targets.LambdaFunction(iceberg_maintenance_lambda))
+        
+        weather_lambda.add_environment("PARTITION_REGISTRATION", partition_registration)
+        if partition_registration in ("glue", "both"):
+            weather_lambda.add_environment("GLUE_DATABASE", glue_database.database_input.name)
+            weather_lambda.add_environment("GLUE_TABLE", glue_table.table_input.name)
+            weather_lambda.add_to_role_policy(iam.PolicyStatement(
+                actions=["glue:GetTable", "glue:BatchCreatePartition"],
+                resources=[
+                    f"arn:aws:glue:{self.region}:{self.account}:catalog",
+                    f"arn:aws:glue:{self.region}:{self.account}:database/{glue_database.database_input.name}",
+                    f"arn:aws:glue:{self.region}:{self.account}:table/{glue_database.database_input.name}/{glue_table.table_input.name}",
+                ],
+            ))
         
         # Output stack information
         CfnOutput(
@@ -210,6 +874,66 @@ class WeatherPipelineStack(Stack):
             description="EventBridge rule that triggers Lambda every minute"
         )
         
+        if fanout == "sqs":
+            CfnOutput(
+                self,
+                "WeatherWorkQueueUrl",
+                value=work_queue.queue_url,
+                description="SQS queue of per-location ingestion work items"
+            )
+            
+            CfnOutput(
+                self,
+                "WeatherWorkDeadLetterQueueUrl",
+                value=dead_letter_queue.queue_url,
+                description="Work items that failed repeatedly"
+            )
+        
+        if fanout == "stepfunctions":
+            CfnOutput(
+                self,
+                "WeatherOrchestrationStateMachineArn",
+                value=orchestration.state_machine_arn,
+                description="State machine ingesting the sharded location list every minute"
+            )
+        
+        if latest_api:
+            CfnOutput(
+                self,
+                "WeatherLatestUrl",
+                value=latest_url.url,
+                description="IAM-authenticated URL returning the latest observation per city"
+            )
+        
+        CfnOutput(
+            self,
+            "WeatherCompactionFunctionName",
+            value=compaction_lambda.function_name,
+            description="Name of the hourly compaction Lambda function"
+        )
+        
+        if table_format == "iceberg":
+            CfnOutput(
+                self,
+                "WeatherIcebergMaintenanceFunctionName",
+                value=iceberg_maintenance_lambda.function_name,
+                description="Name of the hourly Iceberg table maintenance Lambda function"
+            )
+        
+        CfnOutput(
+            self,
+            "WeatherBackfillFunctionName",
+            value=backfill_lambda.function_name,
+            description="Name of the historical backfill Lambda function"
+        )
+        
+        CfnOutput(
+            self,
+            "WeatherForecastFunctionName",
+            value=forecast_lambda.function_name,
+            description="Name of the forecast ingestion Lambda function"
+        )
+        
         CfnOutput(
             self,
             "GlueDatabaseName",
@@ -224,6 +948,20 @@ class WeatherPipelineStack(Stack):
             description="Glue table name for weather data"
         )
         
+        CfnOutput(
+            self,
+            "GlueRollupTableNames",
+            value=", ".join(table.table_input.name for table in rollup_tables.values()),
+            description="Glue tables with hourly and daily aggregates"
+        )
+        
+        CfnOutput(
+            self,
+            "GlueForecastTableName",
+            value=forecast_table.table_input.name,
+            description="Glue table with hourly weather forecasts"
+        )
+        
         CfnOutput(
             self,
             "AthenaQueryExample",
@@ -0,0 +1,316 @@
+"""
+Historical backfill from the Open-Meteo archive API
+
+Pulls hourly archive data for a date range and a list of locations in day or
+month chunks, runs the chunks concurrently on a bounded thread pool, converts
+the hourly arrays straight to Arrow and writes one Parquet object per hour
+partition (year=/month=/day=/hour=, in the same key layout as live ingestion).
+
+Object keys are deterministic and every finished chunk leaves a marker under
+_state/backfill/, so an interrupted backfill can simply be re-run: completed
+chunks are skipped and partially written ones are overwritten.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+import http_client
+from columnar import HOURLY_VARIABLES, hourly_to_table
+from lambda_function import parse_locations
+from streaming import stream_parquet
+from utils import create_object_prefix, layout_partition_keys, split_by_location
+
+# Configuration from environment variables
+ARCHIVE_API_URL = os.environ.get('ARCHIVE_API_URL', 'https://archive-api.open-meteo.com/v1/archive')
+S3_BUCKET = os.environ.get('S3_BUCKET')
+BACKFILL_MAX_WORKERS = int(os.environ.get('BACKFILL_MAX_WORKERS', '8'))
+# Each request's locations share one object per hour, so larger groups mean fewer, larger files
+BACKFILL_LOCATIONS_PER_REQUEST = int(os.environ.get('BACKFILL_LOCATIONS_PER_REQUEST', '50'))
+# Backfilled hours are written once and read many times, so write them compact
+BACKFILL_PARQUET_PROFILE = os.environ.get('BACKFILL_PARQUET_PROFILE', 'archive-compact')
+
+BACKFILL_STATE_PREFIX = '_state/backfill'
+CHUNK_SIZES = ('day', 'month')
+
+
+def date_chunks(start: date, end: date, chunk: str = 'month') -> List[Tuple[date, date]]:
+    """
+    Split an inclusive date range into day or calendar-month chunks
+
+    Args:
+        start: First day
+        end: Last day (inclusive)
+        chunk: 'day' or 'month'
+
+    Returns:
+        List of (first_day, last_day) tuples
+    """
+    if chunk not in CHUNK_SIZES:
+        raise ValueError(f"chunk must be one of {CHUNK_SIZES}, got {chunk!r}")
+    chunks = []
+    current = start
+    while current <= end:
+        if chunk == 'day':
+            last = current
+        else:
+            next_month = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+            last = min(end, next_month - timedelta(days=1))
+        chunks.append((current, last))
+        current = last + timedelta(days=1)
+    return chunks
+
+
+def group_id(locations: List[Dict[str, Any]]) -> str:
+    """Stable identifier for a group of locations, used in object keys and markers"""
+    keys = ';'.join(f"{loc['latitude']:.4f},{loc['longitude']:.4f}" for loc in locations)
+    return hashlib.sha1(keys.encode('utf-8')).hexdigest()[:12]
+
+
+def backfill_key(hour: datetime, group: str, location: Optional[str] = None) -> str:
+    # Deterministic, so a re-run chunk overwrites its own objects instead of duplicating rows
+    filename = f"backfill_{group}_{hour.strftime('%Y%m%d_%H%M%S')}.parquet"
+    return f"{create_object_prefix(hour, location, shard_value=location or group)}/{filename}"
+
+
+def marker_key(group: str, first_day: date, last_day: date) -> str:
+    return f"{BACKFILL_STATE_PREFIX}/{group}/{first_day.isoformat()}_{last_day.isoformat()}.done"
+
+
+def fetch_archive(locations: List[Dict[str, Any]], first_day: date, last_day: date,
+                  api_url: str = ARCHIVE_API_URL) -> List[Dict[str, Any]]:
+    """
+    Fetch hourly archive data for a group of locations in one request
+
+    Args:
+        locations: Normalized location dictionaries
+        first_day: First day
+        last_day: Last day (inclusive)
+        api_url: Archive API URL
+
+    Returns:
+        One Open-Meteo response per location, in order
+    """
+    params = {
+        'latitude': ','.join(str(loc['latitude']) for loc in locations),
+        'longitude': ','.join(str(loc['longitude']) for loc in locations),
+        'start_date': first_day.isoformat(),
+        'end_date': last_day.isoformat(),
+        'hourly': ','.join(HOURLY_VARIABLES),
+        'timezone': 'GMT',  # Partition by UTC hour, like live ingestion
+    }
+    try:
+        data = http_client.get_json(api_url, params)
+    except http_client.WeatherAPIError as e:
+        raise Exception(f"Failed to fetch archive data: {str(e)}")
+    results = data if isinstance(data, list) else [data]
+    if len(results) != len(locations):
+        raise Exception(f"Unexpected API response format: expected {len(locations)} results, got {len(results)}")
+    return results
+
+
+def split_by_hour(table: pa.Table) -> Iterator[Tuple[datetime, pa.Table]]:
+    """
+    Split a table into one slice per hour (rows must be on the hour)
+
+    Args:
+        table: Weather-schema table
+
+    Yields:
+        (hour, rows for that hour) in time order
+    """
+    table = table.sort_by([('timestamp', 'ascending'), ('city', 'ascending')])
+    timestamps = table['timestamp'].to_numpy()
+    if len(timestamps) == 0:
+        return
+    # Row offsets where the timestamp changes, plus both ends
+    bounds = np.concatenate(([0], np.flatnonzero(timestamps[1:] != timestamps[:-1]) + 1, [len(timestamps)]))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        yield table['timestamp'][int(start)].as_py(), table.slice(int(start), int(stop - start))
+
+
+def _marker_exists(s3_client, bucket: str, key: str) -> bool:
+    try:
+        s3_client.head_object(Bucket=bucket, Key=key)
+        return True
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+
+def run_chunk(s3_client, bucket: str, locations: List[Dict[str, Any]], first_day: date, last_day: date,
+              api_url: str = ARCHIVE_API_URL) -> Dict[str, Any]:
+    """
+    Backfill one location group for one date chunk
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        locations: Normalized location dictionaries (one request)
+        first_day: First day
+        last_day: Last day (inclusive)
+        api_url: Archive API URL
+
+    Returns:
+        Dictionary with chunk statistics
+    """
+    group = group_id(locations)
+    marker = marker_key(group, first_day, last_day)
+    if _marker_exists(s3_client, bucket, marker):
+        return {'group': group, 'first_day': first_day.isoformat(), 'skipped': True, 'rows': 0, 'files': 0}
+
+    responses = fetch_archive(locations, first_day, last_day, api_url)
+    table = pa.concat_tables([hourly_to_table(response, loc) for loc, response in zip(locations, responses)])
+
+    by_location = 'location' in layout_partition_keys()
+    files = 0
+    for hour, rows in split_by_hour(table):
+        for location, part in (split_by_location(rows) if by_location else [(None, rows)]):
+            stream_parquet(s3_client, bucket, backfill_key(hour, group, location), [part], BACKFILL_PARQUET_PROFILE)
+            files += 1
+
+    # Written last: a chunk without a marker is redone in full on the next run
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=marker,
+        Body=json.dumps({'rows': table.num_rows, 'files': files}).encode('utf-8'),
+        ContentType='application/json'
+    )
+    return {'group': group, 'first_day': first_day.isoformat(), 'skipped': False, 'rows': table.num_rows, 'files': files}
+
+
+def backfill(s3_client, bucket: str, locations: List[Dict[str, Any]], start: date, end: date,
+             chunk: str = 'month', max_workers: int = BACKFILL_MAX_WORKERS,
+             locations_per_request: int = BACKFILL_LOCATIONS_PER_REQUEST,
+             api_url: str = ARCHIVE_API_URL) -> Dict[str, Any]:
+    """
+    Backfill a date range for many locations
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        locations: Normalized location dictionaries
+        start: First day
+        end: Last day (inclusive)
+        chunk: 'day' or 'month'
+        max_workers: Concurrent chunk requests
+        locations_per_request: Locations fetched per archive request
+        api_url: Archive API URL
+
+    Returns:
+        Dictionary with backfill statistics
+    """
+    groups = [locations[i:i + locations_per_request] for i in range(0, len(locations), locations_per_request)]
+    tasks = [(group, first_day, last_day) for group in groups for first_day, last_day in date_chunks(start, end, chunk)]
+
+    started = time.perf_counter()
+    results = []
+    failures = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(run_chunk, s3_client, bucket, group, first_day, last_day, api_url): (first_day, last_day)
+            for group, first_day, last_day in tasks
+        }
+        for future in as_completed(futures):
+            first_day, last_day = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # Keep going; the chunk has no marker and is retried on the next run
+                print(f"Chunk {first_day} to {last_day} failed: {str(e)}")
+                failures.append({'first_day': first_day.isoformat(), 'last_day': last_day.isoformat(), 'error': str(e)})
+
+    return {
+        'chunks': len(tasks),
+        'skipped_chunks': sum(1 for result in results if result['skipped']),
+        'failed_chunks': len(failures),
+        'rows': sum(result['rows'] for result in results),
+        'files': sum(result['files'] for result in results),
+        'elapsed_s': round(time.perf_counter() - started, 3),
+        'failures': failures,
+    }
+
+
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler for a (bounded) backfill
+
+    Args:
+        event: {"start_date": "2024-01-01", "end_date": "2024-01-31", "chunk": "day",
+                "locations": [...]} (locations default to the LOCATIONS environment variable)
+        context: Lambda context
+
+    Returns:
+        Dictionary with statusCode and body
+    """
+    try:
+        if not S3_BUCKET:
+            raise ValueError("S3_BUCKET environment variable is not set")
+        locations = parse_locations(event)
+        if not locations:
+            raise ValueError("No locations given (event 'locations' or LOCATIONS environment variable)")
+
+        import boto3
+        result = backfill(
+            boto3.client('s3'), S3_BUCKET, locations,
+            date.fromisoformat(event['start_date']), date.fromisoformat(event['end_date']),
+            chunk=event.get('chunk', 'month')
+        )
+        print(f"Backfill result: {result}")
+        return {
+            'statusCode': 200 if not result['failed_chunks'] else 207,
+            'body': json.dumps(result)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to backfill weather data'
+            })
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill historical hourly weather data from the Open-Meteo archive')
+    parser.add_argument('--start', required=True, help='First day, e.g. 2024-01-01')
+    parser.add_argument('--end', required=True, help='Last day (inclusive)')
+    parser.add_argument('--locations', required=True, help='JSON list of locations, or @file.json')
+    parser.add_argument('--chunk', choices=CHUNK_SIZES, default='month', help='Days per archive request')
+    parser.add_argument('--workers', type=int, default=BACKFILL_MAX_WORKERS, help='Concurrent requests')
+    parser.add_argument('--locations-per-request', type=int, default=BACKFILL_LOCATIONS_PER_REQUEST)
+    parser.add_argument('--api-url', default=ARCHIVE_API_URL, help='Archive API URL')
+    parser.add_argument('--bucket', default=S3_BUCKET, help='Bucket name (a directory under --local-root when local)')
+    parser.add_argument('--local-root', help='Write to a local directory instead of S3')
+    args = parser.parse_args()
+
+    if args.locations.startswith('@'):
+        with open(args.locations[1:]) as f:
+            raw_locations = json.load(f)
+    else:
+        raw_locations = json.loads(args.locations)
+
+    if args.local_root:
+        from local_s3 import LocalS3Client
+        client = LocalS3Client(args.local_root)
+    else:
+        import boto3
+        client = boto3.client('s3')
+    summary = backfill(
+        client, args.bucket, parse_locations({'locations': raw_locations}),
+        date.fromisoformat(args.start), date.fromisoformat(args.end),
+        chunk=args.chunk, max_workers=args.workers,
+        locations_per_request=args.locations_per_request, api_url=args.api_url
+    )
+    print(json.dumps(summary, indent=2))
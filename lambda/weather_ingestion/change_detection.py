@@ -0,0 +1,110 @@
+"""
+Skip writes when the upstream observation has not changed
+
+Open-Meteo refreshes the `current` block every 15 minutes while the ingestion
+schedule runs every minute. Each location's observation is fingerprinted by
+its upstream `current.time` plus a hash of the block; locations whose
+fingerprint matches the last one written are not encoded or uploaded again.
+
+Fingerprints live in a warm-container cache backed by a small JSON marker in
+the bucket (one per set of locations), so a cold container does not rewrite
+an observation another container already stored.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Any, List
+
+# Configuration from environment variables
+CHANGE_DETECTION = os.environ.get('CHANGE_DETECTION', 'true').lower() == 'true'
+CHANGE_STATE_PREFIX = os.environ.get('CHANGE_STATE_PREFIX', '_state/observations')
+
+# Warm-container state: last written fingerprint per location, and markers already loaded
+_seen: Dict[str, Dict[str, str]] = {}
+_loaded_scopes = set()
+
+
+def location_key(latitude: float, longitude: float) -> str:
+    return f"{latitude:.4f},{longitude:.4f}"
+
+
+def fingerprint(current: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Fingerprint an Open-Meteo `current` block
+
+    Args:
+        current: The `current` block of an Open-Meteo response
+
+    Returns:
+        Dictionary with the upstream observation time and a content hash
+    """
+    content = json.dumps(current, sort_keys=True, separators=(',', ':'), default=str)
+    return {
+        'time': str(current.get('time')),
+        'hash': hashlib.sha256(content.encode('utf-8')).hexdigest()[:16],
+    }
+
+
+def state_key(location_keys: List[str]) -> str:
+    """S3 key of the marker for this set of locations"""
+    scope = hashlib.sha1(';'.join(sorted(location_keys)).encode('utf-8')).hexdigest()[:16]
+    return f"{CHANGE_STATE_PREFIX}/{scope}.json"
+
+
+def _load_state(s3_client, bucket: str, key: str) -> Dict[str, Dict[str, str]]:
+    try:
+        body = s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except Exception as e:
+        code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+        if code not in ('NoSuchKey', '404'):
+            # Fail open: without state every observation counts as changed
+            print(f"Warning: could not read change detection state {key}: {str(e)}")
+        return {}
+    return json.loads(body)
+
+
+def changed_locations(s3_client, bucket: str, observations: Dict[str, Dict[str, str]]) -> List[str]:
+    """
+    Locations whose observation differs from the last one written
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket holding the state marker
+        observations: Location key -> fingerprint for this invocation
+
+    Returns:
+        Location keys to write (all of them when change detection is off)
+    """
+    if not CHANGE_DETECTION:
+        return list(observations)
+
+    key = state_key(list(observations))
+    if key not in _loaded_scopes:
+        # Cached fingerprints are at least as recent as the marker's
+        for location, stored in _load_state(s3_client, bucket, key).items():
+            _seen.setdefault(location, stored)
+        _loaded_scopes.add(key)
+
+    return [location for location, current in observations.items() if _seen.get(location) != current]
+
+
+def record_written(s3_client, bucket: str, observations: Dict[str, Dict[str, str]]) -> None:
+    """
+    Remember the fingerprints of observations that were just written
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket holding the state marker
+        observations: Location key -> fingerprint for this invocation (written or unchanged)
+    """
+    if not CHANGE_DETECTION:
+        return
+
+    _seen.update(observations)
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=state_key(list(observations)),
+        Body=json.dumps(observations).encode('utf-8'),
+        ContentType='application/json'
+    )
@@ -0,0 +1,115 @@
+"""
+Columnar conversion of Open-Meteo hourly arrays to Arrow
+
+Archive and forecast responses carry one array per variable under `hourly`
+(or `minutely_15`). These helpers turn them into weather-schema Arrow columns
+with compute kernels (no per-row Python dictionaries), including a vectorized
+WMO code mapping.
+"""
+
+from typing import Dict, Any, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils import get_weather_schema
+from wmo import WEATHER_DESCRIPTIONS, WEATHER_CATEGORIES, UNKNOWN_DESCRIPTION, OTHER_CATEGORY
+
+HOURLY_VARIABLES = [
+    'temperature_2m', 'relative_humidity_2m', 'apparent_temperature', 'pressure_msl',
+    'wind_speed_10m', 'wind_direction_10m', 'cloud_cover', 'weather_code',
+]
+
+# Dense lookup arrays indexed by WMO code; the extra last slot holds the fallback
+_WMO_CODE_LIMIT = max(WEATHER_DESCRIPTIONS) + 1
+_DESCRIPTION_LOOKUP = pa.array(
+    [WEATHER_DESCRIPTIONS.get(code, UNKNOWN_DESCRIPTION) for code in range(_WMO_CODE_LIMIT)] + [UNKNOWN_DESCRIPTION]
+)
+_CATEGORY_LOOKUP = pa.array(
+    [WEATHER_CATEGORIES.get(code, OTHER_CATEGORY) for code in range(_WMO_CODE_LIMIT)] + [OTHER_CATEGORY]
+)
+
+
+def map_weather_codes(codes: pa.Array) -> Dict[str, pa.Array]:
+    """
+    Map WMO weather codes to weather_main/weather_description in one pass
+
+    Args:
+        codes: Integer weather codes (nulls and unknown codes map to the fallbacks)
+
+    Returns:
+        Dictionary with 'weather_main' and 'weather_description' arrays
+    """
+    codes = pc.cast(codes, pa.int32())
+    known = pc.and_kleene(pc.greater_equal(codes, 0), pc.less(codes, _WMO_CODE_LIMIT))
+    indices = pc.if_else(pc.fill_null(known, False), codes, pa.scalar(_WMO_CODE_LIMIT, pa.int32()))
+    return {
+        'weather_main': _CATEGORY_LOOKUP.take(indices),
+        'weather_description': _DESCRIPTION_LOOKUP.take(indices),
+    }
+
+
+def _column(hourly: Dict[str, Any], name: str, length: int, arrow_type: pa.DataType,
+            divisor: float = 1.0) -> pa.Array:
+    values = hourly.get(name)
+    if values is None:
+        return pa.nulls(length, arrow_type)
+    array = pa.array(values, type=pa.float64())
+    if divisor != 1.0:
+        array = pc.divide(array, divisor)
+    if pa.types.is_integer(arrow_type):
+        # Match the record path, which truncates with int()
+        array = pc.trunc(array)
+    return pc.cast(array, arrow_type)
+
+
+def hourly_to_table(response: Dict[str, Any], location: Dict[str, Any],
+                    schema: Optional[pa.Schema] = None, block: str = 'hourly') -> pa.Table:
+    """
+    Convert one location's `hourly` (or `minutely_15`) block to a weather-schema table
+
+    Times must be in UTC (request with timezone=GMT) so rows land in the same
+    partitions create_s3_key uses.
+
+    Args:
+        response: Open-Meteo response for one location
+        location: Normalized location dictionary (city, country_code, latitude, longitude)
+        schema: Target schema (defaults to the weather schema); columns it has
+            beyond the weather schema are filled with nulls
+        block: Response block holding the arrays ('hourly' or 'minutely_15')
+
+    Returns:
+        pa.Table, one row per time step
+    """
+    schema = schema or get_weather_schema()
+    hourly = response.get(block, {})
+    times = pa.array(hourly.get('time', []), type=pa.string())
+    length = len(times)
+
+    temperature = _column(hourly, 'temperature_2m', length, pa.float64())
+    codes = _column(hourly, 'weather_code', length, pa.int32())
+    columns = {
+        'timestamp': pc.strptime(times, format='%Y-%m-%dT%H:%M', unit='ms'),
+        'city': pa.array([location['city']] * length, type=pa.string()),
+        'country_code': pa.array([location['country_code']] * length, type=pa.string()),
+        'weather_id': codes,
+        **map_weather_codes(codes),
+        'temperature': temperature,
+        'feels_like': _column(hourly, 'apparent_temperature', length, pa.float64()),
+        'temp_min': temperature,  # Hourly data has no separate min/max
+        'temp_max': temperature,
+        'pressure': _column(hourly, 'pressure_msl', length, pa.int32()),
+        'humidity': _column(hourly, 'relative_humidity_2m', length, pa.int32()),
+        'visibility': _column(hourly, 'visibility', length, pa.int32(), divisor=1000),  # m to km
+        'wind_speed': _column(hourly, 'wind_speed_10m', length, pa.float64()),
+        'wind_deg': _column(hourly, 'wind_direction_10m', length, pa.int32()),
+        'clouds': _column(hourly, 'cloud_cover', length, pa.int32()),
+        'timezone': pa.array([response.get('timezone', 'UTC')] * length, type=pa.string()),
+        'latitude': pa.array([location['latitude']] * length, type=pa.float64()),
+        'longitude': pa.array([location['longitude']] * length, type=pa.float64()),
+    }
+    arrays: List[pa.Array] = [
+        pc.cast(columns[field.name], field.type) if field.name in columns else pa.nulls(length, field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
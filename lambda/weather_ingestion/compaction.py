@@ -0,0 +1,322 @@
+"""
+Hourly small-file compaction for the year=/month=/day=/hour= partitions
+
+The ingestion Lambda writes one small Parquet object per invocation. Once an
+hour has closed, this module merges every object under its prefix into a
+single Parquet file and removes the originals. With the location key layout or
+hash prefixes (utils.KEY_LAYOUT, KEY_SHARDS) each location/shard prefix of the
+hour is compacted separately. The merged file is written with the
+archive-compact writer profile (zstd, sorted by city and timestamp, page index
+and bloom filter; see utils.WRITER_PROFILES) and streamed into a multipart
+upload one row group at a time (streaming.stream_parquet), so memory does not
+grow with the size of the hour.
+
+Before the merged file is uploaded, a manifest under _state/compaction/ records
+which objects it replaces. If a run stops between the upload and the deletes
+(a crash, or keys DeleteObjects could not remove), re-running the hour deletes
+the inputs the manifest lists instead of merging them into the output again. A
+run that finishes removes its manifest.
+"""
+
+import argparse
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+from streaming import stream_parquet
+from utils import KEY_SHARDS, conform_table, create_partition_path, layout_partition_keys
+
+# Configuration from environment variables
+S3_BUCKET = os.environ.get('S3_BUCKET')
+COMPACTION_ROW_GROUP_SIZE = int(os.environ.get('COMPACTION_ROW_GROUP_SIZE', '100000'))
+COMPACTION_PARQUET_PROFILE = os.environ.get('COMPACTION_PARQUET_PROFILE', 'archive-compact')
+# Minutes to wait after the hour closes so late writes land before compaction
+COMPACTION_GRACE_MINUTES = int(os.environ.get('COMPACTION_GRACE_MINUTES', '5'))
+# Rebuild the hourly/daily rollups after compacting an hour
+ROLLUPS_ENABLED = os.environ.get('ROLLUPS_ENABLED', 'true').lower() == 'true'
+
+COMPACTED_FILE_PREFIX = 'compacted_'
+COMPACTION_STATE_PREFIX = '_state/compaction'
+DELETE_BATCH_SIZE = 1000  # S3 DeleteObjects limit
+
+
+def list_parquet_keys(s3_client, bucket: str, prefix: str) -> List[str]:
+    """
+    List the Parquet object keys directly under a partition prefix
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        prefix: Partition prefix ending in '/'
+
+    Returns:
+        Sorted list of object keys
+    """
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith('.parquet'):
+                keys.append(obj['Key'])
+    return sorted(keys)
+
+
+def list_hour_prefixes(s3_client, bucket: str, hour: datetime, layout: Optional[str] = None,
+                       shards: Optional[int] = None) -> List[str]:
+    """
+    List the leaf partition prefixes holding the hour's objects in a key layout
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        hour: Any timestamp within the hour
+        layout: Key layout (defaults to utils.KEY_LAYOUT)
+        shards: Number of hash prefixes (defaults to utils.KEY_SHARDS)
+
+    Returns:
+        Sorted list of prefixes ending in '/'
+    """
+    shards = KEY_SHARDS if shards is None else shards
+    keys = layout_partition_keys(layout, shards)
+    bases = [f"shard={shard:02d}/" for shard in range(shards)] if 'shard' in keys else ['']
+    hour_prefixes = [f"{base}{create_partition_path(hour)}/" for base in bases]
+    if 'location' not in keys:
+        return hour_prefixes
+
+    prefixes = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for hour_prefix in hour_prefixes:
+        for page in paginator.paginate(Bucket=bucket, Prefix=f"{hour_prefix}location=", Delimiter='/'):
+            prefixes += [common['Prefix'] for common in page.get('CommonPrefixes', [])]
+    return sorted(prefixes)
+
+
+def list_hour_keys(s3_client, bucket: str, hour: datetime) -> List[str]:
+    """
+    List every Parquet object key of the hour, across location and shard prefixes
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        hour: Any timestamp within the hour
+
+    Returns:
+        Sorted list of object keys
+    """
+    return sorted(key for prefix in list_hour_prefixes(s3_client, bucket, hour)
+                  for key in list_parquet_keys(s3_client, bucket, prefix))
+
+
+def _read_table(s3_client, bucket: str, key: str) -> pa.Table:
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    return pq.read_table(io.BytesIO(body))
+
+
+def manifest_key(prefix: str) -> str:
+    """Key of the manifest listing the objects the prefix's latest compacted file replaced"""
+    return f"{COMPACTION_STATE_PREFIX}/{prefix}manifest.json"
+
+
+def _load_manifest(s3_client, bucket: str, prefix: str) -> Optional[Dict[str, Any]]:
+    try:
+        body = s3_client.get_object(Bucket=bucket, Key=manifest_key(prefix))['Body'].read()
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return json.loads(body)
+
+
+def delete_keys(s3_client, bucket: str, keys: List[str]) -> None:
+    """
+    Delete objects with batched DeleteObjects calls
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        keys: Object keys to delete
+
+    Raises:
+        Exception: When S3 reports keys it could not delete
+    """
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[start:start + DELETE_BATCH_SIZE]
+        response = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        )
+        errors = response.get('Errors', [])
+        if errors:
+            first = errors[0]
+            raise Exception(f"Could not delete {len(errors)} of {len(batch)} objects "
+                            f"({first.get('Key')}: {first.get('Code')} {first.get('Message')})")
+
+
+def compact_prefix(s3_client, bucket: str, prefix: str,
+                   row_group_size: int = COMPACTION_ROW_GROUP_SIZE) -> Dict[str, Any]:
+    """
+    Merge all Parquet objects under a closed partition prefix into one file
+
+    Inputs are read one at a time and written out row group by row group, each
+    sorted by the profile's sort keys. The compacted object becomes visible
+    when its upload completes (S3 object writes are atomic), then the originals
+    are removed with batched DeleteObjects calls. Queries running between those
+    two steps may see rows twice, which is why only closed hours should be
+    compacted. The manifest written before the upload lets the next run finish
+    the deletes if this one stops in between.
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        prefix: Partition prefix ending in '/', e.g. year=2024/month=01/day=01/hour=05/
+        row_group_size: Maximum rows per Parquet row group
+
+    Returns:
+        Dictionary with compaction statistics
+
+    Raises:
+        Exception: When inputs could not be deleted (re-running the hour removes them)
+    """
+    keys = list_parquet_keys(s3_client, bucket, prefix)
+
+    # A previous run uploaded its compacted file but did not delete all of its inputs
+    recovered = 0
+    manifest = _load_manifest(s3_client, bucket, prefix)
+    if manifest and manifest['compacted_key'] in keys:
+        leftovers = sorted(set(manifest['sources']) & set(keys) - {manifest['compacted_key']})
+        if leftovers:
+            print(f"Deleting {len(leftovers)} objects already merged into {manifest['compacted_key']}")
+            delete_keys(s3_client, bucket, leftovers)
+            keys = [key for key in keys if key not in leftovers]
+            recovered = len(leftovers)
+        s3_client.delete_object(Bucket=bucket, Key=manifest_key(prefix))
+
+    if len(keys) <= 1:
+        return {'prefix': prefix, 'input_files': len(keys), 'recovered': recovered, 'compacted': False}
+
+    compacted_key = f"{prefix}{COMPACTED_FILE_PREFIX}{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.parquet"
+    # Recorded before the compacted file can appear; a manifest whose file never appeared is ignored
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=manifest_key(prefix),
+        Body=json.dumps({'compacted_key': compacted_key, 'sources': keys}).encode('utf-8'),
+        ContentType='application/json'
+    )
+    # Older files may carry different physical types; cast everything to the table schema
+    written = stream_parquet(
+        s3_client,
+        bucket,
+        compacted_key,
+        (conform_table(_read_table(s3_client, bucket, key)) for key in keys),
+        COMPACTION_PARQUET_PROFILE,
+        row_group_size
+    )
+
+    delete_keys(s3_client, bucket, [key for key in keys if key != compacted_key])
+    # Only interrupted runs leave a manifest behind
+    s3_client.delete_object(Bucket=bucket, Key=manifest_key(prefix))
+
+    return {
+        'prefix': prefix,
+        'input_files': len(keys),
+        'recovered': recovered,
+        'rows': written['rows'],
+        'bytes': written['bytes'],
+        'parts': written['parts'],
+        'compacted_key': compacted_key,
+        'compacted': True,
+    }
+
+
+def compact_hour(s3_client, bucket: str, hour: datetime, layout: Optional[str] = None,
+                 shards: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Compact the partition(s) for the hour containing `hour`
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        hour: Any timestamp within the hour to compact
+        layout: Key layout (defaults to utils.KEY_LAYOUT)
+        shards: Number of hash prefixes (defaults to utils.KEY_SHARDS)
+
+    Returns:
+        Dictionary with compaction statistics (per prefix under `prefixes`)
+    """
+    prefixes = list_hour_prefixes(s3_client, bucket, hour, layout, shards)
+    results = [compact_prefix(s3_client, bucket, prefix) for prefix in prefixes]
+    return {
+        'hour': create_partition_path(hour),
+        'partitions': len(results),
+        'input_files': sum(result['input_files'] for result in results),
+        'rows': sum(result.get('rows', 0) for result in results),
+        'bytes': sum(result.get('bytes', 0) for result in results),
+        'compacted': any(result['compacted'] for result in results),
+        'prefixes': results,
+    }
+
+
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler for scheduled compaction
+
+    Args:
+        event: Lambda event (may contain `hour` as an ISO timestamp to compact a specific hour)
+        context: Lambda context
+
+    Returns:
+        Dictionary with statusCode and body
+    """
+    try:
+        if not S3_BUCKET:
+            raise ValueError("S3_BUCKET environment variable is not set")
+
+        if isinstance(event, dict) and event.get('hour'):
+            hour = datetime.fromisoformat(event['hour'])
+        else:
+            # Previous hour, which has closed by the time the grace period has passed
+            hour = datetime.utcnow() - timedelta(hours=1, minutes=COMPACTION_GRACE_MINUTES)
+
+        print(f"Compacting {create_partition_path(hour)} in s3://{S3_BUCKET}")
+        s3_client = boto3.client('s3')
+        result = compact_hour(s3_client, S3_BUCKET, hour)
+        print(f"Compaction result: {result}")
+
+        if ROLLUPS_ENABLED:
+            from rollups import update_rollups  # rollups imports this module
+            result['rollups'] = update_rollups(s3_client, S3_BUCKET, hour)
+            print(f"Rollup result: {result['rollups']}")
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to compact weather data'
+            })
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compact one hour partition of weather data')
+    parser.add_argument('--hour', required=True, help='ISO timestamp within the hour, e.g. 2024-01-01T05')
+    parser.add_argument('--bucket', default=S3_BUCKET, help='Bucket name (a directory under --local-root when local)')
+    parser.add_argument('--local-root', help='Run against a local directory instead of S3')
+    args = parser.parse_args()
+
+    if args.local_root:
+        from local_s3 import LocalS3Client
+        client = LocalS3Client(args.local_root)
+    else:
+        client = boto3.client('s3')
+    print(json.dumps(compact_hour(client, args.bucket, datetime.fromisoformat(args.hour)), indent=2))
@@ -0,0 +1,237 @@
+"""
+SQS fan-out: a scheduler enqueues one work item per location, the ingestion
+function consumes them in batches
+
+schedule_handler runs on the EventBridge schedule and sends every configured
+location to the work queue. consume_handler is the queue's event source: it
+fetches the batch's locations concurrently, writes the successful ones as one
+Parquet object and reports the rest in `batchItemFailures`, so SQS redelivers
+only the locations that failed (and moves them to the dead-letter queue after
+the configured number of receives).
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import change_detection
+import http_client
+import lambda_function
+import location_grid
+import metrics as metrics_module
+import profiling
+from lambda_function import (
+    _build_batch_records, _location_keys, _observations, _record_written, _upload_records, fetch_current,
+    get_s3_client, parse_locations
+)
+
+# Configuration from environment variables
+QUEUE_URL = os.environ.get('QUEUE_URL')
+FANOUT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', '10'))
+
+# SendMessageBatch accepts at most 10 entries
+SQS_SEND_BATCH_SIZE = 10
+
+# Created on first use, like the S3 client
+sqs_client = None
+
+
+def get_sqs_client():
+    """
+    Get the SQS client, creating it on first use
+
+    Returns:
+        boto3 SQS client
+    """
+    global sqs_client
+    if sqs_client is None:
+        import boto3
+        sqs_client = boto3.client('sqs')
+    return sqs_client
+
+
+def enqueue_locations(locations: List[Dict[str, Any]], queue_url: str) -> int:
+    """
+    Send one message per location to the work queue
+
+    Args:
+        locations: Normalized location dictionaries
+        queue_url: Work queue URL
+
+    Returns:
+        Number of messages sent
+    """
+    failed = []
+    for start in range(0, len(locations), SQS_SEND_BATCH_SIZE):
+        chunk = locations[start:start + SQS_SEND_BATCH_SIZE]
+        response = get_sqs_client().send_message_batch(
+            QueueUrl=queue_url,
+            Entries=[{'Id': str(i), 'MessageBody': json.dumps(loc)} for i, loc in enumerate(chunk)]
+        )
+        failed.extend(chunk[int(entry['Id'])]['city'] for entry in response.get('Failed', []))
+    if failed:
+        raise Exception(f"Failed to enqueue {len(failed)} locations: {', '.join(failed)}")
+    return len(locations)
+
+
+def schedule_handler(event, context):
+    """
+    AWS Lambda handler for the scheduler: enqueue every configured location
+
+    Args:
+        event: Lambda event (optional `locations` list, defaulting to LOCATIONS)
+        context: Lambda context
+
+    Returns:
+        Dictionary with statusCode and body
+    """
+    try:
+        if not QUEUE_URL:
+            raise ValueError("QUEUE_URL environment variable is not set")
+        locations = parse_locations(event)
+        if not locations:
+            raise ValueError("No locations given (event 'locations' or LOCATIONS environment variable)")
+
+        sent = enqueue_locations(locations, QUEUE_URL)
+        print(f"Enqueued {sent} locations")
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'Locations enqueued', 'location_count': sent})
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to enqueue locations'
+            })
+        }
+
+
+def _parse_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalized location from one SQS record's body"""
+    return parse_locations({'locations': [json.loads(record['body'])]})[0]
+
+
+def _fetch(location: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    try:
+        api_url = lambda_function.WEATHER_API_URL
+        # Items in the same grid cell (in this batch or a recent one) share one request
+        return location_grid.fetch_for_location(
+            location['latitude'], location['longitude'], api_url, lambda lat, lon: fetch_current(lat, lon, api_url)
+        ), None
+    except Exception as e:
+        return None, str(e)
+
+
+def process_batch(records: List[Dict[str, Any]], metrics) -> Dict[str, Any]:
+    """
+    Ingest one SQS batch; failed locations are returned instead of raised
+
+    Args:
+        records: SQS records, one location each
+        metrics: InvocationMetrics for this invocation
+
+    Returns:
+        Dictionary with the failed message IDs and batch statistics
+    """
+    failures: List[str] = []
+    pending: List[Tuple[str, Dict[str, Any]]] = []
+    # SQS delivers at least once: a repeated work item follows the outcome of its first message
+    first_message: Dict[str, str] = {}
+    duplicates: Dict[str, List[str]] = {}
+    for record in records:
+        try:
+            loc = _parse_record(record)
+        except (ValueError, KeyError, TypeError) as e:
+            # Malformed items fail on every receive and end up in the dead-letter queue
+            print(f"Invalid work item {record.get('messageId')}: {str(e)}")
+            failures.append(record.get('messageId'))
+            continue
+        item = json.dumps(loc, sort_keys=True)
+        if item in first_message:
+            duplicates.setdefault(first_message[item], []).append(record['messageId'])
+        else:
+            first_message[item] = record['messageId']
+            pending.append((record['messageId'], loc))
+
+    with metrics.stage('Fetch'):
+        with ThreadPoolExecutor(max_workers=max(1, min(FANOUT_MAX_WORKERS, len(pending)))) as executor:
+            results = list(executor.map(_fetch, [loc for _, loc in pending]))
+
+    fetched = []
+    for (message_id, loc), (response, error) in zip(pending, results):
+        if error:
+            print(f"Fetch failed for {loc['city']}: {error}")
+            failures.append(message_id)
+        else:
+            fetched.append((message_id, loc, response))
+
+    written = 0
+    if fetched:
+        locations = [loc for _, loc, _ in fetched]
+        responses = [response for _, _, response in fetched]
+        observations = _observations(locations, responses)
+        changed = set(change_detection.changed_locations(get_s3_client(), lambda_function.S3_BUCKET, observations))
+        # One key per message: observations merges items that share coordinates
+        to_write = [item for item, key in zip(fetched, _location_keys(locations)) if key in changed]
+        metrics.put('SkippedWrites', len(fetched) - len(to_write))
+        if to_write:
+            try:
+                records_out = _build_batch_records([loc for _, loc, _ in to_write], [r for _, _, r in to_write])
+                _upload_records(records_out, metrics)
+                written = len(records_out)
+            except Exception as e:
+                # Every fetched location is retried. With the location key layout some objects
+                # may already be in S3, and those locations are written twice on redelivery.
+                print(f"Upload failed: {str(e)}")
+                failures.extend(message_id for message_id, _, _ in fetched)
+            else:
+                _record_written(observations)
+
+    failures.extend(duplicate for message_id in list(failures) for duplicate in duplicates.get(message_id, []))
+    metrics.put('BatchSize', len(records))
+    metrics.put('RecordCount', written)
+    metrics.put('FailedItems', len(failures))
+    return {'failures': failures, 'written': written, 'batch_size': len(records)}
+
+
+@profiling.profiled
+def consume_handler(event, context):
+    """
+    AWS Lambda handler for the work queue (SQS event source with ReportBatchItemFailures)
+
+    Args:
+        event: SQS event with `Records`
+        context: Lambda context
+
+    Returns:
+        Dictionary with `batchItemFailures` listing the message IDs to redeliver
+    """
+    metrics = metrics_module.start_invocation(context)
+    http_before = http_client.get_counters()
+    grid_before = location_grid.get_counters()
+    records = event.get('Records', [])
+    try:
+        if not lambda_function.S3_BUCKET:
+            raise ValueError("S3_BUCKET environment variable is not set")
+
+        result = process_batch(records, metrics)
+        print(f"Processed {result['batch_size']} work items: {result['written']} written, "
+              f"{len(result['failures'])} failed")
+        metrics.put('Errors', 0)
+        return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in result['failures']]}
+
+    except Exception as e:
+        # Unexpected failure: retry the whole batch
+        print(f"Error: {str(e)}")
+        metrics.put('Errors', 1)
+        return {'batchItemFailures': [{'itemIdentifier': record['messageId']} for record in records]}
+
+    finally:
+        http_client.put_metrics(metrics, http_before)
+        location_grid.put_metrics(metrics, grid_before)
+        metrics.flush()
@@ -0,0 +1,208 @@
+"""
+Forecast ingestion: Open-Meteo hourly (or 15-minutely) forecast arrays to Parquet
+
+The forecast response holds one array per variable with hundreds of time steps.
+They are mapped straight into Arrow arrays (see columnar.py): WMO codes and unit
+conversions run as compute kernels, with no per-row dictionaries. Each run
+writes one object under forecasts/, partitioned by the hour the forecast was
+issued, for the weather_forecast Glue table.
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Dict, Any, List
+
+import http_client
+import metrics as metrics_module
+from lambda_function import (
+    CITY, COUNTRY_CODE, LATITUDE, LONGITUDE, MAX_LOCATIONS_PER_REQUEST, get_s3_client, parse_locations
+)
+from utils import create_partition_path, get_weather_schema, table_to_parquet
+
+# Configuration from environment variables
+WEATHER_API_URL = os.environ.get('WEATHER_API_URL', 'https://api.open-meteo.com/v1/forecast')
+S3_BUCKET = os.environ.get('S3_BUCKET')
+FORECAST_DAYS = int(os.environ.get('FORECAST_DAYS', '7'))
+FORECAST_RESOLUTION = os.environ.get('FORECAST_RESOLUTION', 'hourly')  # 'hourly' or 'minutely_15'
+FORECAST_PREFIX = os.environ.get('FORECAST_PREFIX', 'forecasts')
+
+RESOLUTIONS = ('hourly', 'minutely_15')
+
+# pyarrow is imported on first use, like utils
+_forecast_schema = None
+
+
+def get_forecast_schema():
+    """
+    Arrow schema of the forecast table: the weather schema plus issue time and lead time
+
+    Returns:
+        pa.Schema (built once, on first call)
+    """
+    global _forecast_schema
+    if _forecast_schema is None:
+        import pyarrow as pa
+        _forecast_schema = pa.schema(list(get_weather_schema()) + [
+            pa.field('issued_at', pa.timestamp('ms')),
+            pa.field('lead_minutes', pa.int32()),
+        ])
+    return _forecast_schema
+
+
+def fetch_forecast(locations: List[Dict[str, Any]], api_url: str, resolution: str = FORECAST_RESOLUTION,
+                   forecast_days: int = FORECAST_DAYS) -> List[Dict[str, Any]]:
+    """
+    Fetch forecast arrays for many locations using multi-coordinate requests
+
+    Args:
+        locations: Normalized location dictionaries (see lambda_function.parse_locations)
+        api_url: Forecast API URL
+        resolution: 'hourly' or 'minutely_15'
+        forecast_days: Days of forecast to request
+
+    Returns:
+        One Open-Meteo response per location, in order
+    """
+    from columnar import HOURLY_VARIABLES
+
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {RESOLUTIONS}, got {resolution!r}")
+    responses = []
+    try:
+        for start in range(0, len(locations), MAX_LOCATIONS_PER_REQUEST):
+            chunk = locations[start:start + MAX_LOCATIONS_PER_REQUEST]
+            params = {
+                'latitude': ','.join(str(loc['latitude']) for loc in chunk),
+                'longitude': ','.join(str(loc['longitude']) for loc in chunk),
+                resolution: ','.join(HOURLY_VARIABLES + ['visibility']),
+                'timezone': 'GMT',
+                'forecast_days': forecast_days
+            }
+            data = http_client.get_json(api_url, params)
+            results = data if isinstance(data, list) else [data]
+            if len(results) != len(chunk):
+                raise KeyError(f"expected {len(chunk)} results, got {len(results)}")
+            responses.extend(results)
+        return responses
+
+    except http_client.WeatherAPIError as e:
+        raise Exception(f"Failed to fetch forecast data: {str(e)}")
+    except KeyError as e:
+        raise Exception(f"Unexpected API response format: {str(e)}")
+
+
+def forecast_table(locations: List[Dict[str, Any]], responses: List[Dict[str, Any]], issued_at: datetime,
+                   resolution: str = FORECAST_RESOLUTION):
+    """
+    Build the forecast table for all locations
+
+    Args:
+        locations: Normalized location dictionaries
+        responses: Matching Open-Meteo responses
+        issued_at: When the forecast was fetched (UTC)
+        resolution: Response block the arrays are under
+
+    Returns:
+        pa.Table with the forecast schema
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from columnar import hourly_to_table
+
+    schema = get_forecast_schema()
+    table = pa.concat_tables([
+        hourly_to_table(response, loc, schema, block=resolution) for loc, response in zip(locations, responses)
+    ])
+    issued = pa.scalar(issued_at, type=pa.timestamp('ms'))
+    lead_ms = pc.cast(pc.subtract(table['timestamp'], issued), pa.int64())
+    table = table.set_column(schema.get_field_index('issued_at'), schema.field('issued_at'),
+                             pa.repeat(issued, table.num_rows))
+    return table.set_column(schema.get_field_index('lead_minutes'), schema.field('lead_minutes'),
+                            pc.cast(pc.divide(lead_ms, 60_000), pa.int32()))
+
+
+def create_forecast_s3_key(location_count: int, issued_at: datetime) -> str:
+    """
+    S3 key for a forecast object, partitioned by the hour it was issued
+
+    Args:
+        location_count: Number of locations in the object
+        issued_at: Issue time
+
+    Returns:
+        S3 key string
+    """
+    filename = f"forecast_{location_count}loc_{issued_at.strftime('%Y%m%d_%H%M%S')}.parquet"
+    return f"{FORECAST_PREFIX}/{create_partition_path(issued_at)}/{filename}"
+
+
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler for forecast ingestion
+
+    Args:
+        event: Lambda event (optional `locations` list, defaulting to LOCATIONS or the
+               single configured location)
+        context: Lambda context
+
+    Returns:
+        Dictionary with statusCode and body
+    """
+    metrics = metrics_module.start_invocation(context)
+    http_before = http_client.get_counters()
+    try:
+        if not S3_BUCKET:
+            raise ValueError("S3_BUCKET environment variable is not set")
+
+        locations = parse_locations(event) or [{
+            'latitude': LATITUDE, 'longitude': LONGITUDE, 'city': CITY, 'country_code': COUNTRY_CODE
+        }]
+        issued_at = datetime.utcnow().replace(microsecond=0)
+
+        print(f"Fetching {FORECAST_RESOLUTION} forecast for {len(locations)} locations")
+        with metrics.stage('Fetch'):
+            responses = fetch_forecast(locations, WEATHER_API_URL, FORECAST_RESOLUTION, FORECAST_DAYS)
+
+        with metrics.stage('Encode'):
+            table = forecast_table(locations, responses, issued_at, FORECAST_RESOLUTION)
+            parquet_data = table_to_parquet(table)
+        metrics.put('RecordCount', table.num_rows)
+        metrics.put('ParquetBytes', len(parquet_data), 'Bytes')
+
+        s3_key = create_forecast_s3_key(len(locations), issued_at)
+        print(f"Uploading {table.num_rows} forecast rows to s3://{S3_BUCKET}/{s3_key}")
+        with metrics.stage('Upload'):
+            get_s3_client().put_object(
+                Bucket=S3_BUCKET,
+                Key=s3_key,
+                Body=parquet_data,
+                ContentType='application/octet-stream'
+            )
+
+        metrics.put('Errors', 0)
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Forecast data successfully ingested',
+                'location_count': len(locations),
+                'rows': table.num_rows,
+                's3_location': f's3://{S3_BUCKET}/{s3_key}',
+                'issued_at': issued_at.isoformat()
+            })
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        metrics.put('Errors', 1)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to ingest forecast data'
+            })
+        }
+
+    finally:
+        http_client.put_metrics(metrics, http_before)
+        metrics.flush()
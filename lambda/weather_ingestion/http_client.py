@@ -0,0 +1,443 @@
+"""
+HTTP client for the weather API
+
+Keeps one pooled keep-alive session per container so warm invocations reuse
+TLS connections, retries transient failures with jittered exponential backoff
+and can hedge slow requests with a second attempt after a p95-based delay.
+
+Every request first takes a token from a container-wide token bucket, so
+concurrent workers stay under the API's per-minute limit together; a 429 (or a
+Retry-After header) pauses the bucket for everyone instead of each worker
+retrying on its own. A circuit breaker opens after repeated upstream failures
+and rejects calls immediately (CircuitOpenError) until a probe succeeds.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+# Configuration from environment variables
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3.05'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '8'))  # 3 attempts fit the 30s Lambda timeout
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '10'))
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', '2'))
+HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', '0.2'))  # Seconds
+HTTP_BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', '2.0'))  # Seconds
+HTTP_HEDGE_ENABLED = os.environ.get('HTTP_HEDGE_ENABLED', 'false').lower() == 'true'
+HTTP_HEDGE_PERCENTILE = float(os.environ.get('HTTP_HEDGE_PERCENTILE', '0.95'))
+HTTP_HEDGE_MIN_DELAY = float(os.environ.get('HTTP_HEDGE_MIN_DELAY', '0.3'))  # Seconds
+HTTP_HEDGE_DEFAULT_DELAY = float(os.environ.get('HTTP_HEDGE_DEFAULT_DELAY', '1.0'))  # Until enough samples
+HTTP_HEDGE_MIN_SAMPLES = 20
+# Requests per minute for the whole container (Open-Meteo's free tier allows 600); 0 disables
+HTTP_RATE_LIMIT_PER_MINUTE = float(os.environ.get('HTTP_RATE_LIMIT_PER_MINUTE', '600'))
+HTTP_RATE_LIMIT_BURST = int(os.environ.get('HTTP_RATE_LIMIT_BURST', '10'))
+HTTP_RETRY_AFTER_MAX = float(os.environ.get('HTTP_RETRY_AFTER_MAX', '10'))  # Seconds; keeps waits inside the Lambda timeout
+# Consecutive failed attempts (5xx, timeouts, connection errors) that open the circuit; 0 disables
+HTTP_BREAKER_THRESHOLD = int(os.environ.get('HTTP_BREAKER_THRESHOLD', '5'))
+HTTP_BREAKER_COOLDOWN = float(os.environ.get('HTTP_BREAKER_COOLDOWN', '30'))  # Seconds before a probe request
+
+# Status codes worth retrying; anything else is returned to the caller immediately
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Module-level state survives warm invocations
+_session = None
+_executor = None
+_lock = threading.Lock()
+_latencies = deque(maxlen=200)
+counters = {
+    'attempts': 0,
+    'retries': 0,
+    'hedges': 0,
+    'hedge_wins': 0,
+    'throttled': 0,
+    'rate_limit_wait_ms': 0,
+    'breaker_opens': 0,
+    'breaker_rejections': 0,
+}
+
+
+class WeatherAPIError(Exception):
+    """Raised when the weather API cannot be reached or keeps failing"""
+
+
+class CircuitOpenError(WeatherAPIError):
+    """Raised without contacting the API while the circuit breaker is open"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker in the container"""
+
+    def __init__(self, rate_per_minute: float, capacity: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + max(0.0, now - self._updated) * self.rate)
+        self._updated = max(self._updated, now)
+
+    def acquire(self) -> float:
+        """
+        Take one token, waiting until one is available
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold every caller back, e.g. for a 429's Retry-After
+
+        The bucket restarts empty, so requests resume at the steady rate instead of in a burst.
+
+        Args:
+            seconds: Pause length
+        """
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._paused_until:
+                self._paused_until = until
+                self._tokens = 0.0
+                self._updated = until
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; after the cooldown one probe request decides"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Whether a request may be sent now
+
+        Returns:
+            False while open (and while a half-open probe is in flight)
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def release(self) -> None:
+        """Give up a probe whose outcome says nothing about the API (e.g. a 429); the next call probes"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> bool:
+        """
+        Count a failed attempt
+
+        Returns:
+            True if this failure opened the circuit
+        """
+        with self._lock:
+            self._probing = False
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                opened = self.state != self.OPEN
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                return opened
+            return False
+
+
+# Shared by all threads; None disables the limiter or breaker
+rate_limiter = TokenBucket(HTTP_RATE_LIMIT_PER_MINUTE, HTTP_RATE_LIMIT_BURST) if HTTP_RATE_LIMIT_PER_MINUTE > 0 else None
+circuit_breaker = CircuitBreaker(HTTP_BREAKER_THRESHOLD, HTTP_BREAKER_COOLDOWN) if HTTP_BREAKER_THRESHOLD > 0 else None
+
+
+def _increment(name: str, amount: int = 1) -> None:
+    with _lock:
+        counters[name] += amount
+
+
+def get_counters() -> Dict[str, int]:
+    """
+    Snapshot of the request counters since the container started
+
+    Returns:
+        Dictionary of counter name to value
+    """
+    with _lock:
+        return dict(counters)
+
+
+def get_circuit_state() -> str:
+    """
+    Current circuit breaker state
+
+    Returns:
+        'closed', 'open' or 'half_open' ('closed' when the breaker is disabled)
+    """
+    return circuit_breaker.state if circuit_breaker else CircuitBreaker.CLOSED
+
+
+# EMF metric name for each counter, emitted per invocation
+COUNTER_METRICS = {
+    'attempts': 'HttpAttempts',
+    'retries': 'HttpRetries',
+    'hedges': 'HttpHedges',
+    'throttled': 'HttpThrottled',
+    'rate_limit_wait_ms': 'RateLimitWaitMs',
+    'breaker_opens': 'CircuitOpens',
+    'breaker_rejections': 'CircuitRejections',
+}
+# EMF unit of counters that are not plain counts
+COUNTER_UNITS = {'rate_limit_wait_ms': 'Milliseconds'}
+
+
+def put_metrics(metrics, before: Dict[str, int]) -> None:
+    """
+    Emit the counters accumulated since `before` and the circuit state
+
+    Args:
+        metrics: Invocation metrics from metrics.start_invocation
+        before: get_counters() snapshot taken when the invocation started
+    """
+    after = get_counters()
+    for name, metric in COUNTER_METRICS.items():
+        metrics.put(metric, after[name] - before[name], COUNTER_UNITS.get(name, 'Count'))
+    metrics.put('CircuitOpen', int(get_circuit_state() != CircuitBreaker.CLOSED))
+
+
+def get_session():
+    """
+    Get the shared pooled session, creating it on first use
+
+    Returns:
+        requests.Session with a keep-alive connection pool
+    """
+    global _session
+    if _session is None:
+        # Deferred import: requests is only needed once the first request is made
+        import requests
+        from requests.adapters import HTTPAdapter
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                # Retries are handled in get_json so hedging and backoff share one budget
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix='http-hedge')
+    return _executor
+
+
+def hedge_delay() -> float:
+    """
+    Delay before sending a hedged request, based on recently observed latencies
+
+    Returns:
+        Delay in seconds
+    """
+    with _lock:
+        samples = sorted(_latencies)
+    if len(samples) < HTTP_HEDGE_MIN_SAMPLES:
+        return HTTP_HEDGE_DEFAULT_DELAY
+    index = min(len(samples) - 1, int(len(samples) * HTTP_HEDGE_PERCENTILE))
+    return max(HTTP_HEDGE_MIN_DELAY, samples[index])
+
+
+def _backoff(retry: int) -> float:
+    # Full jitter: uniform between 0 and the capped exponential step
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** retry)))
+
+
+def _is_retryable(error) -> bool:
+    import requests
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def _status_code(error) -> Optional[int]:
+    response = getattr(error, 'response', None)
+    return response.status_code if response is not None else None
+
+
+def retry_after(error) -> Optional[float]:
+    """
+    Seconds to wait according to the response's Retry-After header
+
+    Args:
+        error: requests exception
+
+    Returns:
+        Delay in seconds (capped at HTTP_RETRY_AFTER_MAX), or None without the header
+    """
+    response = getattr(error, 'response', None)
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        # HTTP-date form is rare; keep its import off the cold start
+        from email.utils import parsedate_to_datetime
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(HTTP_RETRY_AFTER_MAX, max(0.0, delay))
+
+
+def _send(url: str, params: Dict[str, Any]):
+    if rate_limiter:
+        waited = rate_limiter.acquire()
+        if waited:
+            _increment('rate_limit_wait_ms', int(waited * 1000))
+    _increment('attempts')
+    started = time.perf_counter()
+    response = get_session().get(url, params=params, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    response.raise_for_status()
+    with _lock:
+        _latencies.append(time.perf_counter() - started)
+    return response
+
+
+def _send_hedged(url: str, params: Dict[str, Any]):
+    import requests
+    from concurrent.futures import FIRST_COMPLETED, wait
+    executor = _get_executor()
+    primary = executor.submit(_send, url, params)
+    done, _ = wait([primary], timeout=hedge_delay())
+    if done:
+        return primary.result()
+
+    # Primary is a straggler: race a second request and take the first success
+    _increment('hedges')
+    hedge = executor.submit(_send, url, params)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except requests.exceptions.RequestException as e:
+                error = e
+                continue
+            if future is hedge:
+                _increment('hedge_wins')
+            return response
+    raise error
+
+
+def get_json(url: str, params: Dict[str, Any]) -> Any:
+    """
+    GET a JSON document with rate limiting, retries and optional hedging
+
+    Args:
+        url: Request URL
+        params: Query string parameters
+
+    Returns:
+        Decoded JSON body
+
+    Raises:
+        CircuitOpenError: When the circuit breaker rejects the call
+        WeatherAPIError: When all attempts fail, or the response is not valid JSON
+    """
+    import requests
+    retry = 0
+    while True:
+        if circuit_breaker and not circuit_breaker.allow():
+            _increment('breaker_rejections')
+            raise CircuitOpenError(f"Weather API circuit is open after repeated failures "
+                                   f"(next probe within {circuit_breaker.cooldown:.0f}s)")
+        try:
+            response = _send_hedged(url, params) if HTTP_HEDGE_ENABLED else _send(url, params)
+        except requests.exceptions.RequestException as e:
+            status = _status_code(e)
+            if status == 429:
+                # Throttling says nothing about the API's health; it is the limiter's job
+                _increment('throttled')
+                if circuit_breaker:
+                    circuit_breaker.release()
+            elif circuit_breaker:
+                if _is_retryable(e):
+                    if circuit_breaker.record_failure():
+                        _increment('breaker_opens')
+                else:
+                    circuit_breaker.record_success()
+            if retry >= HTTP_MAX_RETRIES or not _is_retryable(e):
+                raise WeatherAPIError(str(e)) from e
+
+            delay = retry_after(e)
+            if rate_limiter and (status == 429 or delay is not None):
+                # Every worker waits out the throttle together instead of retrying into it
+                rate_limiter.pause(delay if delay is not None else _backoff(retry + 1))
+            else:
+                time.sleep(delay if delay is not None else _backoff(retry))
+            retry += 1
+            _increment('retries')
+            continue
+        except Exception:
+            # Not an HTTP outcome: free a half-open probe so the breaker cannot stay stuck
+            if circuit_breaker:
+                circuit_breaker.release()
+            raise
+        try:
+            data = response.json()
+        except ValueError as e:
+            # A 200 with a truncated or malformed body is an upstream failure, not a success
+            if circuit_breaker and circuit_breaker.record_failure():
+                _increment('breaker_opens')
+            raise WeatherAPIError(f"Invalid JSON from weather API: {str(e)}") from e
+        if circuit_breaker:
+            circuit_breaker.record_success()
+        return data
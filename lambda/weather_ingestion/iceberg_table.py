@@ -0,0 +1,518 @@
+"""
+Optional Apache Iceberg table for the observations (TABLE_FORMAT=iceberg)
+
+The Hive-style weather_data table has no file-level metadata: Athena lists the
+partition prefixes and opens every footer to find the rows a query needs, and
+each minute leaves another small object behind. In Iceberg mode the ingestion
+Lambda appends its records to the weather_iceberg table instead. Every commit
+writes manifests recording each data file's day partition, row count and
+per-column lower/upper bounds, so a time-range or per-city query is planned
+from the manifests alone and skips non-matching files without listing S3.
+
+The table is partitioned by day(timestamp) and sorted by city, then timestamp.
+Appends are small, so maintenance_handler runs hourly:
+
+    compaction        A day holding ICEBERG_COMPACTION_MIN_FILES files or more is
+                      rewritten as files of about write.target-file-size-bytes,
+                      sorted by the table's sort order (bin-pack and sort in one
+                      pass), so each file covers a narrow range of cities
+    snapshot expiry   Snapshots older than history.expire.max-snapshot-age-ms are
+                      dropped, keeping history.expire.min-snapshots-to-keep
+    orphan removal    Files under the table location that no remaining snapshot
+                      references (replaced by compaction, or left by a failed
+                      commit) are deleted once older than ICEBERG_ORPHAN_MIN_AGE_HOURS
+
+The deployed stack declares the table in the Glue Data Catalog (ICEBERG_CATALOG=glue).
+For local runs, ICEBERG_CATALOG=sql with a SQLite ICEBERG_CATALOG_URI and a
+file:// ICEBERG_WAREHOUSE creates the table on first use:
+
+    ICEBERG_CATALOG=sql ICEBERG_CATALOG_URI=sqlite:////tmp/iceberg/catalog.db \\
+    ICEBERG_WAREHOUSE=file:///tmp/iceberg/warehouse python iceberg_table.py maintain
+
+pyiceberg is imported on first use, so the Hive mode never loads it.
+"""
+
+import argparse
+import json
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Set
+
+from utils import get_weather_schema, records_to_table
+
+# Configuration from environment variables
+TABLE_FORMAT = os.environ.get('TABLE_FORMAT', 'hive')  # 'hive' or 'iceberg'
+ICEBERG_ENABLED = TABLE_FORMAT == 'iceberg'
+ICEBERG_CATALOG = os.environ.get('ICEBERG_CATALOG', 'glue')  # 'glue' or 'sql'
+ICEBERG_CATALOG_URI = os.environ.get('ICEBERG_CATALOG_URI')  # SQLAlchemy URI of a 'sql' catalog
+ICEBERG_WAREHOUSE = os.environ.get('ICEBERG_WAREHOUSE')  # Where a 'sql' catalog creates the table
+ICEBERG_DATABASE = os.environ.get('ICEBERG_DATABASE', 'weather')
+ICEBERG_TABLE = os.environ.get('ICEBERG_TABLE', 'weather_iceberg')
+# pyiceberg measures the target in uncompressed Arrow bytes; files on disk are several times smaller
+ICEBERG_TARGET_FILE_SIZE_BYTES = int(os.environ.get('ICEBERG_TARGET_FILE_SIZE_BYTES', str(128 * 1024 * 1024)))
+ICEBERG_COMPACTION_MIN_FILES = int(os.environ.get('ICEBERG_COMPACTION_MIN_FILES', '8'))
+# Defaults for tables without history.expire.* properties
+ICEBERG_SNAPSHOT_MAX_AGE_HOURS = float(os.environ.get('ICEBERG_SNAPSHOT_MAX_AGE_HOURS', '6'))
+ICEBERG_MIN_SNAPSHOTS = int(os.environ.get('ICEBERG_MIN_SNAPSHOTS', '10'))
+# Unreferenced files younger than this may belong to a commit still in progress
+ICEBERG_ORPHAN_MIN_AGE_HOURS = float(os.environ.get('ICEBERG_ORPHAN_MIN_AGE_HOURS', '6'))
+# Times a partition rewrite is redone after an append committed in the meantime
+ICEBERG_REWRITE_RETRIES = int(os.environ.get('ICEBERG_REWRITE_RETRIES', '3'))
+
+PARTITION_FIELD = 'timestamp_day'
+SORT_COLUMNS = ['city', 'timestamp']
+
+# Iceberg type names of the Arrow types in utils.get_weather_schema()
+ICEBERG_TYPES = {'timestamp[ms]': 'timestamp', 'string': 'string', 'int32': 'int', 'int64': 'long', 'double': 'double'}
+
+_catalog = None
+
+
+def table_properties() -> Dict[str, str]:
+    """Iceberg table properties (infrastructure/stack.py declares the same ones in Glue)"""
+    return {
+        'write.format.default': 'parquet',
+        'write.parquet.compression-codec': 'zstd',
+        'write.target-file-size-bytes': str(ICEBERG_TARGET_FILE_SIZE_BYTES),
+        # Merge the manifest each append adds, so planning reads a bounded number of manifests
+        'commit.manifest-merge.enabled': 'true',
+        'commit.manifest.min-count-to-merge': '16',
+        'write.metadata.delete-after-commit.enabled': 'true',
+        'write.metadata.previous-versions-max': '20',
+        # Concurrent appends (SQS consumers, Step Functions shards) retry their commit without
+        # rewriting data files; give up within the one-minute schedule
+        'commit.retry.num-retries': '10',
+        'commit.retry.max-wait-ms': '2000',
+        'commit.retry.total-timeout-ms': '20000',
+        'history.expire.max-snapshot-age-ms': str(int(ICEBERG_SNAPSHOT_MAX_AGE_HOURS * 3600 * 1000)),
+        'history.expire.min-snapshots-to-keep': str(ICEBERG_MIN_SNAPSHOTS),
+    }
+
+
+def iceberg_schema():
+    """
+    Iceberg schema of the observations, with field IDs in weather schema order
+
+    Returns:
+        pyiceberg Schema (timestamps become microsecond Iceberg timestamps)
+    """
+    from pyiceberg.schema import Schema
+    from pyiceberg.types import DoubleType, IntegerType, LongType, NestedField, StringType, TimestampType
+    types = {'timestamp': TimestampType, 'string': StringType, 'int': IntegerType, 'long': LongType,
+             'double': DoubleType}
+    return Schema(*[
+        NestedField(field_id=position + 1, name=field.name, field_type=types[ICEBERG_TYPES[str(field.type)]](),
+                    required=False)
+        for position, field in enumerate(get_weather_schema())
+    ])
+
+
+def get_catalog():
+    """
+    Catalog holding the table, created on first use
+
+    Returns:
+        pyiceberg Catalog for ICEBERG_CATALOG
+    """
+    global _catalog
+    if _catalog is None:
+        from pyiceberg.catalog import load_catalog
+        if ICEBERG_CATALOG == 'glue':
+            _catalog = load_catalog('glue', type='glue')
+        elif ICEBERG_CATALOG == 'sql':
+            if not ICEBERG_CATALOG_URI or not ICEBERG_WAREHOUSE:
+                raise ValueError("ICEBERG_CATALOG=sql needs ICEBERG_CATALOG_URI and ICEBERG_WAREHOUSE")
+            _catalog = load_catalog('local', type='sql', uri=ICEBERG_CATALOG_URI, warehouse=ICEBERG_WAREHOUSE)
+        else:
+            raise ValueError(f"ICEBERG_CATALOG must be 'glue' or 'sql', got {ICEBERG_CATALOG!r}")
+    return _catalog
+
+
+def get_table():
+    """
+    Load the observations table
+
+    The stack declares the table in Glue; a local 'sql' catalog creates it (and
+    its namespace) the first time it is missing.
+
+    Returns:
+        pyiceberg Table at its latest metadata
+    """
+    from pyiceberg.exceptions import NoSuchTableError
+    catalog = get_catalog()
+    identifier = (ICEBERG_DATABASE, ICEBERG_TABLE)
+    try:
+        return catalog.load_table(identifier)
+    except NoSuchTableError:
+        if ICEBERG_CATALOG == 'glue':
+            raise
+    from pyiceberg.partitioning import PartitionField, PartitionSpec
+    from pyiceberg.table.sorting import SortField, SortOrder
+    from pyiceberg.transforms import DayTransform, IdentityTransform
+    schema = iceberg_schema()
+    catalog.create_namespace_if_not_exists(ICEBERG_DATABASE)
+    return catalog.create_table_if_not_exists(
+        identifier,
+        schema=schema,
+        partition_spec=PartitionSpec(PartitionField(
+            source_id=schema.find_field('timestamp').field_id, field_id=1000,
+            transform=DayTransform(), name=PARTITION_FIELD,
+        )),
+        sort_order=SortOrder(*[
+            SortField(source_id=schema.find_field(name).field_id, transform=IdentityTransform())
+            for name in SORT_COLUMNS
+        ]),
+        properties=table_properties(),
+    )
+
+
+def _to_arrow(records: List[Dict[str, Any]]):
+    """Records as an Arrow table in the Iceberg schema's physical types"""
+    import pyarrow as pa
+    table = records_to_table(records)
+    # Iceberg timestamps are microseconds; the Parquet files of the Hive table use milliseconds
+    return table.cast(pa.schema([
+        field.with_type(pa.timestamp('us')) if pa.types.is_timestamp(field.type) else field
+        for field in table.schema
+    ]))
+
+
+def append_records(records: List[Dict[str, Any]], table=None) -> Dict[str, Any]:
+    """
+    Append weather records to the table in one snapshot
+
+    A commit that loses to a concurrent writer is retried by pyiceberg with the
+    data files already written (commit.retry.* table properties).
+
+    Args:
+        records: Weather records
+        table: Table to append to (defaults to get_table())
+
+    Returns:
+        Dictionary with the new snapshot ID, metadata location and data files added
+
+    Raises:
+        CommitFailedException: When every retry lost to a concurrent commit
+    """
+    table = table if table is not None else get_table()
+    table.append(_to_arrow(records))
+    snapshot = table.current_snapshot()
+    return {
+        'snapshot_id': snapshot.snapshot_id,
+        'metadata_location': table.metadata_location,
+        'data_files': int(snapshot.summary.additional_properties.get('added-data-files', 0)),
+    }
+
+
+def partition_files(table) -> Dict[date, Dict[str, int]]:
+    """
+    Data files of the current snapshot per day partition, read from the manifests
+
+    Returns:
+        Day -> {'files', 'bytes', 'rows'}
+    """
+    if table.current_snapshot() is None:
+        return {}
+    files = table.inspect.files().select(['content', 'partition', 'file_size_in_bytes', 'record_count']).to_pylist()
+    days: Dict[date, Dict[str, int]] = {}
+    for entry in files:
+        if entry['content'] != 0:  # Only data files; this writer never produces delete files
+            continue
+        day = days.setdefault(entry['partition'][PARTITION_FIELD], {'files': 0, 'bytes': 0, 'rows': 0})
+        day['files'] += 1
+        day['bytes'] += entry['file_size_in_bytes']
+        day['rows'] += entry['record_count']
+    return days
+
+
+def _day_filter(day: date):
+    from pyiceberg.expressions import And, GreaterThanOrEqual, LessThan
+    start = datetime.combine(day, datetime.min.time())
+    return And(GreaterThanOrEqual('timestamp', start.isoformat()),
+               LessThan('timestamp', (start + timedelta(days=1)).isoformat()))
+
+
+def _sort_keys(table) -> List[tuple]:
+    """Arrow sort keys of the table's sort order (identity transforms only)"""
+    from pyiceberg.table.sorting import SortDirection
+    from pyiceberg.transforms import IdentityTransform
+    keys = []
+    for field in table.sort_order().fields:
+        if isinstance(field.transform, IdentityTransform):
+            direction = 'ascending' if field.direction == SortDirection.ASC else 'descending'
+            keys.append((table.schema().find_field(field.source_id).name, direction))
+    return keys
+
+
+def rewrite_partition(table, day: date) -> Dict[str, Any]:
+    """
+    Rewrite one day as sorted files of about the target size
+
+    The day is read, sorted by the table's sort order and committed with an
+    overwrite that replaces exactly that partition's files, so readers see the
+    old or the new files, never both. When an append to the day lands in
+    between, pyiceberg refuses the commit (ValidationException) and the rewrite
+    is redone from the refreshed table; the files of the abandoned attempt are
+    left to remove_orphan_files.
+
+    Args:
+        table: Table to compact
+        day: Day partition to rewrite
+
+    Returns:
+        Dictionary with files and bytes before and after, rows and retries
+    """
+    from pyiceberg.exceptions import CommitFailedException, ValidationException
+    row_filter = _day_filter(day)
+    before = partition_files(table).get(day, {'files': 0, 'bytes': 0, 'rows': 0})
+    for retries in range(ICEBERG_REWRITE_RETRIES + 1):
+        data = table.scan(row_filter=row_filter).to_arrow().sort_by(_sort_keys(table))
+        try:
+            table.overwrite(data, overwrite_filter=row_filter,
+                            snapshot_properties={'weather.maintenance': 'rewrite'})
+            break
+        except (CommitFailedException, ValidationException):
+            if retries == ICEBERG_REWRITE_RETRIES:
+                raise
+            table.refresh()
+    after = partition_files(table).get(day, {'files': 0, 'bytes': 0})
+    return {
+        'day': day.isoformat(),
+        'files_before': before['files'],
+        'files_after': after['files'],
+        'bytes_before': before['bytes'],
+        'bytes_after': after['bytes'],
+        'rows': data.num_rows,
+        'retries': retries,
+    }
+
+
+def compact(table, min_files: int = ICEBERG_COMPACTION_MIN_FILES, rewrite_all: bool = False) -> List[Dict[str, Any]]:
+    """
+    Rewrite every day partition holding at least min_files data files
+
+    Args:
+        table: Table to compact
+        min_files: Files a day needs before it is rewritten
+        rewrite_all: Rewrite every day, e.g. after changing the table's sort order
+
+    Returns:
+        One rewrite_partition result per day rewritten
+    """
+    days = partition_files(table)
+    return [rewrite_partition(table, day) for day in sorted(days)
+            if rewrite_all or days[day]['files'] >= min_files]
+
+
+def expire_snapshots(table, now: Optional[datetime] = None) -> int:
+    """
+    Expire snapshots older than the table's history.expire.max-snapshot-age-ms
+
+    The newest history.expire.min-snapshots-to-keep snapshots and every branch
+    or tag head are kept. This only edits the metadata; remove_orphan_files
+    deletes the files nothing references any more.
+
+    Args:
+        table: Table to expire snapshots of
+        now: Current time (defaults to datetime.utcnow())
+
+    Returns:
+        Number of snapshots expired
+    """
+    properties = table.properties
+    max_age_ms = int(properties.get('history.expire.max-snapshot-age-ms',
+                                    int(ICEBERG_SNAPSHOT_MAX_AGE_HOURS * 3600 * 1000)))
+    min_keep = int(properties.get('history.expire.min-snapshots-to-keep', ICEBERG_MIN_SNAPSHOTS))
+    cutoff_ms = int(((now or datetime.utcnow()) - datetime(1970, 1, 1)).total_seconds() * 1000) - max_age_ms
+
+    protected = {ref.snapshot_id for ref in table.metadata.refs.values()}
+    snapshots = sorted(table.snapshots(), key=lambda snapshot: snapshot.timestamp_ms)
+    candidates = snapshots[:-min_keep] if min_keep > 0 else snapshots
+    expired = [snapshot.snapshot_id for snapshot in candidates
+               if snapshot.timestamp_ms < cutoff_ms and snapshot.snapshot_id not in protected]
+    if expired:
+        table.maintenance.expire_snapshots().by_ids(expired).commit()
+    return len(expired)
+
+
+def referenced_files(table) -> Set[str]:
+    """
+    Every file a snapshot of the table still needs: metadata files, manifest
+    lists, manifests and live data files
+
+    Returns:
+        Set of file locations as the metadata records them
+    """
+    files = {table.metadata_location}
+    files.update(entry.metadata_file for entry in table.metadata.metadata_log)
+    seen_manifests: Set[str] = set()
+    for snapshot in table.snapshots():
+        files.add(snapshot.manifest_list)
+        for manifest in snapshot.manifests(table.io):
+            # Consecutive snapshots share most manifests; read each once
+            if manifest.manifest_path in seen_manifests:
+                continue
+            seen_manifests.add(manifest.manifest_path)
+            files.add(manifest.manifest_path)
+            files.update(entry.data_file.file_path
+                         for entry in manifest.fetch_manifest_entry(table.io, discard_deleted=True))
+    return files
+
+
+def remove_orphan_files(table, min_age_hours: float = ICEBERG_ORPHAN_MIN_AGE_HOURS,
+                        now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Delete files under the table location that no snapshot references
+
+    Args:
+        table: Table to clean up
+        min_age_hours: Leave younger files alone (a concurrent commit may be about to reference them)
+        now: Current time (defaults to datetime.utcnow())
+
+    Returns:
+        Dictionary with the number and total size of files deleted
+    """
+    from pyarrow import fs as pafs
+    from pyiceberg.io.pyarrow import PyArrowFileIO
+    referenced = {PyArrowFileIO.parse_location(location)[2] for location in referenced_files(table)}
+    scheme, netloc, path = PyArrowFileIO.parse_location(table.location())
+    filesystem = table.io.fs_by_scheme(scheme, netloc)
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=min_age_hours)
+
+    deleted = {'files': 0, 'bytes': 0}
+    for info in filesystem.get_file_info(pafs.FileSelector(path, recursive=True, allow_not_found=True)):
+        if info.type != pafs.FileType.File or info.path in referenced:
+            continue
+        # Metadata JSON files are pruned on commit (write.metadata.delete-after-commit.enabled)
+        if info.path.endswith('.metadata.json') or info.mtime is None:
+            continue
+        if info.mtime.replace(tzinfo=None) > cutoff:
+            continue
+        filesystem.delete_file(info.path)
+        deleted['files'] += 1
+        deleted['bytes'] += info.size
+    return deleted
+
+
+def maintain(table=None, rewrite_all: bool = False, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Compact small files, expire old snapshots and delete unreferenced files
+
+    Args:
+        table: Table to maintain (defaults to get_table())
+        rewrite_all: Rewrite every day partition, not only those with many files
+        now: Current time (defaults to datetime.utcnow())
+
+    Returns:
+        Dictionary with maintenance statistics
+    """
+    table = table if table is not None else get_table()
+    rewritten = compact(table, rewrite_all=rewrite_all)
+    expired = expire_snapshots(table, now)
+    orphans = remove_orphan_files(table, now=now)
+    return {
+        'table': '.'.join(table.name()),
+        'partitions_rewritten': len(rewritten),
+        'files_before': sum(result['files_before'] for result in rewritten),
+        'files_after': sum(result['files_after'] for result in rewritten),
+        'snapshots_expired': expired,
+        'snapshots_kept': len(table.snapshots()),
+        'files_deleted': orphans['files'],
+        'bytes_deleted': orphans['bytes'],
+        'rewrites': rewritten,
+    }
+
+
+def plan_query(table, city: Optional[str] = None, start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Files a query for one city and/or time range would read, planned from the manifests
+
+    Partition values prune whole days and the per-file lower/upper bounds prune
+    files whose city or timestamp range cannot match; nothing is listed and no
+    data file is opened.
+
+    Args:
+        table: Table to plan against
+        city: Only this city
+        start: Inclusive start of the time range
+        end: Exclusive end of the time range
+
+    Returns:
+        Dictionary with files and bytes planned out of the table's total
+    """
+    from pyiceberg.expressions import AlwaysTrue, And, EqualTo, GreaterThanOrEqual, LessThan
+    row_filter = AlwaysTrue()
+    if city is not None:
+        row_filter = And(row_filter, EqualTo('city', city))
+    if start is not None:
+        row_filter = And(row_filter, GreaterThanOrEqual('timestamp', start.isoformat()))
+    if end is not None:
+        row_filter = And(row_filter, LessThan('timestamp', end.isoformat()))
+
+    all_files = [task.file for task in table.scan().plan_files()]
+    planned = [task.file for task in table.scan(row_filter=row_filter).plan_files()]
+    return {
+        'files_total': len(all_files),
+        'files_planned': len(planned),
+        'bytes_total': sum(data_file.file_size_in_bytes for data_file in all_files),
+        'bytes_planned': sum(data_file.file_size_in_bytes for data_file in planned),
+        'rows_planned': sum(data_file.record_count for data_file in planned),
+    }
+
+
+def maintenance_handler(event, context):
+    """
+    AWS Lambda handler for scheduled table maintenance
+
+    Args:
+        event: Lambda event (may contain `rewrite_all: true` to rewrite every day partition)
+        context: Lambda context
+
+    Returns:
+        Dictionary with statusCode and body
+    """
+    try:
+        rewrite_all = bool(event.get('rewrite_all')) if isinstance(event, dict) else False
+        print(f"Maintaining Iceberg table {ICEBERG_DATABASE}.{ICEBERG_TABLE}")
+        result = maintain(rewrite_all=rewrite_all)
+        print(f"Maintenance result: {result}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to maintain the Iceberg table'
+            })
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain or inspect the Iceberg weather table')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    maintain_parser = subparsers.add_parser('maintain', help='Compact, expire snapshots and remove orphan files')
+    maintain_parser.add_argument('--all', action='store_true', help='Rewrite every day partition')
+    plan_parser = subparsers.add_parser('plan', help='Show the files a query would read')
+    plan_parser.add_argument('--city', help='City to select')
+    plan_parser.add_argument('--start', help='Inclusive ISO start time')
+    plan_parser.add_argument('--end', help='Exclusive ISO end time')
+    subparsers.add_parser('partitions', help='Files, bytes and rows per day partition')
+    args = parser.parse_args()
+
+    if args.command == 'maintain':
+        output = maintain(rewrite_all=args.all)
+    elif args.command == 'plan':
+        output = plan_query(
+            get_table(), args.city,
+            datetime.fromisoformat(args.start) if args.start else None,
+            datetime.fromisoformat(args.end) if args.end else None,
+        )
+    else:
+        output = {day.isoformat(): stats for day, stats in sorted(partition_files(get_table()).items())}
+    print(json.dumps(output, indent=2))
@@ -1,13 +1,21 @@
 import json
 import os
-import boto3
 from datetime import datetime
-from typing import Dict, Any
-import requests
-from utils import convert_to_parquet, create_s3_key
+from typing import Dict, Any, List, Optional
+import change_detection
+import http_client
+import iceberg_table
+import latest_index
+import location_grid
+import metrics as metrics_module
+import partitions
+import profiling
+from utils import KEY_LAYOUT, convert_to_parquet, create_s3_key, create_batch_s3_key, location_slug
+from wmo import WEATHER_DESCRIPTIONS, WEATHER_CATEGORIES, UNKNOWN_DESCRIPTION, OTHER_CATEGORY
 
-# Initialize AWS clients
-s3_client = boto3.client('s3')
+# AWS clients are created on first use: importing boto3 and building a client
+# dominates module init, and init time is billed on every cold start
+s3_client = None
 
 # Configuration from environment variables
 # Note: Open-Meteo doesn't require API key
@@ -17,135 +25,493 @@ LATITUDE = float(os.environ.get('LATITUDE', '51.5074'))  # Default: London
 LONGITUDE = float(os.environ.get('LONGITUDE', '-0.1278'))  # Default: London
 CITY = os.environ.get('CITY', 'London')  # For metadata only
 COUNTRY_CODE = os.environ.get('COUNTRY_CODE', 'GB')  # For metadata only
+LOCATIONS = os.environ.get('LOCATIONS')  # Optional JSON list of locations for batch ingestion
+MAX_LOCATIONS_PER_REQUEST = int(os.environ.get('MAX_LOCATIONS_PER_REQUEST', '50'))
 
+CURRENT_VARIABLES = 'temperature_2m,relative_humidity_2m,apparent_temperature,pressure_msl,wind_speed_10m,wind_direction_10m,cloud_cover,visibility,weather_code'
 
-def fetch_weather_data(latitude: float, longitude: float, api_url: str, city: str = None, country_code: str = None) -> Dict[str, Any]:
+
+def get_s3_client():
     """
-    Fetch weather data from Open-Meteo API
+    Get the S3 client, creating it on first use
     
+    Returns:
+        boto3 S3 client
+    """
+    global s3_client
+    if s3_client is None:
+        import boto3
+        s3_client = boto3.client('s3')
+    return s3_client
+
+
+def _build_weather_record(current: Dict[str, Any], timezone: str, latitude: float, longitude: float,
+                          city: str, country_code: str, timestamp: datetime = None) -> Dict[str, Any]:
+    """
+    Build a single weather record from an Open-Meteo `current` block
+
     Args:
+        current: The `current` block of an Open-Meteo response
+        timezone: Timezone reported by the API for the location
         latitude: Latitude coordinate
         longitude: Longitude coordinate
-        api_url: Base URL for the API
-        city: City name for metadata (optional)
-        country_code: Country code for metadata (optional)
-        
+        city: City name for metadata
+        country_code: Country code for metadata
+        timestamp: Collection timestamp (defaults to current UTC time)
+
     Returns:
         Dictionary containing weather data
     """
-    # Use provided values or fall back to module-level defaults
-    city = city or CITY
-    country_code = country_code or COUNTRY_CODE
+    # Map weather codes (WMO Weather interpretation codes) via precomputed tables
+    weather_code = current.get('weather_code', 0)
+    weather_main = WEATHER_CATEGORIES.get(weather_code, OTHER_CATEGORY)
+
+    # Add metadata
+    return {
+        'timestamp': (timestamp or datetime.utcnow()).isoformat(),
+        'city': city,
+        'country_code': country_code,
+        'weather_id': weather_code,
+        'weather_main': weather_main,
+        'weather_description': WEATHER_DESCRIPTIONS.get(weather_code, UNKNOWN_DESCRIPTION),
+        'temperature': current.get('temperature_2m'),
+        'feels_like': current.get('apparent_temperature'),
+        'temp_min': current.get('temperature_2m'),  # Open-Meteo current doesn't provide min/max separately
+        'temp_max': current.get('temperature_2m'),
+        'pressure': int(current.get('pressure_msl', 0)) if current.get('pressure_msl') else None,
+        'humidity': int(current.get('relative_humidity_2m', 0)) if current.get('relative_humidity_2m') else None,
+        'visibility': int(current.get('visibility', 0) / 1000) if current.get('visibility') else None,  # Convert m to km
+        'wind_speed': current.get('wind_speed_10m'),
+        'wind_deg': current.get('wind_direction_10m'),
+        'clouds': int(current.get('cloud_cover', 0)) if current.get('cloud_cover') else None,
+        'sunrise': None,  # Open-Meteo current doesn't provide sunrise/sunset
+        'sunset': None,
+        'timezone': timezone,
+        'latitude': latitude,
+        'longitude': longitude,
+    }
+
+
+def fetch_current(latitude: float, longitude: float, api_url: str) -> Dict[str, Any]:
+    """
+    Fetch the raw Open-Meteo response for one location
+
+    Args:
+        latitude: Latitude coordinate
+        longitude: Longitude coordinate
+        api_url: Base URL for the API
+
+    Returns:
+        Open-Meteo response dictionary (with `current` and `timezone`)
+    """
     try:
         # Construct API request - Open-Meteo uses lat/long and specific parameters
         params = {
             'latitude': latitude,
             'longitude': longitude,
-            'current': 'temperature_2m,relative_humidity_2m,apparent_temperature,pressure_msl,wind_speed_10m,wind_direction_10m,cloud_cover,visibility,weather_code',
+            'current': CURRENT_VARIABLES,
             'timezone': 'auto',
             'forecast_days': 1
         }
         
-        response = requests.get(api_url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # Open-Meteo response structure
-        current = data.get('current', {})
-        
-        # Map weather codes (WMO Weather interpretation codes)
-        weather_code = current.get('weather_code', 0)
-        weather_descriptions = {
-            0: 'Clear sky', 1: 'Mainly clear', 2: 'Partly cloudy', 3: 'Overcast',
-            45: 'Foggy', 48: 'Depositing rime fog',
-            51: 'Light drizzle', 53: 'Moderate drizzle', 55: 'Dense drizzle',
-            56: 'Light freezing drizzle', 57: 'Dense freezing drizzle',
-            61: 'Slight rain', 63: 'Moderate rain', 65: 'Heavy rain',
-            66: 'Light freezing rain', 67: 'Heavy freezing rain',
-            71: 'Slight snow', 73: 'Moderate snow', 75: 'Heavy snow',
-            77: 'Snow grains', 80: 'Slight rain showers', 81: 'Moderate rain showers',
-            82: 'Violent rain showers', 85: 'Slight snow showers', 86: 'Heavy snow showers',
-            95: 'Thunderstorm', 96: 'Thunderstorm with slight hail', 99: 'Thunderstorm with heavy hail'
-        }
-        
-        weather_main = 'Clear' if weather_code in [0, 1] else 'Clouds' if weather_code in [2, 3] else 'Rain' if weather_code in [51, 53, 55, 61, 63, 65, 80, 81, 82] else 'Snow' if weather_code in [71, 73, 75, 77, 85, 86] else 'Thunderstorm' if weather_code in [95, 96, 99] else 'Other'
-        
-        # Add metadata
-        weather_data = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'city': city,
-            'country_code': country_code,
-            'weather_id': weather_code,
-            'weather_main': weather_main,
-            'weather_description': weather_descriptions.get(weather_code, 'Unknown'),
-            'temperature': current.get('temperature_2m'),
-            'feels_like': current.get('apparent_temperature'),
-            'temp_min': current.get('temperature_2m'),  # Open-Meteo current doesn't provide min/max separately
-            'temp_max': current.get('temperature_2m'),
-            'pressure': int(current.get('pressure_msl', 0)) if current.get('pressure_msl') else None,
-            'humidity': int(current.get('relative_humidity_2m', 0)) if current.get('relative_humidity_2m') else None,
-            'visibility': int(current.get('visibility', 0) / 1000) if current.get('visibility') else None,  # Convert m to km
-            'wind_speed': current.get('wind_speed_10m'),
-            'wind_deg': current.get('wind_direction_10m'),
-            'clouds': int(current.get('cloud_cover', 0)) if current.get('cloud_cover') else None,
-            'sunrise': None,  # Open-Meteo current doesn't provide sunrise/sunset
-            'sunset': None,
-            'timezone': data.get('timezone', 'UTC'),
-            'latitude': latitude,
-            'longitude': longitude,
-        }
+        return http_client.get_json(api_url, params)
         
-        return weather_data
+    except http_client.WeatherAPIError as e:
+        raise Exception(f"Failed to fetch weather data: {str(e)}")
+
+
+def fetch_weather_data(latitude: float, longitude: float, api_url: str, city: str = None, country_code: str = None) -> Dict[str, Any]:
+    """
+    Fetch weather data from Open-Meteo API
+    
+    Args:
+        latitude: Latitude coordinate
+        longitude: Longitude coordinate
+        api_url: Base URL for the API
+        city: City name for metadata (optional)
+        country_code: Country code for metadata (optional)
         
-    except requests.exceptions.RequestException as e:
+    Returns:
+        Dictionary containing weather data
+    """
+    # Use provided values or fall back to module-level defaults
+    city = city or CITY
+    country_code = country_code or COUNTRY_CODE
+    data = fetch_current(latitude, longitude, api_url)
+    
+    # Open-Meteo response structure
+    return _build_weather_record(data.get('current', {}), data.get('timezone', 'UTC'), latitude, longitude, city, country_code)
+
+
+def fetch_current_batch(locations: List[Dict[str, Any]], api_url: str) -> List[Dict[str, Any]]:
+    """
+    Fetch raw Open-Meteo responses for many locations using multi-coordinate requests
+
+    Open-Meteo accepts comma-separated latitude/longitude lists and answers with
+    one result per coordinate pair, in request order. Locations are sent in chunks
+    of MAX_LOCATIONS_PER_REQUEST to keep the request URL bounded.
+
+    Args:
+        locations: List of location dictionaries (see parse_locations)
+        api_url: Base URL for the API
+
+    Returns:
+        List of Open-Meteo response dictionaries, one per location, in order
+    """
+    responses = []
+    try:
+        for start in range(0, len(locations), MAX_LOCATIONS_PER_REQUEST):
+            chunk = locations[start:start + MAX_LOCATIONS_PER_REQUEST]
+            params = {
+                'latitude': ','.join(str(loc['latitude']) for loc in chunk),
+                'longitude': ','.join(str(loc['longitude']) for loc in chunk),
+                'current': CURRENT_VARIABLES,
+                'timezone': 'auto',
+                'forecast_days': 1
+            }
+
+            data = http_client.get_json(api_url, params)
+            # A single coordinate pair comes back as an object rather than a list
+            results = data if isinstance(data, list) else [data]
+            if len(results) != len(chunk):
+                raise KeyError(f"expected {len(chunk)} results, got {len(results)}")
+            responses.extend(results)
+
+        return responses
+
+    except http_client.WeatherAPIError as e:
         raise Exception(f"Failed to fetch weather data: {str(e)}")
     except KeyError as e:
         raise Exception(f"Unexpected API response format: {str(e)}")
 
 
+def _build_batch_records(locations: List[Dict[str, Any]], responses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Build weather records for locations and their responses, sharing one timestamp"""
+    timestamp = datetime.utcnow()
+    return [
+        _build_weather_record(
+            result.get('current', {}),
+            result.get('timezone', 'UTC'),
+            loc['latitude'],
+            loc['longitude'],
+            loc['city'],
+            loc['country_code'],
+            timestamp,
+        )
+        for loc, result in zip(locations, responses)
+    ]
+
+
+def fetch_weather_data_batch(locations: List[Dict[str, Any]], api_url: str) -> List[Dict[str, Any]]:
+    """
+    Fetch weather data for many locations using Open-Meteo's multi-coordinate requests
+
+    Args:
+        locations: List of location dictionaries (see parse_locations)
+        api_url: Base URL for the API
+
+    Returns:
+        List of weather data dictionaries, one per location, sharing one timestamp
+    """
+    return _build_batch_records(locations, fetch_current_batch(locations, api_url))
+
+
+def parse_locations(event) -> Optional[List[Dict[str, Any]]]:
+    """
+    Resolve the list of locations for a batch invocation
+
+    Locations are taken from the event's `locations` key, falling back to the
+    LOCATIONS environment variable (a JSON list). Each location needs
+    `latitude` and `longitude`; `city` and `country_code` are metadata.
+
+    Args:
+        event: Lambda event
+
+    Returns:
+        List of normalized location dictionaries, or None for a single-location invocation
+    """
+    locations = event.get('locations') if isinstance(event, dict) else None
+    if locations is None and LOCATIONS:
+        locations = json.loads(LOCATIONS)
+    if locations is None:
+        return None
+
+    normalized = []
+    for loc in locations:
+        if 'latitude' not in loc or 'longitude' not in loc:
+            raise ValueError(f"Location is missing latitude/longitude: {loc}")
+        latitude = float(loc['latitude'])
+        longitude = float(loc['longitude'])
+        normalized.append({
+            'latitude': latitude,
+            'longitude': longitude,
+            'city': loc.get('city') or f"{latitude:.4f},{longitude:.4f}",
+            'country_code': loc.get('country_code', ''),
+        })
+    return normalized
+
+
+def _register_partition(s3_key: str, metrics) -> None:
+    """
+    Register the written object's partition in Glue (when not using partition projection)
+
+    The data is already in S3, so a registration failure is logged rather than failing
+    the invocation; the next write to the same prefix retries it.
+
+    Args:
+        s3_key: Key of the object just written
+        metrics: InvocationMetrics for this invocation
+    """
+    try:
+        if partitions.ensure_partition(S3_BUCKET, s3_key):
+            print(f"Registered new partition for {s3_key.rsplit('/', 1)[0]}")
+            metrics.add('PartitionsRegistered', 1)
+    except Exception as e:
+        print(f"Warning: partition registration failed: {str(e)}")
+        metrics.add('PartitionRegistrationErrors', 1)
+
+
+def _location_keys(locations: List[Dict[str, Any]]) -> List[str]:
+    """Change detection key of each location, in order (sites sharing coordinates share a key)"""
+    return [change_detection.location_key(loc['latitude'], loc['longitude']) for loc in locations]
+
+
+def _observations(locations: List[Dict[str, Any]], responses: List[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+    """Location key -> fingerprint of its upstream `current` block"""
+    return {
+        key: change_detection.fingerprint(result.get('current', {}))
+        for key, result in zip(_location_keys(locations), responses)
+    }
+
+
+def _record_written(observations: Dict[str, Dict[str, str]]) -> None:
+    """Store fingerprints after a successful write; failures only cost a duplicate write later"""
+    try:
+        change_detection.record_written(get_s3_client(), S3_BUCKET, observations)
+    except Exception as e:
+        print(f"Warning: could not store change detection state: {str(e)}")
+
+
+def _update_latest_index(records: List[Dict[str, Any]], metrics, index_key: Optional[str] = None) -> None:
+    """Merge just-written records into the latest-observation index; failures only leave it stale"""
+    if not latest_index.LATEST_INDEX_ENABLED:
+        return
+    try:
+        with metrics.stage('Index'):
+            result = latest_index.update_latest(get_s3_client(), S3_BUCKET, records,
+                                                index_key or latest_index.LATEST_INDEX_KEY)
+        metrics.add('LatestIndexConflicts', result['conflicts'])
+    except Exception as e:
+        print(f"Warning: could not update the latest index: {str(e)}")
+        metrics.add('LatestIndexErrors', 1)
+
+
+def _upload_records(records: List[Dict[str, Any]], metrics, index_key: Optional[str] = None) -> List[str]:
+    """
+    Encode and upload a batch of records as one Parquet object, or as one object per
+    location with the "location" key layout, or append them to the Iceberg table
+    with TABLE_FORMAT=iceberg
+
+    Args:
+        records: Weather records
+        metrics: InvocationMetrics for this invocation
+        index_key: Latest index object to merge the records into (defaults to LATEST_INDEX_KEY)
+
+    Returns:
+        Locations of the objects written (the new table metadata file for Iceberg)
+    """
+    if iceberg_table.ICEBERG_ENABLED:
+        print(f"Appending {len(records)} records to Iceberg table "
+              f"{iceberg_table.ICEBERG_DATABASE}.{iceberg_table.ICEBERG_TABLE}")
+        with metrics.stage('Commit'):
+            result = iceberg_table.append_records(records)
+        _update_latest_index(records, metrics, index_key)
+        metrics.put('ObjectsWritten', result['data_files'])
+        return [result['metadata_location']]
+
+    if KEY_LAYOUT == 'location':
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            groups.setdefault(location_slug(record['city'], record['country_code']), []).append(record)
+        batches = list(groups.items())
+    else:
+        batches = [(None, records)]
+
+    print(f"Converting {len(records)} records to Parquet format ({len(batches)} objects)")
+    timestamp = datetime.utcnow()
+    s3_keys = []
+    for location, batch in batches:
+        with metrics.stage('Encode'):
+            parquet_data = convert_to_parquet(batch)
+        metrics.add('ParquetBytes', len(parquet_data), 'Bytes')
+
+        s3_key = create_batch_s3_key(len(batch), timestamp, location)
+        print(f"Uploading to s3://{S3_BUCKET}/{s3_key}")
+        with metrics.stage('Upload'):
+            get_s3_client().put_object(
+                Bucket=S3_BUCKET,
+                Key=s3_key,
+                Body=parquet_data,
+                ContentType='application/octet-stream'
+            )
+        s3_keys.append(s3_key)
+
+    for s3_key in s3_keys:
+        _register_partition(s3_key, metrics)
+    _update_latest_index(records, metrics, index_key)
+    metrics.put('ObjectsWritten', len(s3_keys))
+    return [f's3://{S3_BUCKET}/{s3_key}' for s3_key in s3_keys]
+
+
+def _ingest_batch(locations: List[Dict[str, Any]], metrics, index_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Fetch, convert and upload one Parquet object covering all locations
+
+    Args:
+        locations: List of normalized location dictionaries
+        metrics: InvocationMetrics for this invocation
+        index_key: Latest index object to merge the records into (defaults to LATEST_INDEX_KEY)
+
+    Returns:
+        Lambda response dictionary
+    """
+    print(f"Fetching weather data for {len(locations)} locations")
+    with metrics.stage('Fetch'):
+        # Each grid cell is fetched once; sites sharing a cell share its response
+        responses = location_grid.fetch_for_locations(
+            locations, WEATHER_API_URL, lambda cells: fetch_current_batch(cells, WEATHER_API_URL)
+        )
+
+    # Only locations whose upstream observation changed since the last write
+    observations = _observations(locations, responses)
+    changed = set(change_detection.changed_locations(get_s3_client(), S3_BUCKET, observations))
+    # Zip against one key per location: observations merges sites that share coordinates
+    pending = [
+        (loc, result) for loc, result, key in zip(locations, responses, _location_keys(locations))
+        if key in changed
+    ]
+    metrics.put('SkippedWrites', len(locations) - len(pending))
+    if not pending:
+        print("No observation changed since the last write; skipping upload")
+        metrics.put('RecordCount', 0)
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Weather data unchanged; nothing written',
+                'location_count': len(locations),
+                'skipped': True
+            })
+        }
+    records = _build_batch_records([loc for loc, _ in pending], [result for _, result in pending])
+    metrics.put('RecordCount', len(records))
+
+    locations_written = _upload_records(records, metrics, index_key)
+    _record_written(observations)
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'Weather data successfully ingested',
+            'location_count': len(records),
+            's3_location': locations_written[0],
+            'object_count': len(locations_written),
+            'timestamp': records[0]['timestamp'] if records else None
+        })
+    }
+
+
+@profiling.profiled
 def lambda_handler(event, context):
     """
     AWS Lambda handler function
     
     Args:
-        event: Lambda event (can contain latitude, longitude, city, country_code override)
+        event: Lambda event (can contain latitude, longitude, city, country_code override,
+               or a `locations` list for batch ingestion, optionally with the
+               `latest_index_key` to merge the batch into)
         context: Lambda context
         
     Returns:
         Dictionary with statusCode and body
     """
+    metrics = metrics_module.start_invocation(context)
+    http_before = http_client.get_counters()
+    grid_before = location_grid.get_counters()
     try:
+        # Validate required environment variables
+        if not S3_BUCKET:
+            raise ValueError("S3_BUCKET environment variable is not set")
+        
+        # Batch mode: many locations, one API round trip per chunk, one Parquet object
+        locations = parse_locations(event)
+        if locations:
+            index_key = event.get('latest_index_key') if isinstance(event, dict) else None
+            response = _ingest_batch(locations, metrics, index_key)
+            metrics.put('Errors', 0)
+            return response
+        
         # Get coordinates and metadata from event or use defaults
         latitude = float(event.get('latitude', LATITUDE)) if isinstance(event, dict) else LATITUDE
         longitude = float(event.get('longitude', LONGITUDE)) if isinstance(event, dict) else LONGITUDE
         city = event.get('city', CITY) if isinstance(event, dict) else CITY
         country_code = event.get('country_code', COUNTRY_CODE) if isinstance(event, dict) else COUNTRY_CODE
         
-        # Validate required environment variables
-        if not S3_BUCKET:
-            raise ValueError("S3_BUCKET environment variable is not set")
-        
         # Fetch weather data
         print(f"Fetching weather data for {city}, {country_code} (lat: {latitude}, lon: {longitude})")
-        weather_data = fetch_weather_data(latitude, longitude, WEATHER_API_URL, city, country_code)
+        with metrics.stage('Fetch'):
+            data = location_grid.fetch_for_location(
+                latitude, longitude, WEATHER_API_URL, lambda lat, lon: fetch_current(lat, lon, WEATHER_API_URL)
+            )
         
-        # Convert to Parquet format
-        print("Converting data to Parquet format")
-        parquet_data = convert_to_parquet([weather_data])
-        
-        # Create S3 key with partitioning (year/month/day/hour)
-        s3_key = create_s3_key(city, country_code)
-        
-        # Upload to S3
-        print(f"Uploading to s3://{S3_BUCKET}/{s3_key}")
-        s3_client.put_object(
-            Bucket=S3_BUCKET,
-            Key=s3_key,
-            Body=parquet_data,
-            ContentType='application/octet-stream'
+        # Nothing to write if the upstream observation is the one already stored
+        observations = _observations([{'latitude': latitude, 'longitude': longitude}], [data])
+        if not change_detection.changed_locations(get_s3_client(), S3_BUCKET, observations):
+            print("Observation unchanged since the last write; skipping upload")
+            metrics.put('SkippedWrites', 1)
+            metrics.put('RecordCount', 0)
+            metrics.put('Errors', 0)
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Weather data unchanged; nothing written',
+                    'city': city,
+                    'country_code': country_code,
+                    'skipped': True
+                })
+            }
+        metrics.put('SkippedWrites', 0)
+        weather_data = _build_weather_record(
+            data.get('current', {}), data.get('timezone', 'UTC'), latitude, longitude, city, country_code
         )
         
+        metrics.put('RecordCount', 1)
+        if iceberg_table.ICEBERG_ENABLED:
+            s3_location = _upload_records([weather_data], metrics)[0]
+        else:
+            # Convert to Parquet format
+            print("Converting data to Parquet format")
+            with metrics.stage('Encode'):
+                parquet_data = convert_to_parquet([weather_data])
+            metrics.put('ParquetBytes', len(parquet_data), 'Bytes')
+            
+            # Create S3 key with partitioning (year/month/day/hour)
+            s3_key = create_s3_key(city, country_code)
+            
+            # Upload to S3
+            print(f"Uploading to s3://{S3_BUCKET}/{s3_key}")
+            with metrics.stage('Upload'):
+                get_s3_client().put_object(
+                    Bucket=S3_BUCKET,
+                    Key=s3_key,
+                    Body=parquet_data,
+                    ContentType='application/octet-stream'
+                )
+            _register_partition(s3_key, metrics)
+            _update_latest_index([weather_data], metrics)
+            s3_location = f's3://{S3_BUCKET}/{s3_key}'
+        _record_written(observations)
+        
+        metrics.put('Errors', 0)
         return {
             'statusCode': 200,
             'body': json.dumps({
@@ -154,13 +520,14 @@ def lambda_handler(event, context):
                 'country_code': country_code,
                 'latitude': latitude,
                 'longitude': longitude,
-                's3_location': f's3://{S3_BUCKET}/{s3_key}',
+                's3_location': s3_location,
                 'timestamp': weather_data['timestamp']
             })
         }
         
     except Exception as e:
         print(f"Error: {str(e)}")
+        metrics.put('Errors', 1)
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -168,4 +535,9 @@ def lambda_handler(event, context):
                 'message': 'Failed to ingest weather data'
             })
         }
+    
+    finally:
+        http_client.put_metrics(metrics, http_before)
+        location_grid.put_metrics(metrics, grid_before)
+        metrics.flush()
 
@@ -0,0 +1,279 @@
+"""
+Per-location "latest observation" index
+
+Finding the current conditions for a city in the weather_data table means
+scanning every partition for the newest row (query 1 in athena_queries.sql).
+Instead the ingestion path keeps one small JSON object, _index/latest.json,
+with the newest record of every location, and readers answer "city X" or "all
+cities" with a single GET.
+
+Writers update it optimistically: read the object and its ETag, merge their
+records (a location's entry is only replaced by a newer timestamp) and write it
+back with IfMatch, or IfNoneMatch='*' while it does not exist. When another
+writer got there first S3 answers 412 and the merge is retried on the fresh
+copy, so concurrent writers never lose each other's locations. The index is
+derived data: ingestion logs a failed update instead of failing, and the next
+write for the location repairs the entry.
+
+Example:
+    python latest_index.py --local-root /tmp/s3 --bucket weather-data --city London
+    python latest_index.py --local-root /tmp/s3 --bucket weather-data --rebuild-hours 24
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils import location_slug
+
+# Configuration from environment variables
+S3_BUCKET = os.environ.get('S3_BUCKET')
+LATEST_INDEX_ENABLED = os.environ.get('LATEST_INDEX_ENABLED', 'true').lower() == 'true'
+LATEST_INDEX_KEY = os.environ.get('LATEST_INDEX_KEY', '_index/latest.json')
+LATEST_INDEX_MAX_ATTEMPTS = int(os.environ.get('LATEST_INDEX_MAX_ATTEMPTS', '5'))
+
+# S3 error codes meaning another writer changed the object between our read and write
+CONFLICT_CODES = frozenset({'PreconditionFailed', 'ConditionalRequestConflict', '412', '409'})
+
+_s3_client = None
+# Reader cache: (bucket, key) -> (ETag, index) of the copy this container last fetched
+_cache: Dict[Tuple[str, str], Tuple[str, Dict[str, Any]]] = {}
+
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        import boto3
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+
+def _error_code(error: Exception) -> Optional[str]:
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+
+def _read(s3_client, bucket: str, key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        if _error_code(e) in ('NoSuchKey', '404'):
+            return None, {'locations': {}}
+        raise
+    return response['ETag'], json.loads(response['Body'].read())
+
+
+def merge(index: Dict[str, Any], records: List[Dict[str, Any]]) -> int:
+    """
+    Merge records into an index, keeping the newest record per location
+
+    Args:
+        index: Index document (modified in place)
+        records: Weather records with city, country_code and an ISO timestamp
+
+    Returns:
+        Number of locations whose entry changed
+    """
+    locations = index.setdefault('locations', {})
+    changed = set()
+    for record in records:
+        slug = location_slug(record['city'], record['country_code'])
+        current = locations.get(slug)
+        if current is not None and current['timestamp'] >= record['timestamp']:
+            continue
+        locations[slug] = record
+        changed.add(slug)
+    return len(changed)
+
+
+def update_latest(s3_client, bucket: str, records: List[Dict[str, Any]], key: str = LATEST_INDEX_KEY,
+                  max_attempts: int = LATEST_INDEX_MAX_ATTEMPTS) -> Dict[str, int]:
+    """
+    Merge records into the index object with a conditional write
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        records: Weather records just written
+        key: Index object key
+        max_attempts: Read-merge-write attempts before giving up
+
+    Returns:
+        Dictionary with the number of locations updated and write conflicts retried
+
+    Raises:
+        Exception: When every attempt conflicted with another writer
+    """
+    for attempt in range(max_attempts):
+        etag, index = _read(s3_client, bucket, key)
+        updated = merge(index, records)
+        if not updated:
+            return {'updated': 0, 'conflicts': attempt}
+        index['updated_at'] = datetime.utcnow().isoformat()
+        condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+        try:
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=key,
+                Body=json.dumps(index, separators=(',', ':')).encode('utf-8'),
+                ContentType='application/json',
+                **condition
+            )
+            return {'updated': updated, 'conflicts': attempt}
+        except Exception as e:
+            if _error_code(e) not in CONFLICT_CODES:
+                raise
+            # Jittered, so writers that collided do not collide again
+            time.sleep(random.uniform(0, 0.02 * 2 ** attempt))
+    raise Exception(f"Latest index {key} still conflicting after {max_attempts} attempts")
+
+
+def get_latest(s3_client, bucket: str, key: str = LATEST_INDEX_KEY) -> Dict[str, Any]:
+    """
+    Fetch the index, reusing this container's copy while its ETag is unchanged
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        key: Index object key
+
+    Returns:
+        Index document with `updated_at` and `locations` (slug -> newest record)
+    """
+    cached = _cache.get((bucket, key))
+    try:
+        if cached:
+            response = s3_client.get_object(Bucket=bucket, Key=key, IfNoneMatch=cached[0])
+        else:
+            response = s3_client.get_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        code = _error_code(e)
+        if code in ('304', 'NotModified'):
+            return cached[1]
+        if code in ('NoSuchKey', '404'):
+            return {'locations': {}}
+        raise
+    index = json.loads(response['Body'].read())
+    _cache[(bucket, key)] = (response['ETag'], index)
+    return index
+
+
+def find_location(index: Dict[str, Any], city: str, country_code: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Newest record for a city
+
+    Args:
+        index: Index document from get_latest
+        city: City name (case-insensitive)
+        country_code: Country code; without it the first city of that name matches
+
+    Returns:
+        The record, or None when the index has no such location
+    """
+    locations = index.get('locations', {})
+    if country_code:
+        return locations.get(location_slug(city, country_code))
+    for record in locations.values():
+        if record['city'].lower() == city.lower():
+            return record
+    return None
+
+
+def rebuild(s3_client, bucket: str, hours: int, until: Optional[datetime] = None,
+            key: str = LATEST_INDEX_KEY) -> Dict[str, int]:
+    """
+    Seed the index from the newest weather_data partitions (e.g. after first enabling it)
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        hours: Hours to read, newest first
+        until: Last hour to read (defaults to now)
+        key: Index object key
+
+    Returns:
+        Dictionary with the objects read and locations updated
+    """
+    import pyarrow.parquet as pq
+    from compaction import list_hour_keys
+
+    until = until or datetime.utcnow()
+    objects = updated = 0
+    for offset in range(hours):
+        records = []
+        for object_key in list_hour_keys(s3_client, bucket, until - timedelta(hours=offset)):
+            table = pq.read_table(io.BytesIO(s3_client.get_object(Bucket=bucket, Key=object_key)['Body'].read()))
+            for row in table.to_pylist():
+                row['timestamp'] = row['timestamp'].isoformat()
+                records.append(row)
+            objects += 1
+        if records:
+            updated += update_latest(s3_client, bucket, records, key)['updated']
+    return {'objects': objects, 'updated': updated}
+
+
+def _response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(body, default=str)
+    }
+
+
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler answering current conditions from the index
+
+    Args:
+        event: Direct invocation with optional `city` and `country_code`, or a function URL
+               request carrying them as query string parameters
+        context: Lambda context
+
+    Returns:
+        Dictionary with statusCode, headers and body (one record, or every location)
+    """
+    try:
+        if not S3_BUCKET:
+            raise ValueError("S3_BUCKET environment variable is not set")
+
+        params = event if isinstance(event, dict) else {}
+        params = params.get('queryStringParameters') or params
+        index = get_latest(get_s3_client(), S3_BUCKET)
+
+        city = params.get('city')
+        if not city:
+            return _response(200, index)
+        record = find_location(index, city, params.get('country_code'))
+        if record is None:
+            return _response(404, {'error': f"No observation for {city}", 'updated_at': index.get('updated_at')})
+        return _response(200, record)
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return _response(500, {'error': str(e), 'message': 'Failed to read the latest observations'})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read or rebuild the latest-observation index')
+    parser.add_argument('--bucket', default=S3_BUCKET, help='Bucket name (a directory under --local-root when local)')
+    parser.add_argument('--local-root', help='Run against a local directory instead of S3')
+    parser.add_argument('--city', help='Print one city instead of every location')
+    parser.add_argument('--country-code', help='Country code of --city')
+    parser.add_argument('--rebuild-hours', type=int, help='Seed the index from this many recent hours first')
+    args = parser.parse_args()
+
+    if args.local_root:
+        from local_s3 import LocalS3Client
+        client = LocalS3Client(args.local_root)
+    else:
+        client = get_s3_client()
+    if args.rebuild_hours:
+        print(json.dumps(rebuild(client, args.bucket, args.rebuild_hours)))
+    latest = get_latest(client, args.bucket)
+    if args.city:
+        latest = find_location(latest, args.city, args.country_code)
+    print(json.dumps(latest, indent=2, default=str))
@@ -0,0 +1,227 @@
+"""
+Filesystem stand-in for the subset of the boto3 S3 client used by this package
+
+Buckets are directories under a root path and keys are relative file paths,
+so compaction, benchmarks and local runs work without AWS credentials.
+Multipart uploads keep their parts under <root>/.multipart/ until completed
+or aborted, and enforce S3's 5 MiB minimum part size. Conditional requests
+(IfMatch / IfNoneMatch) behave like S3's: 412 on a failed write precondition
+and 304 on an unchanged read.
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from botocore.exceptions import ClientError
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def _client_error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+class _Paginator:
+    def __init__(self, method):
+        self._method = method
+
+    def paginate(self, **kwargs):
+        yield self._method(**kwargs)
+
+
+class LocalS3Client:
+    """Minimal boto3-compatible S3 client backed by a local directory"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        # Serializes conditional writes so their check and write are atomic, as on S3
+        self._lock = threading.Lock()
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def _etag(self, path: str) -> Optional[str]:
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            return f'"{hashlib.md5(f.read()).hexdigest()}"'
+
+    def put_object(self, Bucket: str, Key: str, Body=b'', IfMatch: Optional[str] = None,
+                   IfNoneMatch: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        if IfMatch is None and IfNoneMatch is None:
+            return self._put(Bucket, Key, Body)
+        with self._lock:
+            etag = self._etag(self._path(Bucket, Key))
+            if IfMatch is not None and etag is None:
+                raise _client_error('NoSuchKey', 'The specified key does not exist.', 'PutObject')
+            if (IfMatch is not None and etag != IfMatch) or (IfNoneMatch == '*' and etag is not None):
+                raise _client_error('PreconditionFailed', 'At least one of the pre-conditions you specified '
+                                    'did not hold', 'PutObject')
+            return self._put(Bucket, Key, Body)
+
+    def _put(self, Bucket: str, Key: str, Body) -> Dict[str, Any]:
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = Body.read() if hasattr(Body, 'read') else Body
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        # Write then rename so readers never observe a partial object
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return {'ETag': f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def get_object(self, Bucket: str, Key: str, IfNoneMatch: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise _client_error('NoSuchKey', 'The specified key does not exist.', 'GetObject')
+        with open(path, 'rb') as f:
+            data = f.read()
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            raise _client_error('304', 'Not Modified', 'GetObject')
+        return {
+            'Body': io.BytesIO(data),
+            'ContentLength': len(data),
+            'ETag': etag,
+        }
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise _client_error('404', 'Not Found', 'HeadObject')
+        stat = os.stat(path)
+        return {
+            'ContentLength': stat.st_size,
+            'LastModified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        }
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        path = self._path(Bucket, Key)
+        if os.path.isfile(path):
+            os.remove(path)
+        return {}
+
+    def delete_objects(self, Bucket: str, Delete: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        deleted = []
+        for obj in Delete.get('Objects', []):
+            self.delete_object(Bucket=Bucket, Key=obj['Key'])
+            deleted.append({'Key': obj['Key']})
+        return {'Deleted': deleted}
+
+    def copy_object(self, Bucket: str, Key: str, CopySource: Dict[str, str], **kwargs) -> Dict[str, Any]:
+        source = self.get_object(Bucket=CopySource['Bucket'], Key=CopySource['Key'])
+        return self.put_object(Bucket=Bucket, Key=Key, Body=source['Body'].read())
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = '', Delimiter: Optional[str] = None,
+                        **kwargs) -> Dict[str, Any]:
+        bucket_root = os.path.join(self.root, Bucket)
+        contents: List[Dict[str, Any]] = []
+        common_prefixes = set()
+        for dirpath, dirnames, filenames in os.walk(bucket_root):
+            rel_dir = os.path.relpath(dirpath, bucket_root).replace(os.sep, '/')
+            rel_dir = '' if rel_dir == '.' else rel_dir + '/'
+            # Skip directories that cannot contain matching keys
+            dirnames[:] = sorted(d for d in dirnames
+                                 if (rel_dir + d + '/').startswith(Prefix) or Prefix.startswith(rel_dir + d + '/'))
+            for name in sorted(filenames):
+                if name.startswith('.tmp-'):
+                    continue
+                key = rel_dir + name
+                if not key.startswith(Prefix):
+                    continue
+                if Delimiter and Delimiter in key[len(Prefix):]:
+                    common_prefixes.add(Prefix + key[len(Prefix):].split(Delimiter)[0] + Delimiter)
+                    continue
+                stat = os.stat(os.path.join(dirpath, name))
+                contents.append({
+                    'Key': key,
+                    'Size': stat.st_size,
+                    'LastModified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+                })
+        response = {'KeyCount': len(contents), 'IsTruncated': False}
+        if contents:
+            response['Contents'] = contents
+        if common_prefixes:
+            response['CommonPrefixes'] = [{'Prefix': p} for p in sorted(common_prefixes)]
+        return response
+
+    def _upload_dir(self, upload_id: str, operation: str) -> str:
+        path = os.path.join(self.root, '.multipart', upload_id)
+        if not os.path.isdir(path):
+            raise _client_error('NoSuchUpload', 'The specified upload does not exist.', operation)
+        return path
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self.root, '.multipart', upload_id)
+        os.makedirs(path)
+        with open(os.path.join(path, 'upload.json'), 'w') as f:
+            json.dump({'Bucket': Bucket, 'Key': Key}, f)
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body=b'',
+                    **kwargs) -> Dict[str, Any]:
+        path = self._upload_dir(UploadId, 'UploadPart')
+        data = Body.read() if hasattr(Body, 'read') else Body
+        with open(os.path.join(path, f'{PartNumber:05d}'), 'wb') as f:
+            f.write(data)
+        return {'ETag': f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict[str, Any],
+                                  **kwargs) -> Dict[str, Any]:
+        path = self._upload_dir(UploadId, 'CompleteMultipartUpload')
+        parts = MultipartUpload.get('Parts', [])
+        digests = []
+        for index, part in enumerate(parts):
+            part_path = os.path.join(path, f"{part['PartNumber']:05d}")
+            if not os.path.isfile(part_path):
+                raise _client_error('InvalidPart', f"Part {part['PartNumber']} was not uploaded.",
+                                    'CompleteMultipartUpload')
+            with open(part_path, 'rb') as f:
+                digest = hashlib.md5(f.read())
+            if f'"{digest.hexdigest()}"' != part['ETag']:
+                raise _client_error('InvalidPart', f"Part {part['PartNumber']} ETag does not match.",
+                                    'CompleteMultipartUpload')
+            if index < len(parts) - 1 and os.path.getsize(part_path) < MIN_PART_SIZE:
+                raise _client_error('EntityTooSmall', 'Your proposed upload is smaller than the minimum '
+                                    'allowed object size.', 'CompleteMultipartUpload')
+            digests.append(digest.digest())
+
+        target = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as out:
+            for part in parts:
+                with open(os.path.join(path, f"{part['PartNumber']:05d}"), 'rb') as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(tmp_path, target)
+        shutil.rmtree(path)
+        return {'Bucket': Bucket, 'Key': Key, 'ETag': f'"{hashlib.md5(b"".join(digests)).hexdigest()}-{len(parts)}"'}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs) -> Dict[str, Any]:
+        shutil.rmtree(self._upload_dir(UploadId, 'AbortMultipartUpload'))
+        return {}
+
+    def list_multipart_uploads(self, Bucket: str, **kwargs) -> Dict[str, Any]:
+        uploads = []
+        base = os.path.join(self.root, '.multipart')
+        for upload_id in sorted(os.listdir(base)) if os.path.isdir(base) else []:
+            with open(os.path.join(base, upload_id, 'upload.json')) as f:
+                upload = json.load(f)
+            if upload['Bucket'] == Bucket:
+                uploads.append({'Key': upload['Key'], 'UploadId': upload_id})
+        return {'Bucket': Bucket, 'Uploads': uploads}
+
+    def get_paginator(self, operation_name: str) -> _Paginator:
+        if operation_name != 'list_objects_v2':
+            raise NotImplementedError(operation_name)
+        return _Paginator(self.list_objects_v2)
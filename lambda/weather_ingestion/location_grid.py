@@ -0,0 +1,228 @@
+"""
+Location deduplication and a shared fetch cache
+
+Sites are grouped into cells of LOCATION_GRID_DEGREES and each cell is fetched
+once, at the coordinates of one of its sites (the first one seen), so the
+request is always for a real monitored point. The response is then fanned out
+to every site in the cell, which keeps its own coordinates and city/country
+metadata in the records written. The default of 0 merges only sites with
+identical coordinates. A coarser grid is opt-in: Open-Meteo downscales to the
+requested point (elevation, land/sea), so sites a few kilometres apart can get
+slightly different `current` values, and merging them trades that accuracy for
+fewer requests.
+
+Responses are cached per (API URL, cell) in the warm container for
+LOCATION_CACHE_TTL_SECONDS, just under one schedule cycle. A lookup for a cell
+that another thread is already fetching waits for that fetch instead of
+starting its own, so concurrent SQS work items in one batch share requests
+too. Failed fetches are not cached.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, List, Tuple
+
+# Configuration from environment variables
+# Cell size in degrees (0.05 is about 5.5 km north-south); 0 only merges identical coordinates
+LOCATION_GRID_DEGREES = float(os.environ.get('LOCATION_GRID_DEGREES', '0'))
+LOCATION_CACHE_TTL_SECONDS = float(os.environ.get('LOCATION_CACHE_TTL_SECONDS', '55'))
+
+MAX_CACHE_ENTRIES = 10000  # Expired entries are pruned beyond this
+
+_lock = threading.Lock()
+counters = {
+    'sites': 0,  # Site lookups
+    'fetches': 0,  # Cells requested upstream
+    'cache_hits': 0,  # Cells answered from the cache (or a fetch already in flight)
+}
+
+
+def _increment(**amounts: int) -> None:
+    with _lock:
+        for name, amount in amounts.items():
+            counters[name] += amount
+
+
+def get_counters() -> Dict[str, int]:
+    """
+    Snapshot of the lookup counters since the container started
+
+    Returns:
+        Dictionary of counter name to value
+    """
+    with _lock:
+        return dict(counters)
+
+
+def put_metrics(metrics, before: Dict[str, int]) -> None:
+    """
+    Emit the lookups since `before`, the upstream fetches they needed and the dedup ratio
+
+    Args:
+        metrics: Invocation metrics from metrics.start_invocation
+        before: get_counters() snapshot taken when the invocation started
+    """
+    after = get_counters()
+    sites = after['sites'] - before['sites']
+    fetches = after['fetches'] - before['fetches']
+    metrics.put('LocationLookups', sites)
+    metrics.put('UpstreamFetches', fetches)
+    metrics.put('FetchCacheHits', after['cache_hits'] - before['cache_hits'])
+    if sites:
+        metrics.put('DedupRatio', round(100.0 * (sites - fetches) / sites, 1), 'Percent')
+
+
+def snap(latitude: float, longitude: float, grid: float = None) -> Tuple[float, float]:
+    """
+    Centre of the grid cell containing a coordinate
+
+    Args:
+        latitude: Latitude
+        longitude: Longitude
+        grid: Cell size in degrees (defaults to LOCATION_GRID_DEGREES; 0 keeps the coordinate)
+
+    Returns:
+        (latitude, longitude) of the cell, rounded to 4 decimals
+    """
+    grid = LOCATION_GRID_DEGREES if grid is None else grid
+    if grid > 0:
+        latitude = round(latitude / grid) * grid
+        longitude = round(longitude / grid) * grid
+    return round(latitude, 4), round(longitude, 4)
+
+
+def group_by_cell(locations: List[Dict[str, Any]], grid: float = None) -> Dict[Tuple[float, float], List[int]]:
+    """
+    Group locations by grid cell
+
+    Args:
+        locations: Location dictionaries with latitude and longitude
+        grid: Cell size in degrees (defaults to LOCATION_GRID_DEGREES)
+
+    Returns:
+        Cell -> indexes into `locations`, in first-seen order
+    """
+    cells: Dict[Tuple[float, float], List[int]] = {}
+    for index, loc in enumerate(locations):
+        cells.setdefault(snap(loc['latitude'], loc['longitude'], grid), []).append(index)
+    return cells
+
+
+class FetchCache:
+    """Thread-safe TTL cache; concurrent misses for one key share a single fetch"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Any, Tuple[float, Any]] = {}
+        self._inflight: Dict[Any, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[1] if entry and entry[0] > time.monotonic() else None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value) -> None:
+        now = time.monotonic()
+        if len(self._entries) >= MAX_CACHE_ENTRIES:
+            self._entries = {k: entry for k, entry in self._entries.items() if entry[0] > now}
+        self._entries[key] = (now + self.ttl, value)
+
+    def get_or_fetch(self, key, fetch: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Cached value for key, fetching it (once across threads) when missing or expired
+
+        Args:
+            key: Cache key
+            fetch: Called without arguments to produce the value
+
+        Returns:
+            (value, True if no fetch was needed by this caller)
+
+        Raises:
+            Whatever `fetch` raised, in the fetching thread and in every thread waiting on it
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1], True
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result(), True
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, value)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value, False
+
+
+# Shared by every work item handled by this container
+cache = FetchCache(LOCATION_CACHE_TTL_SECONDS)
+
+
+def fetch_for_location(latitude: float, longitude: float, api_url: str,
+                       fetch_one: Callable[[float, float], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Response for one site, shared with the other sites of its cell
+
+    Args:
+        latitude: Site latitude
+        longitude: Site longitude
+        api_url: API URL (part of the cache key)
+        fetch_one: Fetches one coordinate pair, e.g. lambda_function.fetch_current
+
+    Returns:
+        Open-Meteo response for the site's cell (fetched at this site's coordinates on a miss)
+    """
+    cell = snap(latitude, longitude)
+    response, hit = cache.get_or_fetch((api_url, cell), lambda: fetch_one(latitude, longitude))
+    _increment(sites=1, fetches=0 if hit else 1, cache_hits=1 if hit else 0)
+    return response
+
+
+def fetch_for_locations(locations: List[Dict[str, Any]], api_url: str,
+                        fetch_many: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Responses for many sites, fetching each uncached cell once at its first site's coordinates
+
+    Args:
+        locations: Location dictionaries with latitude and longitude
+        api_url: API URL (part of the cache key)
+        fetch_many: Fetches a list of coordinate dictionaries, e.g. lambda_function.fetch_current_batch
+
+    Returns:
+        One response per location, in order (sites in one cell share the response)
+    """
+    cells = group_by_cell(locations)
+    responses = {cell: cache.get((api_url, cell)) for cell in cells}
+    missing = [cell for cell, response in responses.items() if response is None]
+    if missing:
+        sites = [locations[cells[cell][0]] for cell in missing]
+        fetched = fetch_many([{'latitude': site['latitude'], 'longitude': site['longitude']} for site in sites])
+        for cell, response in zip(missing, fetched):
+            cache.put((api_url, cell), response)
+            responses[cell] = response
+    _increment(sites=len(locations), fetches=len(missing), cache_hits=len(cells) - len(missing))
+
+    by_index: List[Dict[str, Any]] = [None] * len(locations)
+    for cell, indexes in cells.items():
+        for index in indexes:
+            by_index[index] = responses[cell]
+    return by_index
@@ -0,0 +1,160 @@
+"""
+Per-invocation metrics in CloudWatch Embedded Metric Format (EMF)
+
+Each invocation emits one JSON log line that CloudWatch turns into metrics
+(stage durations, record counts, Parquet size, HTTP retries, cold start).
+Set METRICS_ENABLED=false to turn it off; the disabled path is a shared no-op
+object so instrumented code pays almost nothing.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+# Configuration from environment variables
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'WeatherPipeline')
+
+# Lambda runs one invocation per container at a time, so module state marks the first one
+_cold_start = True
+_sink: Callable[[str], None] = print
+
+
+def set_sink(sink: Callable[[str], None]) -> None:
+    """
+    Send EMF documents somewhere other than stdout (e.g. a ListSink in benchmarks)
+
+    Args:
+        sink: Callable receiving one serialized EMF document per invocation
+    """
+    global _sink
+    _sink = sink
+
+
+class ListSink:
+    """Collects emitted EMF documents in memory"""
+
+    def __init__(self):
+        self.documents: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, line: str) -> None:
+        with self._lock:
+            self.documents.append(json.loads(line))
+
+    def clear(self) -> None:
+        with self._lock:
+            self.documents = []
+
+
+class _Stage:
+    def __init__(self, metrics: 'InvocationMetrics', name: str):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._metrics.add(f'{self._name}Duration', (time.perf_counter() - self._started) * 1000, 'Milliseconds')
+        return False
+
+
+class InvocationMetrics:
+    """Metrics and properties collected during one invocation"""
+
+    def __init__(self, function_name: str, cold_start: bool):
+        self.function_name = function_name
+        self.values: Dict[str, float] = {}
+        self.units: Dict[str, str] = {}
+        self.properties: Dict[str, Any] = {}
+        self.put('ColdStart', 1 if cold_start else 0)
+
+    def stage(self, name: str) -> _Stage:
+        """Context manager that adds the block's duration to the `<name>Duration` metric"""
+        return _Stage(self, name)
+
+    def put(self, name: str, value: float, unit: str = 'Count') -> None:
+        self.values[name] = value
+        self.units[name] = unit
+
+    def add(self, name: str, value: float, unit: str = 'Count') -> None:
+        self.values[name] = self.values.get(name, 0) + value
+        self.units[name] = unit
+
+    def set_property(self, name: str, value: Any) -> None:
+        self.properties[name] = value
+
+    def flush(self) -> None:
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['FunctionName']],
+                    'Metrics': [{'Name': name, 'Unit': self.units[name]} for name in self.values],
+                }],
+            },
+            'FunctionName': self.function_name,
+            **self.properties,
+            **self.values,
+        }
+        _sink(json.dumps(document, default=str))
+
+
+class _DisabledStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _DisabledMetrics:
+    """Stand-in used when metrics are off: every call is a no-op"""
+
+    _stage = _DisabledStage()
+
+    def stage(self, name: str) -> _DisabledStage:
+        return self._stage
+
+    def put(self, name: str, value: float, unit: str = 'Count') -> None:
+        pass
+
+    def add(self, name: str, value: float, unit: str = 'Count') -> None:
+        pass
+
+    def set_property(self, name: str, value: Any) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+
+_DISABLED = _DisabledMetrics()
+
+
+def start_invocation(context) -> InvocationMetrics:
+    """
+    Begin collecting metrics for an invocation
+
+    Args:
+        context: Lambda context (may be None when run locally)
+
+    Returns:
+        InvocationMetrics, or a shared no-op object when METRICS_ENABLED is false
+    """
+    global _cold_start
+    cold_start = _cold_start
+    _cold_start = False
+    if not METRICS_ENABLED:
+        return _DISABLED
+    function_name = getattr(context, 'function_name', None) or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+    metrics = InvocationMetrics(function_name, cold_start)
+    request_id = getattr(context, 'aws_request_id', None)
+    if request_id:
+        metrics.set_property('RequestId', request_id)
+    return metrics
@@ -0,0 +1,214 @@
+"""
+Move existing weather_data objects from one key layout to another
+
+Run from a workstation (or against a local copy of the bucket) when changing
+KEY_LAYOUT / KEY_SHARDS. Every object of the source layout is moved on its own:
+objects that hold a single location, or that go to a layout without a location
+partition, are copied server-side; objects holding several locations are split
+into one object per location when the target layout has a location partition.
+The source is deleted only after all its targets are written, and target names
+are derived from the source name, so an interrupted run can simply be re-run.
+
+Afterwards deploy with the matching key_layout/key_shards context so the Glue
+table's partition keys and projection follow the new layout, and compact the
+migrated hours in the target layout (--compact).
+
+Example:
+    python migrate_layout.py --local-root /tmp/s3 --bucket weather-data --to-layout location --compact
+"""
+
+import argparse
+import io
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import boto3
+import pyarrow.parquet as pq
+
+from compaction import compact_hour
+from utils import (
+    KEY_LAYOUT, KEY_SHARDS, conform_table, create_object_prefix, layout_partition_keys, split_by_location,
+    table_to_parquet
+)
+
+MIGRATE_MAX_WORKERS = 8
+
+
+def list_layout_keys(s3_client, bucket: str, layout: str, shards: int) -> List[Tuple[str, Dict[str, str]]]:
+    """
+    List the objects stored in a key layout, with their partition values
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        layout: Key layout name
+        shards: Number of hash prefixes of that layout
+
+    Returns:
+        Sorted (key, partition values) pairs
+    """
+    partition_keys = layout_partition_keys(layout, shards)
+    # Anchored on the full key, so other layouts, rollups/, forecasts/ and _state/ never match
+    pattern = re.compile('^' + '/'.join(rf'{key}=([^/]+)' for key in partition_keys) + r'/[^/]+\.parquet$')
+    found = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{partition_keys[0]}="):
+        for obj in page.get('Contents', []):
+            match = pattern.match(obj['Key'])
+            if match:
+                found.append((obj['Key'], dict(zip(partition_keys, match.groups()))))
+    return sorted(found)
+
+
+def hour_of(values: Dict[str, str]) -> datetime:
+    return datetime(int(values['year']), int(values['month']), int(values['day']), int(values['hour']))
+
+
+def target_name(key: str, values: Dict[str, str], to_layout: str) -> str:
+    """
+    File name in the target layout
+
+    Backfill names repeat across location prefixes, so the source location is kept
+    in the name when the target layout has no location partition.
+    """
+    name = key.rsplit('/', 1)[1]
+    if 'location' in values and 'location' not in layout_partition_keys(to_layout, 0):
+        name = f"{name[:-len('.parquet')]}_{values['location']}.parquet"
+    return name
+
+
+def move_object(s3_client, bucket: str, key: str, values: Dict[str, str], to_layout: str, to_shards: int,
+                keep_source: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Move one object into the target layout
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        key: Source key
+        values: Source partition values
+        to_layout: Target key layout
+        to_shards: Target number of hash prefixes
+        keep_source: Copy instead of move
+        dry_run: Only compute the target keys
+
+    Returns:
+        Dictionary with the source key, target keys and whether the object was split
+    """
+    hour = hour_of(values)
+    name = target_name(key, values, to_layout)
+    by_location = 'location' in layout_partition_keys(to_layout, to_shards)
+
+    if not by_location or 'location' in values:
+        # One location (or no location partition in the target): the bytes move as they are
+        location = values.get('location') if by_location else None
+        # Hash prefixes follow the writers: by location when there is one, else by file name
+        target = f"{create_object_prefix(hour, location, None if location else name, to_layout, to_shards)}/{name}"
+        if not dry_run and target != key:
+            s3_client.copy_object(Bucket=bucket, Key=target, CopySource={'Bucket': bucket, 'Key': key})
+        targets, split = [target], False
+    else:
+        table = conform_table(pq.read_table(io.BytesIO(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read())))
+        parts = list(split_by_location(table))
+        targets = [f"{create_object_prefix(hour, location, None, to_layout, to_shards)}/{name}" for location, _ in parts]
+        if not dry_run:
+            for target, (_, part) in zip(targets, parts):
+                s3_client.put_object(
+                    Bucket=bucket,
+                    Key=target,
+                    Body=table_to_parquet(part),
+                    ContentType='application/octet-stream'
+                )
+        split = True
+
+    if not dry_run and not keep_source and key not in targets:
+        s3_client.delete_object(Bucket=bucket, Key=key)
+    return {'source': key, 'targets': targets, 'split': split}
+
+
+def migrate(s3_client, bucket: str, from_layout: str, from_shards: int, to_layout: str, to_shards: int,
+            start: Optional[date] = None, end: Optional[date] = None, max_workers: int = MIGRATE_MAX_WORKERS,
+            keep_source: bool = False, dry_run: bool = False, compact: bool = False) -> Dict[str, Any]:
+    """
+    Move every object of one key layout into another
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        from_layout: Source key layout
+        from_shards: Source number of hash prefixes
+        to_layout: Target key layout
+        to_shards: Target number of hash prefixes
+        start: First day to move (all days when None)
+        end: Last day to move (inclusive)
+        max_workers: Concurrent object moves
+        keep_source: Copy instead of move
+        dry_run: List what would move without writing
+        compact: Compact every migrated hour in the target layout afterwards
+
+    Returns:
+        Dictionary with migration statistics
+    """
+    if (from_layout, from_shards) == (to_layout, to_shards):
+        raise ValueError("Source and target key layouts are the same")
+
+    started = time.perf_counter()
+    sources = [
+        (key, values) for key, values in list_layout_keys(s3_client, bucket, from_layout, from_shards)
+        if (start is None or hour_of(values).date() >= start) and (end is None or hour_of(values).date() <= end)
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            lambda item: move_object(s3_client, bucket, item[0], item[1], to_layout, to_shards, keep_source, dry_run),
+            sources
+        ))
+
+    hours = sorted({hour_of(values) for _, values in sources})
+    compacted = 0
+    if compact and not dry_run:
+        for hour in hours:
+            result = compact_hour(s3_client, bucket, hour, to_layout, to_shards)
+            compacted += sum(1 for prefix in result['prefixes'] if prefix['compacted'])
+
+    return {
+        'objects': len(results),
+        'split_objects': sum(1 for result in results if result['split']),
+        'objects_written': sum(len(result['targets']) for result in results),
+        'hours': len(hours),
+        'partitions_compacted': compacted,
+        'dry_run': dry_run,
+        'elapsed_s': round(time.perf_counter() - started, 3),
+        'sample': results[:3],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move weather_data objects into another key layout')
+    parser.add_argument('--bucket', required=True, help='Bucket name (a directory under --local-root when local)')
+    parser.add_argument('--local-root', help='Run against a local directory instead of S3')
+    parser.add_argument('--from-layout', default='time', help='Current key layout')
+    parser.add_argument('--from-shards', type=int, default=0, help='Current number of hash prefixes')
+    parser.add_argument('--to-layout', default=KEY_LAYOUT, help='New key layout (default: KEY_LAYOUT)')
+    parser.add_argument('--to-shards', type=int, default=KEY_SHARDS, help='New number of hash prefixes (default: KEY_SHARDS)')
+    parser.add_argument('--start', help='First day to move, e.g. 2024-01-01 (default: all)')
+    parser.add_argument('--end', help='Last day to move (inclusive)')
+    parser.add_argument('--workers', type=int, default=MIGRATE_MAX_WORKERS, help='Concurrent object moves')
+    parser.add_argument('--keep-source', action='store_true', help='Copy instead of move')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would move')
+    parser.add_argument('--compact', action='store_true', help='Compact the migrated hours in the new layout')
+    args = parser.parse_args()
+
+    if args.local_root:
+        from local_s3 import LocalS3Client
+        client = LocalS3Client(args.local_root)
+    else:
+        client = boto3.client('s3')
+    print(json.dumps(migrate(
+        client, args.bucket, args.from_layout, args.from_shards, args.to_layout, args.to_shards,
+        date.fromisoformat(args.start) if args.start else None, date.fromisoformat(args.end) if args.end else None,
+        args.workers, args.keep_source, args.dry_run, args.compact
+    ), indent=2))
@@ -0,0 +1,97 @@
+"""
+Glue partition registration for newly written S3 prefixes
+
+With Athena partition projection (the stack default) nothing needs registering.
+When the table is deployed with PARTITION_REGISTRATION=glue (or both), the ingestion
+Lambda adds each new partition to the Glue catalog the first time it writes
+to it, so queries never depend on MSCK REPAIR TABLE.
+"""
+
+import copy
+import os
+from typing import Dict, Any, List, Optional
+
+# Configuration from environment variables
+PARTITION_REGISTRATION = os.environ.get('PARTITION_REGISTRATION', 'projection')  # 'projection', 'glue' or 'both'
+GLUE_DATABASE = os.environ.get('GLUE_DATABASE')
+GLUE_TABLE = os.environ.get('GLUE_TABLE', 'weather_data')
+
+# Warm-container state: prefixes already registered and the table's storage descriptor
+_registered = set()
+_table_cache: Optional[Dict[str, Any]] = None
+_glue_client = None
+
+
+def get_glue_client():
+    global _glue_client
+    if _glue_client is None:
+        import boto3
+        _glue_client = boto3.client('glue')
+    return _glue_client
+
+
+def partition_values(s3_key: str, partition_keys: List[str]) -> List[str]:
+    """
+    Extract partition values from a Hive-style key
+
+    Args:
+        s3_key: Object key, e.g. year=2024/month=01/day=01/hour=05/file.parquet
+        partition_keys: Partition column names in table order
+
+    Returns:
+        Values in the order of partition_keys
+    """
+    components = dict(part.split('=', 1) for part in s3_key.split('/')[:-1] if '=' in part)
+    return [components[key] for key in partition_keys]
+
+
+def _get_table() -> Dict[str, Any]:
+    global _table_cache
+    if _table_cache is None:
+        _table_cache = get_glue_client().get_table(DatabaseName=GLUE_DATABASE, Name=GLUE_TABLE)['Table']
+    return _table_cache
+
+
+def ensure_partition(bucket: str, s3_key: str) -> bool:
+    """
+    Register the partition containing s3_key in the Glue catalog if needed
+
+    Only active when PARTITION_REGISTRATION is 'glue' or 'both'. Each prefix is registered
+    at most once per container; a partition that already exists counts as done.
+
+    Args:
+        bucket: Bucket the object was written to
+        s3_key: Key of the object just written
+
+    Returns:
+        True if a new partition was created
+    """
+    if PARTITION_REGISTRATION not in ('glue', 'both'):
+        return False
+
+    prefix = s3_key.rsplit('/', 1)[0]
+    if prefix in _registered:
+        return False
+
+    table = _get_table()
+    partition_keys = [column['Name'] for column in table['PartitionKeys']]
+    storage_descriptor = copy.deepcopy(table['StorageDescriptor'])
+    storage_descriptor['Location'] = f"s3://{bucket}/{prefix}/"
+
+    response = get_glue_client().batch_create_partition(
+        DatabaseName=GLUE_DATABASE,
+        TableName=GLUE_TABLE,
+        PartitionInputList=[{
+            'Values': partition_values(s3_key, partition_keys),
+            'StorageDescriptor': storage_descriptor,
+        }]
+    )
+    errors = [
+        error for error in response.get('Errors', [])
+        if error.get('ErrorDetail', {}).get('ErrorCode') != 'AlreadyExistsException'
+    ]
+    if errors:
+        raise Exception(f"Failed to register partition {prefix}: {errors}")
+
+    _registered.add(prefix)
+    return not response.get('Errors')
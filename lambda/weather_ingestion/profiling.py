@@ -0,0 +1,254 @@
+"""
+Opt-in cProfile and tracemalloc profiling of Lambda handlers
+
+Decorate a handler with @profiled. With PROFILING_ENABLED=false (the default)
+the decorator returns the handler itself, so a deployed function pays nothing;
+set PROFILING_ENABLED=true (which starts fresh containers) to profile a
+PROFILING_SAMPLE_RATE fraction of invocations during an incident.
+
+Each sampled invocation writes to <PROFILING_SINK>/<function>/<time>_<request>/:
+    profile.pstats      cProfile data (python -m pstats, snakeviz)
+    profile.collapsed   Collapsed stacks in microseconds (flamegraph.pl, speedscope)
+    allocations.txt     Peak traced memory and the top allocation sites
+
+PROFILING_SINK is a local directory or an s3://bucket/prefix. cProfile follows
+the handler's thread only: work handed to a thread pool (SQS fan-out fetches,
+hedged requests) shows up as time spent waiting on the pool. Writing the
+profile is best effort and never fails the invocation.
+"""
+
+import functools
+import os
+import random
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Callable, List, Tuple
+
+if TYPE_CHECKING:
+    # Imported by wrap() only, so a handler with profiling disabled never loads them
+    import cProfile
+    import pstats
+    import tracemalloc
+
+# Configuration from environment variables
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '1.0'))
+PROFILING_SINK = os.environ.get('PROFILING_SINK', '/tmp/profiles')
+PROFILING_TRACEMALLOC = os.environ.get('PROFILING_TRACEMALLOC', 'true').lower() == 'true'
+# Frames kept per allocation; each extra frame makes tracing noticeably slower
+PROFILING_TRACEMALLOC_FRAMES = int(os.environ.get('PROFILING_TRACEMALLOC_FRAMES', '1'))
+PROFILING_TOP = int(os.environ.get('PROFILING_TOP', '25'))  # Allocation sites in the report
+
+# Nested handlers (e.g. sharding.shard_handler calling lambda_function.lambda_handler)
+# are profiled by the outermost one; cProfile cannot run two profilers at once
+_active = False
+_s3_client = None
+
+FunctionKey = Tuple[str, int, str]
+
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        import boto3
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+
+def _label(function: FunctionKey) -> str:
+    filename, line, name = function
+    if filename == '~':
+        # Built-ins, e.g. "<method 'read' of '_io.BufferedReader' objects>"
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def collapsed_stacks(stats: 'pstats.Stats', max_depth: int = 64) -> List[str]:
+    """
+    Collapsed-stack lines ("root;caller;callee microseconds") from cProfile data
+
+    cProfile records caller/callee pairs rather than whole stacks, so each
+    function's time is split across its callers in proportion to the cumulative
+    time it spent under each of them. Recursive calls end the stack.
+
+    Args:
+        stats: Profile statistics
+        max_depth: Deepest stack emitted
+
+    Returns:
+        One line per distinct stack with its self time, heaviest first
+    """
+    callees: Dict[FunctionKey, Dict[FunctionKey, float]] = {}
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, {})[function] = cumulative
+    roots = [function for function, entry in stats.stats.items()
+             if not any(caller in stats.stats for caller in entry[4])]
+
+    labels = {function: _label(function) for function in stats.stats}
+    totals: Dict[str, float] = {}
+
+    def walk(function: FunctionKey, prefix: str, path: set, seconds: float) -> None:
+        _, _, own, cumulative, _ = stats.stats[function]
+        scale = seconds / cumulative if cumulative else 0.0
+        stack = f"{prefix};{labels[function]}" if prefix else labels[function]
+        totals[stack] = totals.get(stack, 0.0) + own * scale
+        if len(path) >= max_depth:
+            return
+        path.add(function)
+        for callee, edge in callees.get(function, {}).items():
+            # Branches under a microsecond would round to nothing
+            if callee not in path and edge * scale >= 1e-6:
+                walk(callee, stack, path, edge * scale)
+        path.discard(function)
+
+    for root in roots:
+        walk(root, '', set(), stats.stats[root][3])
+    lines = [(stack, round(seconds * 1e6)) for stack, seconds in totals.items()]
+    return [f"{stack} {micros}" for stack, micros in sorted(lines, key=lambda item: -item[1]) if micros > 0]
+
+
+def allocation_report(snapshot: 'tracemalloc.Snapshot', peak: int, top: int) -> str:
+    """
+    Text report of the largest allocation sites still alive at the end of the invocation
+
+    Args:
+        snapshot: tracemalloc snapshot taken before tracing stopped
+        peak: Peak traced bytes during the invocation
+        top: Number of sites to list
+
+    Returns:
+        Report text
+    """
+    import tracemalloc
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ])
+    statistics = snapshot.statistics('lineno')
+    lines = [
+        f"Peak traced memory: {peak / 1024 / 1024:.2f} MiB",
+        f"Live at end: {sum(stat.size for stat in statistics) / 1024 / 1024:.2f} MiB "
+        f"in {sum(stat.count for stat in statistics)} blocks",
+        "",
+        f"Top {top} allocation sites (by size, live at end):",
+    ]
+    for stat in statistics[:top]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}")
+    lines.append("")
+    lines.append("Largest site's traceback:")
+    if statistics:
+        lines.extend(f"  {line}" for line in statistics[0].traceback.format())
+    return '\n'.join(lines) + '\n'
+
+
+def write_profile(sink: str, name: str, files: Dict[str, bytes]) -> str:
+    """
+    Write one invocation's profile files to a local directory or an s3:// prefix
+
+    Args:
+        sink: Local directory or s3://bucket/prefix
+        name: Relative directory for this invocation
+        files: File name -> contents
+
+    Returns:
+        Location written to
+    """
+    if sink.startswith('s3://'):
+        bucket, _, prefix = sink[len('s3://'):].partition('/')
+        base = f"{prefix.rstrip('/')}/{name}" if prefix else name
+        for filename, body in files.items():
+            get_s3_client().put_object(Bucket=bucket, Key=f"{base}/{filename}", Body=body,
+                                       ContentType='text/plain')
+        return f"s3://{bucket}/{base}/"
+    directory = os.path.join(sink, name)
+    os.makedirs(directory, exist_ok=True)
+    for filename, body in files.items():
+        with open(os.path.join(directory, filename), 'wb') as f:
+            f.write(body)
+    return directory
+
+
+def _profile_files(profiler: 'cProfile.Profile', snapshot, peak: int) -> Dict[str, bytes]:
+    import marshal
+    import pstats
+    stats = pstats.Stats(profiler)
+    files = {
+        # The format pstats.Stats.dump_stats writes
+        'profile.pstats': marshal.dumps(stats.stats),
+        'profile.collapsed': ('\n'.join(collapsed_stacks(stats)) + '\n').encode('utf-8'),
+    }
+    if snapshot is not None:
+        files['allocations.txt'] = allocation_report(snapshot, peak, PROFILING_TOP).encode('utf-8')
+    return files
+
+
+def wrap(handler: Callable, sample_rate: float, sink: str, trace_memory: bool = PROFILING_TRACEMALLOC) -> Callable:
+    """
+    Wrap a handler so a fraction of its invocations are profiled
+
+    Args:
+        handler: Lambda handler (event, context)
+        sample_rate: Fraction of invocations to profile (0-1)
+        sink: Local directory or s3://bucket/prefix for the profile files
+        trace_memory: Also trace allocations with tracemalloc
+
+    Returns:
+        Wrapped handler
+    """
+    import cProfile
+    import tracemalloc
+
+    @functools.wraps(handler)
+    def profiled_handler(event, context):
+        global _active
+        if _active or random.random() >= sample_rate:
+            return handler(event, context)
+
+        _active = True
+        tracing = trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start(PROFILING_TRACEMALLOC_FRAMES)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                return handler(event, context)
+            finally:
+                profiler.disable()
+        finally:
+            elapsed = time.perf_counter() - started
+            snapshot, peak = None, 0
+            if tracing:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            _active = False
+            try:
+                function = getattr(context, 'function_name', None) or handler.__module__
+                request = getattr(context, 'aws_request_id', None) or f"{random.getrandbits(32):08x}"
+                name = f"{function}/{datetime.utcnow().strftime('%Y-%m-%dT%H%M%S.%f')[:-3]}_{request}"
+                location = write_profile(sink, name, _profile_files(profiler, snapshot, peak))
+                print(f"Profile of {elapsed * 1000:.0f} ms invocation written to {location}")
+            except Exception as e:
+                print(f"Warning: could not write profile: {str(e)}")
+
+    return profiled_handler
+
+
+def profiled(handler: Callable) -> Callable:
+    """
+    Decorator enabling PROFILING_* profiling for a Lambda handler
+
+    Args:
+        handler: Lambda handler (event, context)
+
+    Returns:
+        The handler itself when profiling is disabled, otherwise a sampling wrapper
+    """
+    if not PROFILING_ENABLED or PROFILING_SAMPLE_RATE <= 0:
+        return handler
+    return wrap(handler, PROFILING_SAMPLE_RATE, PROFILING_SINK)
+
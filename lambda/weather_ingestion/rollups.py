@@ -0,0 +1,232 @@
+"""
+Pre-aggregated hourly and daily rollups per city
+
+Once an hour has closed (and been compacted), its rows are aggregated into one
+row per city under rollups/hourly/, and the day's rollup under rollups/daily/
+is rebuilt from that day's hourly rollups. Each measure keeps its sum and
+non-null count next to avg/min/max, so daily figures are exact without
+re-reading raw data. Dashboards query these tables instead of the raw
+one-row-per-minute data.
+"""
+
+import argparse
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import boto3
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from compaction import list_hour_keys
+from utils import conform_table, create_partition_path, table_to_parquet
+
+# Configuration from environment variables
+S3_BUCKET = os.environ.get('S3_BUCKET')
+ROLLUP_PREFIX = os.environ.get('ROLLUP_PREFIX', 'rollups')
+ROLLUP_PARQUET_PROFILE = os.environ.get('ROLLUP_PARQUET_PROFILE', 'archive-compact')
+
+GROUP_KEYS = ['city', 'country_code']
+MEASURES = ['temperature', 'feels_like', 'humidity', 'pressure', 'wind_speed', 'wind_deg']
+ROLLUP_FILE_NAME = 'rollup.parquet'  # One object per partition, overwritten on re-runs
+
+
+def get_rollup_schema() -> pa.Schema:
+    """
+    Arrow schema shared by the hourly and daily rollups (matches the Glue rollup tables)
+
+    Returns:
+        pa.Schema
+    """
+    fields = [
+        pa.field('city', pa.string()),
+        pa.field('country_code', pa.string()),
+        pa.field('period_start', pa.timestamp('ms')),
+        pa.field('record_count', pa.int64()),
+    ]
+    for measure in MEASURES:
+        fields += [
+            pa.field(f'{measure}_avg', pa.float64()),
+            pa.field(f'{measure}_min', pa.float64()),
+            pa.field(f'{measure}_max', pa.float64()),
+            pa.field(f'{measure}_sum', pa.float64()),
+            pa.field(f'{measure}_count', pa.int64()),
+        ]
+    return pa.schema(fields)
+
+
+def hourly_rollup_key(hour: datetime) -> str:
+    return f"{ROLLUP_PREFIX}/hourly/{create_partition_path(hour)}/{ROLLUP_FILE_NAME}"
+
+
+def daily_rollup_prefix(day: datetime) -> str:
+    return f"{ROLLUP_PREFIX}/daily/year={day.year:04d}/month={day.month:02d}/day={day.day:02d}/"
+
+
+def _finish(grouped: pa.Table, period_start: datetime, sources: Dict[str, str]) -> pa.Table:
+    """
+    Rename aggregate columns to the rollup schema and derive averages from sum/count
+
+    Args:
+        grouped: Output of Table.group_by(GROUP_KEYS).aggregate(...)
+        period_start: Start of the hour or day
+        sources: Rollup column name -> aggregate column name in grouped
+
+    Returns:
+        Table with the rollup schema
+    """
+    schema = get_rollup_schema()
+    columns = {key: grouped[key] for key in GROUP_KEYS}
+    columns['period_start'] = pa.array([period_start] * grouped.num_rows, type=pa.timestamp('ms'))
+    for name, source in sources.items():
+        columns[name] = grouped[source]
+    for measure in MEASURES:
+        total = pc.cast(columns[f'{measure}_sum'], pa.float64())
+        count = columns[f'{measure}_count']
+        average = pc.divide(total, pc.cast(count, pa.float64()))
+        columns[f'{measure}_avg'] = pc.if_else(pc.greater(count, 0), average, pa.scalar(None, pa.float64()))
+    return pa.table([pc.cast(columns[field.name], field.type) for field in schema], schema=schema)
+
+
+def aggregate_hour(table: pa.Table, hour: datetime) -> pa.Table:
+    """
+    Aggregate raw weather rows for one hour to one row per city
+
+    Args:
+        table: Raw rows (weather_data schema)
+        hour: Start of the hour
+
+    Returns:
+        Hourly rollup table
+    """
+    aggregations = [('timestamp', 'count')]
+    sources = {'record_count': 'timestamp_count'}
+    for measure in MEASURES:
+        aggregations += [(measure, 'min'), (measure, 'max'), (measure, 'sum'), (measure, 'count')]
+        sources.update({
+            f'{measure}_min': f'{measure}_min',
+            f'{measure}_max': f'{measure}_max',
+            f'{measure}_sum': f'{measure}_sum',
+            f'{measure}_count': f'{measure}_count',
+        })
+    return _finish(table.group_by(GROUP_KEYS).aggregate(aggregations), hour, sources)
+
+
+def aggregate_day(hourly: pa.Table, day: datetime) -> pa.Table:
+    """
+    Combine a day's hourly rollups into one row per city
+
+    Args:
+        hourly: Hourly rollup rows for the day
+        day: Start of the day
+
+    Returns:
+        Daily rollup table
+    """
+    aggregations = [('record_count', 'sum')]
+    sources = {'record_count': 'record_count_sum'}
+    for measure in MEASURES:
+        aggregations += [
+            (f'{measure}_min', 'min'), (f'{measure}_max', 'max'),
+            (f'{measure}_sum', 'sum'), (f'{measure}_count', 'sum'),
+        ]
+        sources.update({
+            f'{measure}_min': f'{measure}_min_min',
+            f'{measure}_max': f'{measure}_max_max',
+            f'{measure}_sum': f'{measure}_sum_sum',
+            f'{measure}_count': f'{measure}_count_sum',
+        })
+    return _finish(hourly.group_by(GROUP_KEYS).aggregate(aggregations), day, sources)
+
+
+def _read_tables(s3_client, bucket: str, keys: List[str]) -> List[pa.Table]:
+    return [pq.read_table(io.BytesIO(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read())) for key in keys]
+
+
+def _write_table(s3_client, bucket: str, key: str, table: pa.Table) -> int:
+    parquet_data = table_to_parquet(table, ROLLUP_PARQUET_PROFILE)
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=parquet_data,
+        ContentType='application/octet-stream'
+    )
+    return len(parquet_data)
+
+
+def update_rollups(s3_client, bucket: str, hour: datetime) -> Dict[str, Any]:
+    """
+    Rebuild the hourly rollup for `hour`, then the daily rollup for its day
+
+    Both writes replace a single object per partition, so re-running an hour
+    (e.g. after late data) is safe.
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        hour: Any timestamp within the closed hour
+
+    Returns:
+        Dictionary with rollup statistics
+    """
+    hour = hour.replace(minute=0, second=0, microsecond=0)
+    day = hour.replace(hour=0)
+
+    raw_keys = list_hour_keys(s3_client, bucket, hour)
+    if not raw_keys:
+        return {'hour': hour.isoformat(), 'input_files': 0, 'updated': False}
+
+    raw = pa.concat_tables([conform_table(t) for t in _read_tables(s3_client, bucket, raw_keys)])
+    hourly = aggregate_hour(raw, hour)
+    hourly_key = hourly_rollup_key(hour)
+    hourly_bytes = _write_table(s3_client, bucket, hourly_key, hourly)
+
+    day_hour_prefix = hourly_key.rsplit('/hour=', 1)[0] + '/'
+    hourly_keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=day_hour_prefix):
+        hourly_keys += [obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith('.parquet')]
+    day_table = pa.concat_tables(_read_tables(s3_client, bucket, sorted(hourly_keys)))
+    daily = aggregate_day(day_table, day)
+    daily_key = f"{daily_rollup_prefix(day)}{ROLLUP_FILE_NAME}"
+    daily_bytes = _write_table(s3_client, bucket, daily_key, daily)
+
+    return {
+        'hour': hour.isoformat(),
+        'input_files': len(raw_keys),
+        'input_rows': raw.num_rows,
+        'hourly_key': hourly_key,
+        'hourly_bytes': hourly_bytes,
+        'hours_in_day': len(hourly_keys),
+        'daily_key': daily_key,
+        'daily_bytes': daily_bytes,
+        'updated': True,
+    }
+
+
+def _parse_hours(start: str, end: Optional[str]) -> List[datetime]:
+    first = datetime.fromisoformat(start)
+    last = datetime.fromisoformat(end) if end else first
+    hours = []
+    while first <= last:
+        hours.append(first)
+        first += timedelta(hours=1)
+    return hours
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild hourly and daily weather rollups')
+    parser.add_argument('--hour', required=True, help='ISO timestamp within the (first) hour, e.g. 2024-01-01T05')
+    parser.add_argument('--until', help='Last hour to rebuild (inclusive), for ranges')
+    parser.add_argument('--bucket', default=S3_BUCKET, help='Bucket name (a directory under --local-root when local)')
+    parser.add_argument('--local-root', help='Run against a local directory instead of S3')
+    args = parser.parse_args()
+
+    if args.local_root:
+        from local_s3 import LocalS3Client
+        client = LocalS3Client(args.local_root)
+    else:
+        client = boto3.client('s3')
+    for hour in _parse_hours(args.hour, args.until):
+        print(json.dumps(update_rollups(client, args.bucket, hour)))
@@ -0,0 +1,248 @@
+"""
+Sharded Step Functions orchestration for large location lists
+
+With fanout=stepfunctions the every-minute rule starts a state machine instead
+of invoking the ingestion function directly. plan_handler splits the location
+list into shards of about SHARD_SIZE locations and stores each shard in the
+bucket; a Map state then runs shard_handler once per shard, up to the
+configured concurrency, and every shard is ingested like a batch invocation
+(grid-deduplicated fetches, one Parquet object, change detection). Finally
+publish_handler merges the shards' latest observations into the index.
+
+Shards travel by S3 key, so the state passed between steps stays a few KB
+however many locations there are (Step Functions caps it at 256 KB). They are
+cut along location_grid cells, so sites sharing a cell share a fetch, and the
+plan is deterministic: a shard covers the same locations every minute, which
+keeps its change detection marker useful and lets a warm planner skip
+rewriting shards it stored recently.
+
+Dozens of shards finishing together would keep conflicting on the single
+_index/latest.json object, so each shard merges its records into its own
+partial index next to the shard and the last step folds every partial into
+_index/latest.json with one conditional write.
+
+Both handlers raise on failure instead of returning statusCode 500, so the
+state machine's Retry and Catch apply.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import lambda_function
+import latest_index
+import location_grid
+
+# Configuration from environment variables
+LOCATIONS_KEY = os.environ.get('LOCATIONS_KEY')  # Optional S3 key of a JSON location list in S3_BUCKET
+SHARD_SIZE = int(os.environ.get('SHARD_SIZE', '250'))
+SHARD_PREFIX = os.environ.get('SHARD_PREFIX', '_state/shards')
+# A warm planner rewrites a plan's shards after this long (the bucket expires them after a day)
+SHARD_REFRESH_SECONDS = float(os.environ.get('SHARD_REFRESH_SECONDS', '3600'))
+# Concurrent S3 requests when storing shards and reading partial indexes
+SHARD_IO_MAX_WORKERS = int(os.environ.get('SHARD_IO_MAX_WORKERS', '16'))
+
+# Warm-container state: plan ID -> monotonic time its shards were stored
+_stored_plans: Dict[str, float] = {}
+# ETag and parsed contents of the LOCATIONS_KEY object last read
+_locations_cache: Dict[str, Tuple[str, List[Dict[str, Any]]]] = {}
+
+
+def plan_shards(locations: List[Dict[str, Any]], shard_size: int, grid: float = None) -> List[List[Dict[str, Any]]]:
+    """
+    Split locations into shards without splitting a location_grid cell
+
+    Cells are taken in coordinate order and added to the current shard until it
+    holds shard_size locations, so a shard only exceeds shard_size by the sites of
+    its last cell. With the default grid of 0 a cell is one set of identical
+    coordinates; with LOCATION_GRID_DEGREES set, nearby sites stay together.
+
+    Args:
+        locations: Normalized location dictionaries
+        shard_size: Target locations per shard
+        grid: Cell size in degrees (defaults to location_grid.LOCATION_GRID_DEGREES)
+
+    Returns:
+        Shards, each a list of locations
+    """
+    if shard_size < 1:
+        raise ValueError(f"shard_size must be positive, got {shard_size}")
+    cells = location_grid.group_by_cell(locations, grid)
+    shards: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    for cell in sorted(cells):
+        current.extend(locations[index] for index in cells[cell])
+        if len(current) >= shard_size:
+            shards.append(current)
+            current = []
+    if current:
+        shards.append(current)
+    return shards
+
+
+def plan_id(locations: List[Dict[str, Any]], shard_size: int) -> str:
+    """Stable identifier of a location list cut into shards of shard_size (and the grid they were cut along)"""
+    content = json.dumps([locations, shard_size, location_grid.LOCATION_GRID_DEGREES],
+                         sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+def shard_key(plan: str, index: int) -> str:
+    return f"{SHARD_PREFIX}/{plan}/{index:05d}.json"
+
+
+def partial_index_key(plan: str, index: int) -> str:
+    return f"{SHARD_PREFIX}/{plan}/latest/{index:05d}.json"
+
+
+def _load_locations(s3_client, bucket: str, event) -> Optional[List[Dict[str, Any]]]:
+    """Locations from the event, LOCATIONS_KEY or LOCATIONS, in that order"""
+    if isinstance(event, dict) and 'locations' in event:
+        return lambda_function.parse_locations(event)
+    if not LOCATIONS_KEY:
+        return lambda_function.parse_locations({})
+
+    cached = _locations_cache.get(LOCATIONS_KEY)
+    try:
+        if cached:
+            response = s3_client.get_object(Bucket=bucket, Key=LOCATIONS_KEY, IfNoneMatch=cached[0])
+        else:
+            response = s3_client.get_object(Bucket=bucket, Key=LOCATIONS_KEY)
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('304', 'NotModified'):
+            return cached[1]
+        raise
+    locations = lambda_function.parse_locations({'locations': json.loads(response['Body'].read())})
+    _locations_cache[LOCATIONS_KEY] = (response['ETag'], locations)
+    return locations
+
+
+def store_plan(s3_client, bucket: str, locations: List[Dict[str, Any]], shard_size: int) -> Dict[str, Any]:
+    """
+    Cut locations into shards and store each shard in the bucket
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        locations: Normalized location dictionaries
+        shard_size: Target locations per shard
+
+    Returns:
+        Dictionary with the plan ID, location count and one {shard, key, index_key, locations}
+        entry per shard
+    """
+    plan = plan_id(locations, shard_size)
+    shards = plan_shards(locations, shard_size)
+    stored = _stored_plans.get(plan)
+    if stored is None or time.monotonic() - stored > SHARD_REFRESH_SECONDS:
+        def put(index: int) -> None:
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=shard_key(plan, index),
+                Body=json.dumps(shards[index], separators=(',', ':')).encode('utf-8'),
+                ContentType='application/json'
+            )
+        with ThreadPoolExecutor(max_workers=max(1, min(SHARD_IO_MAX_WORKERS, len(shards)))) as executor:
+            list(executor.map(put, range(len(shards))))
+        _stored_plans[plan] = time.monotonic()
+    return {
+        'plan': plan,
+        'location_count': len(locations),
+        'shards': [{'shard': index, 'key': shard_key(plan, index), 'index_key': partial_index_key(plan, index),
+                    'locations': len(shard)}
+                   for index, shard in enumerate(shards)],
+    }
+
+
+def plan_handler(event, context):
+    """
+    AWS Lambda handler for the state machine's first step: store the shards to ingest
+
+    Args:
+        event: Scheduled event (optional `locations` list and `shard_size` override)
+        context: Lambda context
+
+    Returns:
+        Dictionary with the plan ID, location count and the shards for the Map state
+
+    Raises:
+        Exception: When no locations are configured or the shards cannot be stored
+    """
+    bucket = lambda_function.S3_BUCKET
+    if not bucket:
+        raise ValueError("S3_BUCKET environment variable is not set")
+    s3_client = lambda_function.get_s3_client()
+    locations = _load_locations(s3_client, bucket, event)
+    if not locations:
+        raise ValueError("No locations given (event 'locations', LOCATIONS_KEY or LOCATIONS)")
+
+    shard_size = int(event.get('shard_size', SHARD_SIZE)) if isinstance(event, dict) else SHARD_SIZE
+    plan = store_plan(s3_client, bucket, locations, shard_size)
+    print(f"Planned {plan['location_count']} locations in {len(plan['shards'])} shards (plan {plan['plan']})")
+    return plan
+
+
+def shard_handler(event, context):
+    """
+    AWS Lambda handler for one Map iteration: ingest the locations of one shard
+
+    Args:
+        event: One shard entry from plan_handler ({shard, key, index_key, locations})
+        context: Lambda context
+
+    Returns:
+        Dictionary with the shard number and the ingestion result's body
+
+    Raises:
+        Exception: When the shard could not be read or ingested, so the Map state retries it
+    """
+    s3_client = lambda_function.get_s3_client()
+    shard = json.loads(s3_client.get_object(Bucket=lambda_function.S3_BUCKET, Key=event['key'])['Body'].read())
+    result = lambda_function.lambda_handler({'locations': shard, 'latest_index_key': event['index_key']}, context)
+    body = json.loads(result['body'])
+    if result['statusCode'] != 200:
+        raise Exception(f"Shard {event.get('shard')} failed: {body.get('error')}")
+    return {'shard': event.get('shard'), **body}
+
+
+def _read_partial(s3_client, bucket: str, key: str) -> List[Dict[str, Any]]:
+    try:
+        body = s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except Exception as e:
+        # A shard that has not written yet (or whose observations never changed) has no partial
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return []
+        raise
+    return list(json.loads(body).get('locations', {}).values())
+
+
+def publish_handler(event, context):
+    """
+    AWS Lambda handler for the state machine's last step: merge the shards' partial
+    indexes into the latest-observation index
+
+    Args:
+        event: plan_handler's output
+        context: Lambda context
+
+    Returns:
+        Dictionary with the partial indexes read and locations updated
+
+    Raises:
+        Exception: When a partial cannot be read or the index write keeps conflicting
+    """
+    if not latest_index.LATEST_INDEX_ENABLED:
+        return {'plan': event.get('plan'), 'partials': 0, 'updated': 0}
+    s3_client = lambda_function.get_s3_client()
+    bucket = lambda_function.S3_BUCKET
+    keys = [entry['index_key'] for entry in event['shards']]
+    with ThreadPoolExecutor(max_workers=max(1, min(SHARD_IO_MAX_WORKERS, len(keys)))) as executor:
+        partials = list(executor.map(lambda key: _read_partial(s3_client, bucket, key), keys))
+
+    records = [record for partial in partials for record in partial]
+    result = latest_index.update_latest(s3_client, bucket, records) if records else {'updated': 0, 'conflicts': 0}
+    print(f"Merged {sum(1 for partial in partials if partial)} partial indexes: {result['updated']} locations updated")
+    return {'plan': event.get('plan'), 'partials': sum(1 for partial in partials if partial), **result}
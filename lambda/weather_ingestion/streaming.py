@@ -0,0 +1,198 @@
+"""
+Streaming Parquet writes to S3
+
+table_to_parquet serializes a whole file into a BytesIO and returns a copy of it,
+so writing a large object needs about twice its size in memory on top of the
+Arrow data. stream_parquet instead writes each row group as soon as it is full
+into S3MultipartWriter, which uploads fixed-size parts of a multipart upload as
+they fill, so memory stays at about one row group plus one part whatever the
+size of the object. Objects smaller than one part go out with a single PUT, and
+a failure aborts the multipart upload so no orphaned parts are left (and billed)
+in the bucket.
+"""
+
+import os
+from typing import Dict, Any, Iterable, Optional, TYPE_CHECKING
+
+from utils import parquet_write_options
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# Configuration from environment variables
+STREAM_PART_SIZE = int(os.environ.get('STREAM_PART_SIZE', str(8 * 1024 * 1024)))
+STREAM_ROW_GROUP_SIZE = int(os.environ.get('STREAM_ROW_GROUP_SIZE', '100000'))
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+MAX_PARTS = 10000  # S3 limit per multipart upload
+
+
+class S3MultipartWriter:
+    """
+    Write-only file object backed by an S3 multipart upload
+
+    Use as a context manager: leaving the block normally completes the upload,
+    an exception aborts it.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, part_size: int = STREAM_PART_SIZE,
+                 content_type: str = 'application/octet-stream'):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.content_type = content_type
+        self.closed = False
+        self._buffer = bytearray()
+        self._position = 0
+        self._upload_id = None
+        self._parts = []
+
+    @property
+    def parts(self) -> int:
+        """Number of parts uploaded (0 when the object went out with a single PUT)"""
+        return len(self._parts)
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError(f"Write to closed upload s3://{self.bucket}/{self.key}")
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(self.part_size)
+        return len(data)
+
+    def _upload_part(self, size: int) -> None:
+        if self._upload_id is None:
+            self._upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type
+            )['UploadId']
+        number = len(self._parts) + 1
+        if number > MAX_PARTS:
+            raise Exception(f"s3://{self.bucket}/{self.key} needs more than {MAX_PARTS} parts; "
+                            f"raise STREAM_PART_SIZE")
+        body = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number, Body=body
+        )
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': number})
+
+    def close(self) -> None:
+        """Complete the upload, or PUT the object if it never outgrew one part"""
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self.s3_client.put_object(
+                    Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), ContentType=self.content_type
+                )
+            else:
+                if self._buffer:
+                    self._upload_part(len(self._buffer))
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                    MultipartUpload={'Parts': self._parts}
+                )
+        except Exception:
+            self.abort()
+            raise
+        self.closed = True
+        self._buffer = bytearray()
+
+    def abort(self) -> None:
+        """Discard everything written; uploaded parts are deleted"""
+        if self._upload_id is not None and not self.closed:
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception as e:
+                # The bucket's lifecycle rule removes incomplete uploads eventually
+                print(f"Failed to abort multipart upload of s3://{self.bucket}/{self.key}: {str(e)}")
+        self.closed = True
+        self._buffer = bytearray()
+
+    def __enter__(self) -> 'S3MultipartWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def stream_parquet(s3_client, bucket: str, key: str, tables: Iterable['pa.Table'], profile: Optional[str] = None,
+                   row_group_size: Optional[int] = None, part_size: int = STREAM_PART_SIZE) -> Dict[str, Any]:
+    """
+    Write Arrow tables to one Parquet object without holding the file in memory
+
+    Rows are buffered until a row group is full, then written (sorted by the
+    profile's sort keys, so sorting applies within each row group, which is what
+    the Parquet sorting_columns metadata describes). Tables are consumed lazily,
+    so a generator that reads one input at a time keeps memory bounded too.
+
+    Args:
+        s3_client: boto3 S3 client (or LocalS3Client)
+        bucket: Bucket name
+        key: Object key
+        tables: Tables with the same schema, e.g. conformed with utils.conform_table
+        profile: Writer profile name in WRITER_PROFILES (defaults to PARQUET_PROFILE)
+        row_group_size: Rows per row group (defaults to STREAM_ROW_GROUP_SIZE)
+        part_size: Multipart part size in bytes (at least 5 MiB)
+
+    Returns:
+        Dictionary with rows, row_groups, bytes and parts (0 for a single PUT)
+
+    Raises:
+        ValueError: When `tables` is empty
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    row_group_size = row_group_size or STREAM_ROW_GROUP_SIZE
+    writer = None
+    sort_keys = []
+    pending, pending_rows = [], 0
+    rows = row_groups = 0
+
+    with S3MultipartWriter(s3_client, bucket, key, part_size) as sink:
+        def write_group(group: pa.Table) -> None:
+            nonlocal rows, row_groups
+            if sort_keys:
+                group = group.sort_by(sort_keys)
+            writer.write_table(group, row_group_size=row_group_size)
+            rows += group.num_rows
+            row_groups += 1
+
+        try:
+            for table in tables:
+                if writer is None:
+                    sort_keys, options = parquet_write_options(table.schema, profile)
+                    writer = pq.ParquetWriter(sink, table.schema, **options)
+                pending.append(table)
+                pending_rows += table.num_rows
+                while pending_rows >= row_group_size:
+                    buffered = pa.concat_tables(pending)
+                    write_group(buffered.slice(0, row_group_size))
+                    pending = [buffered.slice(row_group_size)]
+                    pending_rows -= row_group_size
+
+            if writer is None:
+                raise ValueError(f"No tables to write to s3://{bucket}/{key}")
+            if pending_rows:
+                write_group(pa.concat_tables(pending))
+        finally:
+            # Also on failure, so the writer does not flush a footer into the aborted upload later
+            if writer is not None:
+                writer.close()
+
+    return {'rows': rows, 'row_groups': row_groups, 'bytes': sink.tell(), 'parts': sink.parts}
@@ -1,42 +1,368 @@
+import hashlib
 import io
+import os
+import re
+import uuid
 from datetime import datetime
-from typing import List, Dict, Any
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
+from typing import List, Dict, Any, Iterator, Optional, Tuple, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    import pyarrow as pa
 
-def convert_to_parquet(data: List[Dict[str, Any]]) -> bytes:
+# pyarrow is imported on first use so importing this module stays cheap on cold start
+_weather_schema = None
+
+# Writer profile for objects written by the ingestion Lambdas (see WRITER_PROFILES)
+PARQUET_PROFILE = os.environ.get('PARQUET_PROFILE', 'ingest-fast')
+
+# Object key layout for the weather_data table (see KEY_LAYOUTS)
+KEY_LAYOUT = os.environ.get('KEY_LAYOUT', 'time')
+# Spread writes over this many hash prefixes (shard=00/ ... shard=NN/); 0 disables them
+KEY_SHARDS = int(os.environ.get('KEY_SHARDS', '0'))
+
+# Partition keys below the optional shard key, in path order. "location" adds one
+# location=<slug> partition per city under each hour, so a per-city query opens only
+# that city's objects and concurrent writers for different cities use different prefixes.
+KEY_LAYOUTS: Dict[str, List[str]] = {
+    'time': ['year', 'month', 'day', 'hour'],
+    'location': ['year', 'month', 'day', 'hour', 'location'],
+}
+
+# Repeated strings and small codes: dictionary encoding stores each value once per column chunk
+DICTIONARY_COLUMNS = ['city', 'country_code', 'weather_id', 'weather_main', 'weather_description', 'timezone']
+
+# Named Parquet writer settings. Columns a table does not have are ignored.
+WRITER_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Small per-invocation objects that compaction rewrites within the hour: cheap to encode
+    'ingest-fast': {
+        'compression': 'snappy',
+        'use_dictionary': DICTIONARY_COLUMNS,
+        'write_statistics': True,
+    },
+    # Long-lived objects (compacted hours, backfill, rollups): smaller and easier to prune.
+    # Rows sorted by city then time give tight per-row-group min/max statistics, the page
+    # index lets readers skip pages, and a bloom filter answers city = '...' lookups.
+    'archive-compact': {
+        'compression': 'zstd',
+        'compression_level': 3,  # Higher levels cost 2-3x the encode time for ~1% smaller files
+        'use_dictionary': DICTIONARY_COLUMNS,
+        'write_statistics': True,
+        'write_page_index': True,
+        'sort_by': [('city', 'ascending'), ('timestamp', 'ascending'), ('period_start', 'ascending')],
+        'bloom_filter_options': {'city': {'ndv': 10000, 'fpp': 0.01}},
+    },
+}
+
+
+def get_weather_schema() -> 'pa.Schema':
     """
-    Convert a list of dictionaries to Parquet format
+    Arrow schema matching the Glue columns declared in WeatherPipelineStack
+    
+    Returns:
+        pa.Schema (built once, on first call)
+    """
+    global _weather_schema
+    if _weather_schema is None:
+        import pyarrow as pa
+        _weather_schema = pa.schema([
+            pa.field('timestamp', pa.timestamp('ms')),
+            pa.field('city', pa.string()),
+            pa.field('country_code', pa.string()),
+            pa.field('weather_id', pa.int32()),
+            pa.field('weather_main', pa.string()),
+            pa.field('weather_description', pa.string()),
+            pa.field('temperature', pa.float64()),
+            pa.field('feels_like', pa.float64()),
+            pa.field('temp_min', pa.float64()),
+            pa.field('temp_max', pa.float64()),
+            pa.field('pressure', pa.int32()),
+            pa.field('humidity', pa.int32()),
+            pa.field('visibility', pa.int32()),
+            pa.field('wind_speed', pa.float64()),
+            pa.field('wind_deg', pa.int32()),
+            pa.field('clouds', pa.int32()),
+            pa.field('sunrise', pa.int64()),
+            pa.field('sunset', pa.int64()),
+            pa.field('timezone', pa.string()),
+            pa.field('latitude', pa.float64()),
+            pa.field('longitude', pa.float64()),
+        ])
+    return _weather_schema
+
+
+def __getattr__(name: str):
+    # Keeps `from utils import WEATHER_SCHEMA` working without an eager pyarrow import
+    if name == 'WEATHER_SCHEMA':
+        return get_weather_schema()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _coerce(values: List[Any], arrow_type: 'pa.DataType') -> 'pa.Array':
+    """
+    Coerce a list of Python values into an Arrow array of the given type
+    
+    Args:
+        values: Column values (None for nulls)
+        arrow_type: Target Arrow type
+        
+    Returns:
+        pa.Array of arrow_type
+    """
+    import pyarrow as pa
+    if pa.types.is_integer(arrow_type):
+        values = [None if v is None else int(v) for v in values]
+    elif pa.types.is_floating(arrow_type):
+        values = [None if v is None else float(v) for v in values]
+    elif pa.types.is_timestamp(arrow_type):
+        values = [datetime.fromisoformat(v) if isinstance(v, str) else v for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+def records_to_table(data: List[Dict[str, Any]], schema: 'pa.Schema' = None) -> 'pa.Table':
+    """
+    Build an Arrow table directly from records using a fixed schema
+    
+    Keys missing from a record become nulls and keys not in the schema are ignored,
+    so every file has identical column types regardless of the values seen.
     
     Args:
         data: List of dictionaries containing weather data
+        schema: Arrow schema to build (defaults to the weather schema)
         
     Returns:
-        bytes: Parquet file as bytes
+        pa.Table with the given schema
+    """
+    import pyarrow as pa
+    schema = schema or get_weather_schema()
+    columns = [_coerce([record.get(field.name) for record in data], field.type) for field in schema]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def conform_table(table: 'pa.Table', schema: 'pa.Schema' = None) -> 'pa.Table':
+    """
+    Cast a table read from existing files (possibly written by an older writer) to a schema
+    
+    Args:
+        table: Arrow table containing at least the schema's columns
+        schema: Target schema (defaults to the weather schema)
+        
+    Returns:
+        pa.Table with the given schema
+    """
+    schema = schema or get_weather_schema()
+    return table.select(schema.names).cast(schema, safe=False)
+
+
+def _writer_supports(option: str) -> bool:
+    import inspect
+    import pyarrow.parquet as pq
+    return option in inspect.signature(pq.ParquetWriter.__init__).parameters
+
+
+def parquet_write_options(schema: 'pa.Schema', profile: Optional[str] = None) -> Tuple[List[Tuple[str, str]], Dict[str, Any]]:
+    """
+    Resolve a writer profile for a table schema
+
+    Args:
+        schema: Schema of the table to write
+        profile: Name in WRITER_PROFILES (defaults to PARQUET_PROFILE)
+
+    Returns:
+        (sort keys to apply before writing, keyword arguments for pq.write_table)
     """
-    # Convert to DataFrame
-    df = pd.DataFrame(data)
+    import pyarrow.parquet as pq
+
+    profile = profile or PARQUET_PROFILE
+    if profile not in WRITER_PROFILES:
+        raise ValueError(f"Unknown Parquet writer profile {profile!r}; expected one of {sorted(WRITER_PROFILES)}")
+    options = dict(WRITER_PROFILES[profile])
+    names = set(schema.names)
+
+    sort_keys = [(name, order) for name, order in options.pop('sort_by', []) if name in names]
+    if sort_keys:
+        options['sorting_columns'] = pq.SortingColumn.from_ordering(schema, sort_keys)
+    if isinstance(options.get('use_dictionary'), list):
+        options['use_dictionary'] = [name for name in options['use_dictionary'] if name in names]
+    if 'bloom_filter_options' in options:
+        bloom = {name: value for name, value in options.pop('bloom_filter_options').items() if name in names}
+        # Bloom filter writing needs a recent pyarrow; older ones still get the rest of the profile
+        if bloom and _writer_supports('bloom_filter_options'):
+            options['bloom_filter_options'] = bloom
+    return sort_keys, options
+
+
+def table_to_parquet(table: 'pa.Table', profile: Optional[str] = None, row_group_size: Optional[int] = None) -> bytes:
+    """
+    Serialize an Arrow table to Parquet bytes
     
-    # Ensure timestamp is datetime
-    if 'timestamp' in df.columns:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    Args:
+        table: Arrow table
+        profile: Writer profile name in WRITER_PROFILES (defaults to PARQUET_PROFILE)
+        row_group_size: Maximum rows per row group (pyarrow's default when None)
+        
+    Returns:
+        bytes: Parquet file as bytes
+    """
+    import pyarrow.parquet as pq
     
-    # Convert DataFrame to PyArrow Table
-    table = pa.Table.from_pandas(df)
+    sort_keys, options = parquet_write_options(table.schema, profile)
+    if sort_keys:
+        table = table.sort_by(sort_keys)
     
     # Write to Parquet format in memory
     buffer = io.BytesIO()
-    pq.write_table(table, buffer, compression='snappy')
+    pq.write_table(table, buffer, row_group_size=row_group_size, **options)
     
     # Return bytes
     return buffer.getvalue()
 
 
+def convert_to_parquet(data: List[Dict[str, Any]]) -> bytes:
+    """
+    Convert a list of dictionaries to Parquet format
+    
+    Args:
+        data: List of dictionaries containing weather data
+        
+    Returns:
+        bytes: Parquet file as bytes
+    """
+    # Build the Arrow table straight from the records (no pandas round trip)
+    return table_to_parquet(records_to_table(data))
+
+
+def create_partition_path(timestamp: datetime) -> str:
+    """
+    Build the year=YYYY/month=MM/day=DD/hour=HH partition path for a timestamp
+    
+    Args:
+        timestamp: Timestamp to partition by
+        
+    Returns:
+        Partition path string (without trailing slash)
+    """
+    year = timestamp.strftime('%Y')
+    month = timestamp.strftime('%m')
+    day = timestamp.strftime('%d')
+    hour = timestamp.strftime('%H')
+    
+    return f"year={year}/month={month}/day={day}/hour={hour}"
+
+
+def layout_partition_keys(layout: Optional[str] = None, shards: Optional[int] = None) -> List[str]:
+    """
+    Partition keys of the weather_data object layout, in path order
+    
+    Args:
+        layout: Name in KEY_LAYOUTS (defaults to KEY_LAYOUT)
+        shards: Number of hash prefixes (defaults to KEY_SHARDS)
+        
+    Returns:
+        Partition key names, e.g. ['year', 'month', 'day', 'hour', 'location']
+    """
+    layout = layout or KEY_LAYOUT
+    shards = KEY_SHARDS if shards is None else shards
+    if layout not in KEY_LAYOUTS:
+        raise ValueError(f"Unknown key layout {layout!r}; expected one of {sorted(KEY_LAYOUTS)}")
+    return (['shard'] if shards else []) + KEY_LAYOUTS[layout]
+
+
+def location_slug(city: str, country_code: Optional[str]) -> str:
+    """
+    Partition value identifying a location, e.g. "new_york_us"
+    
+    Args:
+        city: City name
+        country_code: Country code
+        
+    Returns:
+        Lowercase string of letters, digits and underscores
+    """
+    slug = re.sub(r'[^a-z0-9]+', '_', f"{city}_{country_code or ''}".lower()).strip('_')
+    return slug or 'unknown'
+
+
+def shard_for(value: str, shards: int) -> str:
+    """
+    Stable hash prefix value for a location slug (or file name)
+    
+    Args:
+        value: String to hash
+        shards: Number of hash prefixes
+        
+    Returns:
+        Zero-padded shard number
+    """
+    return f"{int(hashlib.md5(value.encode('utf-8')).hexdigest()[:8], 16) % shards:02d}"
+
+
+def create_object_prefix(timestamp: datetime, location: Optional[str] = None, shard_value: Optional[str] = None,
+                         layout: Optional[str] = None, shards: Optional[int] = None) -> str:
+    """
+    Build the partition prefix of a weather_data object for the configured layout
+    
+    Args:
+        timestamp: Timestamp to partition by
+        location: Location slug (required by the "location" layout)
+        shard_value: String hashed to pick the shard (defaults to the location slug)
+        layout: Name in KEY_LAYOUTS (defaults to KEY_LAYOUT)
+        shards: Number of hash prefixes (defaults to KEY_SHARDS)
+        
+    Returns:
+        Prefix string (without trailing slash), e.g. year=2024/month=01/day=01/hour=05/location=london_gb
+    """
+    keys = layout_partition_keys(layout, shards)
+    shards = KEY_SHARDS if shards is None else shards
+    parts = []
+    if 'shard' in keys:
+        if not (shard_value or location):
+            raise ValueError("Sharded key layouts need a location or shard value")
+        parts.append(f"shard={shard_for(shard_value or location, shards)}")
+    parts.append(create_partition_path(timestamp))
+    if 'location' in keys:
+        if not location:
+            raise ValueError("The location key layout needs a location for every object")
+        parts.append(f"location={location}")
+    return '/'.join(parts)
+
+
+def unique_file_name(name: str, timestamp: datetime) -> str:
+    """
+    Collision-free Parquet file name: microsecond timestamp plus a random suffix
+    
+    Args:
+        name: Leading part of the file name, e.g. "batch_25loc"
+        timestamp: Write timestamp
+        
+    Returns:
+        File name, e.g. batch_25loc_20240101_050000_123456_1f3a9c2e.parquet
+    """
+    return f"{name}_{timestamp.strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}.parquet"
+
+
+def split_by_location(table: 'pa.Table') -> Iterator[Tuple[str, 'pa.Table']]:
+    """
+    Split a weather table into one slice per location (city and country code)
+    
+    Args:
+        table: Weather-schema table
+        
+    Yields:
+        (location slug, rows for that location)
+    """
+    import pyarrow.compute as pc
+    cities = table['city'].fill_null('')
+    countries = table['country_code'].fill_null('')
+    pairs = table.select([]).append_column('city', cities).append_column('country_code', countries)
+    for pair in pairs.group_by(['city', 'country_code']).aggregate([]).to_pylist():
+        mask = pc.and_(pc.equal(cities, pair['city']), pc.equal(countries, pair['country_code']))
+        yield location_slug(pair['city'], pair['country_code']), table.filter(mask)
+
+
 def create_s3_key(city: str, country_code: str, timestamp: datetime = None) -> str:
     """
     Create S3 key with partitioning structure: year=YYYY/month=MM/day=DD/hour=HH/filename.parquet
+    (plus shard=NN/ and location=<slug>/ partitions, depending on KEY_SHARDS and KEY_LAYOUT)
     
     Args:
         city: City name
@@ -49,16 +375,30 @@ def create_s3_key(city: str, country_code: str, timestamp: datetime = None) -> s
     if timestamp is None:
         timestamp = datetime.utcnow()
     
-    # Format: year=YYYY/month=MM/day=DD/hour=HH/city_country_timestamp.parquet
-    year = timestamp.strftime('%Y')
-    month = timestamp.strftime('%m')
-    day = timestamp.strftime('%d')
-    hour = timestamp.strftime('%H')
-    
-    # Create filename with timestamp for uniqueness
-    filename = f"{city.lower().replace(' ', '_')}_{country_code.lower()}_{timestamp.strftime('%Y%m%d_%H%M%S')}.parquet"
+    location = location_slug(city, country_code)
     
-    s3_key = f"year={year}/month={month}/day={day}/hour={hour}/{filename}"
+    # Microseconds and a random suffix keep concurrent writes from overwriting each other
+    s3_key = f"{create_object_prefix(timestamp, location)}/{unique_file_name(location, timestamp)}"
     
     return s3_key
 
+
+def create_batch_s3_key(location_count: int, timestamp: datetime = None, location: Optional[str] = None) -> str:
+    """
+    Create S3 key for a multi-location Parquet object in the same partition layout
+    
+    Args:
+        location_count: Number of locations contained in the object
+        timestamp: Optional timestamp (defaults to current UTC time)
+        location: Location slug when the object holds a single location (required by
+                  the "location" layout)
+        
+    Returns:
+        S3 key string
+    """
+    if timestamp is None:
+        timestamp = datetime.utcnow()
+    
+    filename = unique_file_name(f"batch_{location_count}loc", timestamp)
+    
+    return f"{create_object_prefix(timestamp, location, shard_value=location or filename)}/{filename}"
@@ -0,0 +1,33 @@
+"""
+WMO weather interpretation codes used by Open-Meteo
+
+Read-only lookup tables built once at import time.
+"""
+
+from types import MappingProxyType
+
+# WMO code -> human readable description
+WEATHER_DESCRIPTIONS = MappingProxyType({
+    0: 'Clear sky', 1: 'Mainly clear', 2: 'Partly cloudy', 3: 'Overcast',
+    45: 'Foggy', 48: 'Depositing rime fog',
+    51: 'Light drizzle', 53: 'Moderate drizzle', 55: 'Dense drizzle',
+    56: 'Light freezing drizzle', 57: 'Dense freezing drizzle',
+    61: 'Slight rain', 63: 'Moderate rain', 65: 'Heavy rain',
+    66: 'Light freezing rain', 67: 'Heavy freezing rain',
+    71: 'Slight snow', 73: 'Moderate snow', 75: 'Heavy snow',
+    77: 'Snow grains', 80: 'Slight rain showers', 81: 'Moderate rain showers',
+    82: 'Violent rain showers', 85: 'Slight snow showers', 86: 'Heavy snow showers',
+    95: 'Thunderstorm', 96: 'Thunderstorm with slight hail', 99: 'Thunderstorm with heavy hail'
+})
+
+# WMO code -> main weather category (codes not listed are 'Other')
+WEATHER_CATEGORIES = MappingProxyType({
+    **{code: 'Clear' for code in (0, 1)},
+    **{code: 'Clouds' for code in (2, 3)},
+    **{code: 'Rain' for code in (51, 53, 55, 61, 63, 65, 80, 81, 82)},
+    **{code: 'Snow' for code in (71, 73, 75, 77, 85, 86)},
+    **{code: 'Thunderstorm' for code in (95, 96, 99)},
+})
+
+UNKNOWN_DESCRIPTION = 'Unknown'
+OTHER_CATEGORY = 'Other'
@@ -0,0 +1,736 @@
+#!/usr/bin/env python3
+"""
+Run the queries in athena_queries.sql against a local copy of the bucket
+
+Understands the year=/month=/day=/hour= layout written by the Lambdas (with the
+location=/shard= partitions of the configured key layout, and the rollup and
+forecast prefixes), prunes partitions from the WHERE clause, pushes
+column projection and predicates into the Parquet reads (row groups are skipped
+on their min/max statistics) and reports, per query, the files opened and the
+bytes scanned, the way Athena bills them. Use it to see the effect of a layout
+or writer change before deploying it.
+
+Only the Athena SQL this project uses is supported: SELECT with WHERE, GROUP BY,
+ORDER BY and LIMIT over one table, the usual aggregates, CAST, LPAD,
+YEAR/MONTH/DAY(CURRENT_DATE), plus SHOW PARTITIONS and DESCRIBE.
+
+Examples:
+    python query_local.py --root /tmp/s3/weather-data --file athena_queries.sql
+    python query_local.py --root /tmp/s3/weather-data --file athena_queries.sql --query 7 --today 2024-01-03
+    python query_local.py --root s3://weather-data-123456789012-us-east-1 \\
+        "SELECT city, AVG(temperature) FROM weather_data WHERE year = '2024' AND month = '01' GROUP BY city"
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda', 'weather_ingestion'))
+from utils import KEY_LAYOUT, KEY_SHARDS, layout_partition_keys
+
+# Glue table name -> (prefix under the bucket, partition keys); see WeatherPipelineStack.
+# weather_data's partition keys depend on the key layout (utils.KEY_LAYOUT, KEY_SHARDS).
+TABLES = {
+    'weather_data': ('', None),
+    'weather_hourly_rollup': ('rollups/hourly/', ['year', 'month', 'day', 'hour']),
+    'weather_daily_rollup': ('rollups/daily/', ['year', 'month', 'day']),
+    'weather_forecast': ('forecasts/', ['year', 'month', 'day', 'hour']),
+}
+
+AGGREGATES = {'AVG': 'mean', 'MIN': 'min', 'MAX': 'max', 'SUM': 'sum', 'COUNT': 'count'}
+SQL_TYPES = {
+    'VARCHAR': pa.string(), 'STRING': pa.string(), 'INTEGER': pa.int32(), 'INT': pa.int32(),
+    'BIGINT': pa.int64(), 'DOUBLE': pa.float64(), 'DATE': pa.date32(), 'TIMESTAMP': pa.timestamp('ms'),
+}
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+|--[^\n]*)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<number>\d+(?:\.\d+)?)
+    |(?P<name>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*)
+    |(?P<op><=|>=|<>|!=|\|\||[=<>*/+\-(),;])
+""", re.VERBOSE)
+
+
+# ---------------------------------------------------------------------------
+# Parsing. Expressions are tuples: ('col', name), ('lit', value), ('func', NAME, args, distinct),
+# ('cast', expr, TYPE), ('bin', op, left, right), ('not', expr), ('neg', expr),
+# ('between', expr, low, high, negated), ('in', expr, items, negated), ('isnull', expr, negated),
+# ('current_date',) and ('star',)
+# ---------------------------------------------------------------------------
+
+def tokenize(sql: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    while position < len(sql):
+        match = _TOKEN.match(sql, position)
+        if not match:
+            raise ValueError(f"Unexpected character {sql[position]!r} at offset {position}")
+        position = match.end()
+        if match.lastgroup != 'space':
+            tokens.append((match.lastgroup, match.group()))
+    return tokens
+
+
+class Parser:
+    """Recursive-descent parser for one statement"""
+
+    def __init__(self, sql: str):
+        self.tokens = [token for token in tokenize(sql) if token != ('op', ';')]
+        self.position = 0
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else ('end', '')
+
+    def next(self) -> Tuple[str, str]:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def accept(self, *words: str) -> bool:
+        """Consume the given keywords/operators if they come next"""
+        for offset, word in enumerate(words):
+            kind, value = self.peek(offset)
+            if kind not in ('name', 'op') or value.upper() != word:
+                return False
+        self.position += len(words)
+        return True
+
+    def expect(self, *words: str) -> None:
+        if not self.accept(*words):
+            raise ValueError(f"Expected {' '.join(words)} near {self.peek()[1]!r}")
+
+    def parse(self) -> Dict[str, Any]:
+        if self.accept('SHOW', 'PARTITIONS'):
+            statement = {'kind': 'show_partitions', 'table': self.table_name()}
+        elif self.accept('DESCRIBE'):
+            statement = {'kind': 'describe', 'table': self.table_name()}
+        else:
+            statement = self.select()
+        if self.peek()[0] != 'end':
+            raise ValueError(f"Unexpected {self.peek()[1]!r}")
+        return statement
+
+    def table_name(self) -> str:
+        kind, value = self.next()
+        if kind != 'name':
+            raise ValueError(f"Expected a table name, got {value!r}")
+        return value.split('.')[-1].lower()  # The database prefix does not matter locally
+
+    def select(self) -> Dict[str, Any]:
+        self.expect('SELECT')
+        items = []
+        while True:
+            if self.accept('*'):
+                items.append((('star',), None))
+            else:
+                expression = self.expression()
+                alias = None
+                if self.accept('AS') or (self.peek()[0] == 'name' and self.peek()[1].upper() not in ('FROM',)):
+                    alias = self.next()[1].lower()
+                items.append((expression, alias))
+            if not self.accept(','):
+                break
+        self.expect('FROM')
+        statement = {'kind': 'select', 'items': items, 'table': self.table_name(),
+                     'where': None, 'group_by': [], 'order_by': [], 'limit': None}
+        if self.accept('WHERE'):
+            statement['where'] = self.expression()
+        if self.accept('GROUP', 'BY'):
+            statement['group_by'] = self.expression_list()
+        if self.accept('ORDER', 'BY'):
+            while True:
+                expression = self.expression()
+                descending = self.accept('DESC')
+                if not descending:
+                    self.accept('ASC')
+                statement['order_by'].append((expression, descending))
+                if not self.accept(','):
+                    break
+        if self.accept('LIMIT'):
+            statement['limit'] = int(self.next()[1])
+        return statement
+
+    def expression_list(self) -> List[tuple]:
+        expressions = [self.expression()]
+        while self.accept(','):
+            expressions.append(self.expression())
+        return expressions
+
+    def expression(self) -> tuple:
+        left = self.conjunction()
+        while self.accept('OR'):
+            left = ('bin', 'OR', left, self.conjunction())
+        return left
+
+    def conjunction(self) -> tuple:
+        left = self.negation()
+        while self.accept('AND'):
+            left = ('bin', 'AND', left, self.negation())
+        return left
+
+    def negation(self) -> tuple:
+        if self.accept('NOT'):
+            return ('not', self.negation())
+        return self.predicate()
+
+    def predicate(self) -> tuple:
+        left = self.additive()
+        for op in ('=', '<>', '!=', '<=', '>=', '<', '>'):
+            if self.accept(op):
+                return ('bin', '<>' if op == '!=' else op, left, self.additive())
+        negated = self.accept('NOT')
+        if self.accept('BETWEEN'):
+            low = self.additive()
+            self.expect('AND')
+            return ('between', left, low, self.additive(), negated)
+        if self.accept('IN'):
+            self.expect('(')
+            items = self.expression_list()
+            self.expect(')')
+            return ('in', left, tuple(items), negated)
+        if negated:
+            raise ValueError("Expected BETWEEN or IN after NOT")
+        if self.accept('IS'):
+            negated = self.accept('NOT')
+            self.expect('NULL')
+            return ('isnull', left, negated)
+        return left
+
+    def additive(self) -> tuple:
+        left = self.multiplicative()
+        while self.peek() in (('op', '+'), ('op', '-'), ('op', '||')):
+            left = ('bin', self.next()[1], left, self.multiplicative())
+        return left
+
+    def multiplicative(self) -> tuple:
+        left = self.unary()
+        while self.peek() in (('op', '*'), ('op', '/')):
+            left = ('bin', self.next()[1], left, self.unary())
+        return left
+
+    def unary(self) -> tuple:
+        if self.accept('-'):
+            return ('neg', self.unary())
+        return self.primary()
+
+    def primary(self) -> tuple:
+        kind, value = self.next()
+        if kind == 'number':
+            return ('lit', float(value) if '.' in value else int(value))
+        if kind == 'string':
+            return ('lit', value[1:-1].replace("''", "'"))
+        if (kind, value) == ('op', '('):
+            expression = self.expression()
+            self.expect(')')
+            return expression
+        if kind != 'name':
+            raise ValueError(f"Unexpected {value!r}")
+
+        word = value.upper()
+        if word in ('CURRENT_DATE', 'CURRENT_TIMESTAMP'):
+            return ('current_date',) if word == 'CURRENT_DATE' else ('func', 'NOW', (), False)
+        if word in ('DATE', 'TIMESTAMP') and self.peek()[0] == 'string':
+            return ('cast', self.primary(), word)
+        if word == 'NULL':
+            return ('lit', None)
+        if word == 'CAST' and self.accept('('):
+            expression = self.expression()
+            self.expect('AS')
+            type_name = self.next()[1].upper()
+            self.expect(')')
+            if type_name not in SQL_TYPES:
+                raise ValueError(f"Unsupported CAST type {type_name}")
+            return ('cast', expression, type_name)
+        if self.accept('('):
+            distinct = self.accept('DISTINCT')
+            if self.accept('*'):
+                args = (('star',),)
+            elif self.peek() == ('op', ')'):
+                args = ()
+            else:
+                args = tuple(self.expression_list())
+            self.expect(')')
+            return ('func', word, args, distinct)
+        return ('col', value.split('.')[-1].lower())
+
+
+# ---------------------------------------------------------------------------
+# Expression helpers
+# ---------------------------------------------------------------------------
+
+def children(expression: tuple) -> List[tuple]:
+    kind = expression[0]
+    if kind == 'func':
+        return list(expression[2])
+    if kind in ('cast', 'not', 'neg', 'isnull'):
+        return [expression[1]]
+    if kind == 'bin':
+        return [expression[2], expression[3]]
+    if kind == 'between':
+        return [expression[1], expression[2], expression[3]]
+    if kind == 'in':
+        return [expression[1]] + list(expression[2])
+    return []
+
+
+def rebuild(expression: tuple, mapped: List[tuple]) -> tuple:
+    kind = expression[0]
+    if kind == 'func':
+        return ('func', expression[1], tuple(mapped), expression[3])
+    if kind == 'cast':
+        return ('cast', mapped[0], expression[2])
+    if kind in ('not', 'neg'):
+        return (kind, mapped[0])
+    if kind == 'isnull':
+        return ('isnull', mapped[0], expression[2])
+    if kind == 'bin':
+        return ('bin', expression[1], mapped[0], mapped[1])
+    if kind == 'between':
+        return ('between', mapped[0], mapped[1], mapped[2], expression[4])
+    if kind == 'in':
+        return ('in', mapped[0], tuple(mapped[1:]), expression[3])
+    return expression
+
+
+def is_aggregate(expression: tuple) -> bool:
+    return expression[0] == 'func' and expression[1] in AGGREGATES
+
+
+def contains_aggregate(expression: tuple) -> bool:
+    return is_aggregate(expression) or any(contains_aggregate(child) for child in children(expression))
+
+
+def columns_of(expression: tuple) -> set:
+    if expression[0] == 'col':
+        return {expression[1]}
+    found = set()
+    for child in children(expression):
+        found |= columns_of(child)
+    return found
+
+
+def substitute(expression: tuple, replacements: Dict[tuple, tuple]) -> tuple:
+    if expression in replacements:
+        return replacements[expression]
+    return rebuild(expression, [substitute(child, replacements) for child in children(expression)])
+
+
+def _lpad(value: str, width: int, padding: str) -> str:
+    return value[:width] if len(value) >= width else (padding * width)[:width - len(value)] + value
+
+
+def fold(expression: tuple, today: date) -> tuple:
+    """Evaluate column-free subexpressions in Python, e.g. YEAR(CURRENT_DATE), so partition filters are literals"""
+    kind = expression[0]
+    if kind == 'current_date':
+        return ('lit', today)
+    mapped = [fold(child, today) for child in children(expression)]
+    expression = rebuild(expression, mapped)
+    if kind in ('col', 'lit', 'star') or not all(child[0] == 'lit' for child in mapped) or is_aggregate(expression):
+        return expression
+
+    values = [child[1] for child in mapped]
+    if kind == 'cast':
+        value, type_name = values[0], expression[2]
+        if type_name in ('VARCHAR', 'STRING'):
+            return ('lit', str(value))
+        if type_name in ('INTEGER', 'INT', 'BIGINT'):
+            return ('lit', int(value))
+        if type_name == 'DOUBLE':
+            return ('lit', float(value))
+        if type_name == 'DATE':
+            return ('lit', value if isinstance(value, date) else date.fromisoformat(str(value)))
+        return ('lit', datetime.fromisoformat(str(value)))
+    if kind == 'func':
+        name = expression[1]
+        if name in ('YEAR', 'MONTH', 'DAY', 'HOUR') and isinstance(values[0], date):
+            return ('lit', getattr(values[0], name.lower()))
+        if name == 'LPAD':
+            return ('lit', _lpad(str(values[0]), int(values[1]), str(values[2])))
+    return expression
+
+
+def to_expression(expression: tuple) -> pc.Expression:
+    """Translate a parsed expression into a pyarrow compute expression"""
+    kind = expression[0]
+    if kind == 'col':
+        return ds.field(expression[1])
+    if kind == 'lit':
+        value = expression[1]
+        if isinstance(value, datetime):
+            return pc.scalar(pa.scalar(value, pa.timestamp('ms')))
+        return pc.scalar(value)
+    if kind == 'cast':
+        return to_expression(expression[1]).cast(SQL_TYPES[expression[2]])
+    if kind == 'not':
+        return ~to_expression(expression[1])
+    if kind == 'neg':
+        return pc.negate(to_expression(expression[1]))
+    if kind == 'isnull':
+        test = to_expression(expression[1]).is_null()
+        return ~test if expression[2] else test
+    if kind == 'between':
+        value = to_expression(expression[1])
+        test = (value >= to_expression(expression[2])) & (value <= to_expression(expression[3]))
+        return ~test if expression[4] else test
+    if kind == 'in':
+        if not all(item[0] == 'lit' for item in expression[2]):
+            raise ValueError("IN lists must contain literals")
+        test = pc.is_in(to_expression(expression[1]), value_set=pa.array([item[1] for item in expression[2]]))
+        return ~test if expression[3] else test
+    if kind == 'bin':
+        op, left, right = expression[1], to_expression(expression[2]), to_expression(expression[3])
+        operators = {
+            'AND': lambda: left & right, 'OR': lambda: left | right,
+            '=': lambda: left == right, '<>': lambda: left != right,
+            '<': lambda: left < right, '<=': lambda: left <= right,
+            '>': lambda: left > right, '>=': lambda: left >= right,
+            '+': lambda: pc.add(left, right), '-': lambda: pc.subtract(left, right),
+            '*': lambda: pc.multiply(left, right), '/': lambda: pc.divide(left, right),
+            '||': lambda: pc.binary_join_element_wise(left, right, ''),
+        }
+        return operators[op]()
+    if kind == 'func':
+        name, args = expression[1], [to_expression(arg) for arg in expression[2]]
+        functions = {
+            'YEAR': lambda: pc.year(args[0]), 'MONTH': lambda: pc.month(args[0]),
+            'DAY': lambda: pc.day(args[0]), 'HOUR': lambda: pc.hour(args[0]),
+            'LOWER': lambda: pc.utf8_lower(args[0]), 'UPPER': lambda: pc.utf8_upper(args[0]),
+            'ABS': lambda: pc.abs(args[0]), 'COALESCE': lambda: pc.coalesce(*args),
+            'ROUND': lambda: pc.round(args[0], ndigits=expression[2][1][1] if len(args) > 1 else 0),
+            'LPAD': lambda: pc.utf8_lpad(args[0], width=expression[2][1][1], padding=expression[2][2][1]),
+        }
+        if name in functions:
+            return functions[name]()
+        raise ValueError(f"Unsupported function {name}")
+    raise ValueError(f"Unsupported expression {kind}")
+
+
+def display_name(expression: tuple, position: int) -> str:
+    return expression[1] if expression[0] == 'col' else f'_col{position}'
+
+
+# ---------------------------------------------------------------------------
+# Tables, scans and scan accounting
+# ---------------------------------------------------------------------------
+
+class LocalTable:
+    """One Glue table's files under the bucket root, discovered from the key layout"""
+
+    def __init__(self, filesystem: pafs.FileSystem, base: str, name: str, data_partition_keys: List[str]):
+        if name not in TABLES:
+            raise ValueError(f"Unknown table {name!r}; expected one of {sorted(TABLES)}")
+        prefix, self.partition_keys = TABLES[name]
+        self.partition_keys = self.partition_keys or data_partition_keys
+        self.name = name
+        self.location = f"{base.rstrip('/')}/{prefix}".rstrip('/')
+        self.data_schema = table_schema(name)
+        self.partition_schema = pa.schema([(key, pa.string()) for key in self.partition_keys])
+
+        # Only keys matching the table's own layout, so weather_data skips rollups/, _state/, ...
+        layout = re.compile('^' + '/'.join(rf'{key}=[^/]+' for key in self.partition_keys) + r'/[^/]+\.parquet$')
+        self.files = []
+        self.total_bytes = 0
+        try:
+            infos = filesystem.get_file_info(pafs.FileSelector(self.location, recursive=True))
+        except FileNotFoundError:
+            infos = []
+        for info in infos:
+            relative = info.path[len(self.location):].lstrip('/')
+            if info.type == pafs.FileType.File and layout.match(relative):
+                self.files.append(info.path)
+                self.total_bytes += info.size
+        self.dataset = ds.dataset(
+            sorted(self.files), schema=pa.unify_schemas([self.data_schema, self.partition_schema]),
+            format='parquet', filesystem=filesystem,
+            partitioning=ds.partitioning(self.partition_schema, flavor='hive'), partition_base_dir=self.location,
+        )
+
+    @property
+    def columns(self) -> List[str]:
+        return self.data_schema.names + self.partition_keys
+
+    def partitions(self) -> List[str]:
+        return sorted({path[len(self.location):].lstrip('/').rsplit('/', 1)[0] for path in self.files})
+
+
+def table_schema(name: str) -> pa.Schema:
+    if name == 'weather_data':
+        from utils import get_weather_schema
+        return get_weather_schema()
+    if name == 'weather_forecast':
+        from forecast import get_forecast_schema
+        return get_forecast_schema()
+    from rollups import get_rollup_schema
+    return get_rollup_schema()
+
+
+def scan(table: LocalTable, columns: List[str], filter_expression: Optional[pc.Expression]) -> Tuple[pa.Table, Dict[str, Any]]:
+    """
+    Read the columns a query needs, with partition and row-group pruning
+
+    Args:
+        table: Table to scan
+        columns: Columns the query references
+        filter_expression: WHERE clause, or None
+
+    Returns:
+        (scanned rows, scan statistics)
+    """
+    file_columns = [name for name in table.data_schema.names if name in columns]
+    stats = {'files_total': len(table.files), 'files_opened': 0, 'row_groups_total': 0,
+             'row_groups_read': 0, 'bytes_scanned': 0, 'bytes_total': table.total_bytes}
+
+    fragments = list(table.dataset.get_fragments(filter=filter_expression))
+    for fragment in fragments:
+        stats['files_opened'] += 1
+        metadata = fragment.metadata
+        stats['row_groups_total'] += metadata.num_row_groups
+        if filter_expression is not None:
+            kept = [piece.row_groups[0].id for piece in fragment.split_by_row_group(filter_expression, table.dataset.schema)]
+        else:
+            kept = range(metadata.num_row_groups)
+        for index in kept:
+            row_group = metadata.row_group(index)
+            stats['row_groups_read'] += 1
+            for position in range(row_group.num_columns):
+                chunk = row_group.column(position)
+                if chunk.path_in_schema in file_columns:
+                    stats['bytes_scanned'] += chunk.total_compressed_size
+
+    scanned = ds.FileSystemDataset(fragments, table.dataset.schema, table.dataset.format, table.dataset.filesystem).to_table(
+        columns=[name for name in table.columns if name in columns], filter=filter_expression
+    ) if fragments else table.dataset.schema.empty_table().select([name for name in table.columns if name in columns])
+    return scanned, stats
+
+
+# ---------------------------------------------------------------------------
+# Query execution
+# ---------------------------------------------------------------------------
+
+def _evaluate(table: pa.Table, expressions: Dict[str, tuple]) -> pa.Table:
+    """Evaluate named expressions over an in-memory table"""
+    if not expressions:
+        return pa.table({})
+    return ds.dataset(table).to_table(columns={name: to_expression(expression) for name, expression in expressions.items()})
+
+
+def run_select(statement: Dict[str, Any], table: LocalTable, today: date) -> Tuple[pa.Table, Dict[str, Any]]:
+    items = []
+    for expression, alias in statement['items']:
+        if expression == ('star',):
+            items.extend((('col', name), name) for name in table.columns)
+        else:
+            items.append((fold(expression, today), alias))
+    names = [alias or display_name(expression, position) for position, (expression, alias) in enumerate(items)]
+    aliases = {name: expression for name, (expression, _) in zip(names, items)}
+
+    where = fold(statement['where'], today) if statement['where'] else None
+    # GROUP BY and ORDER BY may name a select-list alias
+    group_by = [aliases.get(expr[1], expr) if expr[0] == 'col' and expr[1] not in table.columns else expr
+                for expr in (fold(e, today) for e in statement['group_by'])]
+    order_by = [(fold(expression, today), descending) for expression, descending in statement['order_by']]
+
+    referenced = set()
+    for expression in [item for item, _ in items] + group_by + [e for e, _ in order_by] + ([where] if where else []):
+        referenced |= columns_of(expression)
+    unknown = referenced - set(table.columns) - {alias for _, alias in items if alias}
+    if unknown:
+        raise ValueError(f"Unknown column(s) {sorted(unknown)} in table {table.name}")
+
+    scanned, stats = scan(table, sorted(referenced & set(table.columns)), to_expression(where) if where else None)
+
+    if group_by or any(contains_aggregate(expression) for expression, _ in items):
+        # Group keys and aggregate arguments are computed first, then the select list on top
+        replacements: Dict[tuple, tuple] = {}
+        pre: Dict[str, tuple] = {}
+        for position, key in enumerate(group_by):
+            pre[f'_key{position}'] = key
+            replacements[key] = ('col', f'_key{position}')
+        aggregations = []
+
+        def collect(expression: tuple) -> None:
+            if is_aggregate(expression):
+                if expression not in replacements:
+                    position = len(aggregations)
+                    argument = expression[2][0] if expression[2] else ('star',)
+                    pre[f'_arg{position}'] = ('lit', 1) if argument == ('star',) else argument
+                    function = 'count_distinct' if expression[3] else AGGREGATES[expression[1]]
+                    aggregations.append((f'_arg{position}', function))
+                    replacements[expression] = ('col', f'_arg{position}_{function}')
+                return
+            for child in children(expression):
+                collect(child)
+
+        for expression, _ in items:
+            collect(expression)
+        for expression, _ in order_by:
+            if not (expression[0] == 'col' and expression[1] in names):
+                collect(expression)
+
+        grouped = _evaluate(scanned, pre).group_by([f'_key{i}' for i in range(len(group_by))]).aggregate(aggregations)
+        source = grouped
+        items = [(substitute(expression, replacements), alias) for expression, alias in items]
+        order_by = [(substitute(expression, replacements), descending) for expression, descending in order_by]
+    else:
+        source = scanned
+
+    outputs = {f'_out{position}': expression for position, (expression, _) in enumerate(items)}
+    sort_keys = []
+    for position, (expression, descending) in enumerate(order_by):
+        if expression[0] == 'col' and expression[1] in names:
+            column = f'_out{names.index(expression[1])}'
+        else:
+            column = f'_order{position}'
+            outputs[column] = expression
+        sort_keys.append((column, 'descending' if descending else 'ascending'))
+
+    result = _evaluate(source, outputs)
+    if sort_keys:
+        result = result.sort_by(sort_keys)
+    if statement['limit'] is not None:
+        result = result.slice(0, statement['limit'])
+    result = result.select([f'_out{position}' for position in range(len(items))]).rename_columns(names)
+    return result, stats
+
+
+def run_statement(sql: str, filesystem: pafs.FileSystem, base: str, today: date,
+                  data_partition_keys: Optional[List[str]] = None) -> Tuple[pa.Table, Optional[Dict[str, Any]]]:
+    """
+    Run one statement
+
+    Args:
+        sql: Statement text
+        filesystem: pyarrow filesystem holding the bucket
+        base: Bucket root path on that filesystem
+        today: Value of CURRENT_DATE
+        data_partition_keys: weather_data partition keys (defaults to the configured key layout)
+
+    Returns:
+        (result table, scan statistics or None for metadata statements)
+    """
+    statement = Parser(sql).parse()
+    table = LocalTable(filesystem, base, statement['table'], data_partition_keys or layout_partition_keys())
+    if statement['kind'] == 'show_partitions':
+        return pa.table({'partition': table.partitions()}), None
+    if statement['kind'] == 'describe':
+        return pa.table({
+            'col_name': table.columns,
+            'data_type': [str(field.type) for field in table.data_schema] + ['string'] * len(table.partition_keys),
+            'comment': [''] * len(table.data_schema) + ['partition key'] * len(table.partition_keys),
+        }), None
+    return run_select(statement, table, today)
+
+
+def split_statements(text: str) -> List[Tuple[str, str]]:
+    """Split a SQL file into (title, statement) pairs; the title is the first line of the comment block before it"""
+    statements = []
+    current: List[str] = []
+    title = ''
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not current and stripped.startswith('--'):
+            title = title or stripped.lstrip('-').strip()
+            continue
+        if not stripped and not current:
+            title = ''
+            continue
+        current.append(line)
+        if stripped.endswith(';'):
+            statements.append((title, '\n'.join(current)))
+            current, title = [], ''
+    if any(line.strip() for line in current):
+        statements.append((title, '\n'.join(current)))
+    return statements
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            return f"{size:,.0f} {unit}" if unit == 'B' else f"{size:,.1f} {unit}"
+        size /= 1024
+
+
+def print_table(table: pa.Table, max_rows: int) -> None:
+    rows = table.slice(0, max_rows).to_pylist()
+    cells = [[('NULL' if row[name] is None else f"{row[name]:.4g}" if isinstance(row[name], float) else str(row[name]))
+              for name in table.column_names] for row in rows]
+    widths = [max([len(name)] + [len(row[i]) for row in cells]) for i, name in enumerate(table.column_names)]
+    print('  '.join(name.ljust(width) for name, width in zip(table.column_names, widths)))
+    print('  '.join('-' * width for width in widths))
+    for row in cells:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
+    if table.num_rows > max_rows:
+        print(f"... {table.num_rows - max_rows} more rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sql', nargs='?', help='Statement to run (or use --file)')
+    parser.add_argument('--root', required=True,
+                        help='Bucket root: a local directory (e.g. <local-root>/<bucket>) or s3://bucket')
+    parser.add_argument('--file', help='SQL file with several statements, e.g. athena_queries.sql')
+    parser.add_argument('--query', action='append', help='Only run statements whose title starts with this (e.g. 7)')
+    parser.add_argument('--today', help='Value of CURRENT_DATE (YYYY-MM-DD, default: today in UTC)')
+    parser.add_argument('--max-rows', type=int, default=20, help='Result rows to print')
+    parser.add_argument('--key-layout', default=KEY_LAYOUT, help='Key layout of weather_data (default: KEY_LAYOUT)')
+    parser.add_argument('--key-shards', type=int, default=KEY_SHARDS,
+                        help='Hash prefixes of weather_data (default: KEY_SHARDS)')
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file) as f:
+            statements = split_statements(f.read())
+        if args.query:
+            statements = [(title, sql) for title, sql in statements
+                          if any(title.startswith(f'{prefix}.') or title.startswith(prefix) for prefix in args.query)]
+    elif args.sql:
+        statements = [('', args.sql)]
+    else:
+        parser.error('give a statement or --file')
+
+    root = args.root if '://' in args.root else os.path.abspath(args.root)
+    filesystem, base = pafs.FileSystem.from_uri(root)
+    today = date.fromisoformat(args.today) if args.today else datetime.utcnow().date()
+    data_keys = layout_partition_keys(args.key_layout, args.key_shards)
+
+    totals = {'files_opened': 0, 'bytes_scanned': 0}
+    failures = 0
+    for title, sql in statements:
+        print(f"== {title or sql.strip().splitlines()[0]}")
+        started = time.perf_counter()
+        try:
+            result, stats = run_statement(sql, filesystem, base, today, data_keys)
+        except Exception as e:
+            print(f"Error: {str(e)}\n")
+            failures += 1
+            continue
+        elapsed = time.perf_counter() - started
+        print_table(result, args.max_rows)
+        if stats:
+            totals['files_opened'] += stats['files_opened']
+            totals['bytes_scanned'] += stats['bytes_scanned']
+            print(f"-- {result.num_rows} rows in {elapsed:.3f} s; files opened {stats['files_opened']} of "
+                  f"{stats['files_total']}, row groups read {stats['row_groups_read']} of {stats['row_groups_total']}, "
+                  f"scanned {format_bytes(stats['bytes_scanned'])} of {format_bytes(stats['bytes_total'])}")
+        print()
+
+    if len(statements) > 1:
+        print(f"Total: {len(statements) - failures} statements, {totals['files_opened']} files opened, "
+              f"{format_bytes(totals['bytes_scanned'])} scanned, {failures} failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,24 +2,29 @@
 """
 Local testing script for the weather ingestion Lambda function
 Run this to test the Lambda function locally before deploying
+
+Runs fully offline: the Open-Meteo API is replayed from a recorded response
+(benchmarks/fixtures/) and S3 uploads go to a temporary directory.
+For performance numbers use benchmarks/e2e_benchmark.py.
+
+After the single-site run, regression checks cover edge cases the happy path
+does not reach (sites sharing coordinates, repeated SQS messages, a throttled
+circuit breaker probe, an interrupted compaction).
 """
 
+import io
 import os
 import sys
 import json
+import shutil
+import tempfile
 
-# Add lambda directory to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'lambda', 'weather_ingestion'))
-from lambda_function import lambda_handler
+# Add benchmark harness (and through it the lambda directory) to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'benchmarks'))
+from harness import MockContext, ReplayServer, load_lambda
+from local_s3 import LocalS3Client
 
-# Set up environment variables for local testing
-# Open-Meteo doesn't require API key
-os.environ['WEATHER_API_URL'] = 'https://api.open-meteo.com/v1/forecast'
-os.environ['S3_BUCKET'] = 'test-weather-bucket'  # Will fail on S3 upload, but tests API call
-os.environ['LATITUDE'] = '51.5074'  # London
-os.environ['LONGITUDE'] = '-0.1278'  # London
-os.environ['CITY'] = 'London'
-os.environ['COUNTRY_CODE'] = 'GB'
+BUCKET = 'test-weather-bucket'
 
 # Mock event
 event = {
@@ -29,40 +34,180 @@ event = {
     'longitude': -0.1278
 }
 
-# Mock context (minimal implementation)
-class MockContext:
-    def __init__(self):
-        self.function_name = 'test-weather-ingestion'
-        self.function_version = '$LATEST'
-        self.memory_limit_in_mb = 256
-        self.invoked_function_arn = 'arn:aws:lambda:us-east-1:123456789012:function:test'
-        self.aws_request_id = 'test-request-id'
+
+def read_rows(s3_client, location: str):
+    """Rows of one uploaded Parquet object"""
+    import pyarrow.parquet as pq
+    key = location.split(f's3://{BUCKET}/', 1)[1]
+    return pq.read_table(io.BytesIO(s3_client.get_object(Bucket=BUCKET, Key=key)['Body'].read())).to_pylist()
+
+
+def check_duplicate_coordinates(server) -> None:
+    """Two sites sharing coordinates must not push a later site out of the batch"""
+    root = tempfile.mkdtemp(prefix='weather-local-test-')
+    try:
+        s3_client = LocalS3Client(root)
+        lambda_function = load_lambda(server.url, s3_client, BUCKET, detect_changes=True)
+        locations = [
+            {'city': 'Site A', 'country_code': 'GB', 'latitude': 1.0, 'longitude': 1.0},
+            {'city': 'Site B', 'country_code': 'GB', 'latitude': 1.0, 'longitude': 1.0},
+            {'city': 'Site C', 'country_code': 'GB', 'latitude': 20.0, 'longitude': 20.0},
+        ]
+        result = lambda_function.lambda_handler({'locations': locations}, MockContext())
+        assert result['statusCode'] == 200, result
+        body = json.loads(result['body'])
+        cities = sorted(row['city'] for row in read_rows(s3_client, body['s3_location']))
+        assert cities == ['Site A', 'Site B', 'Site C'], f"written: {cities}"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def check_fanout_duplicate_messages(server) -> None:
+    """A work item delivered twice in one SQS batch must not drop the items after it"""
+    root = tempfile.mkdtemp(prefix='weather-local-test-')
+    try:
+        s3_client = LocalS3Client(root)
+        load_lambda(server.url, s3_client, BUCKET, detect_changes=True)
+        import fanout
+        import latest_index
+        site_a = {'city': 'Queue A', 'country_code': 'GB', 'latitude': 2.0, 'longitude': 2.0}
+        site_c = {'city': 'Queue C', 'country_code': 'GB', 'latitude': 30.0, 'longitude': 30.0}
+        records = [{'messageId': message_id, 'body': json.dumps(loc)}
+                   for message_id, loc in (('m1', site_a), ('m2', site_a), ('m3', site_c))]
+        result = fanout.consume_handler({'Records': records}, MockContext())
+        assert result['batchItemFailures'] == [], result
+        index = latest_index.get_latest(s3_client, BUCKET)
+        missing = [loc['city'] for loc in (site_a, site_c) if latest_index.find_location(index, loc['city']) is None]
+        assert not missing, f"missing from the latest index: {missing}"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def check_breaker_probe_throttled(server) -> None:
+    """A half-open probe answered with 429 must not leave the circuit stuck once the API recovers"""
+    import time
+    import http_client
+    breaker = http_client.CircuitBreaker(1, 0.05)
+    saved = http_client.circuit_breaker, http_client.rate_limiter, http_client.HTTP_MAX_RETRIES
+    http_client.circuit_breaker, http_client.rate_limiter, http_client.HTTP_MAX_RETRIES = breaker, None, 0
+    try:
+        breaker.record_failure()
+        time.sleep(0.1)
+        params = {'latitude': 1.0, 'longitude': 1.0, 'current': 'temperature_2m'}
+        with ReplayServer(rate_limit_per_minute=1) as throttled:
+            try:
+                http_client.get_json(throttled.url, params)
+                raise AssertionError("throttled probe did not fail")
+            except http_client.WeatherAPIError:
+                pass
+        http_client.get_json(server.url, params)
+        assert breaker.state == http_client.CircuitBreaker.CLOSED, f"breaker is {breaker.state}"
+    finally:
+        http_client.circuit_breaker, http_client.rate_limiter, http_client.HTTP_MAX_RETRIES = saved
+
+
+def check_compaction_rerun_after_failed_delete(server) -> None:
+    """Inputs a failed delete left behind must not be merged into the compacted file again"""
+    from datetime import datetime
+    import compaction
+    from utils import convert_to_parquet, create_batch_s3_key
+
+    class FailingDeletes(LocalS3Client):
+        def delete_objects(self, Bucket, Delete, **kwargs):
+            # The first key stays behind, as with a per-key DeleteObjects error
+            first, *rest = Delete['Objects']
+            super().delete_objects(Bucket=Bucket, Delete={'Objects': rest})
+            return {'Errors': [{'Key': first['Key'], 'Code': 'InternalError', 'Message': 'injected'}]}
+
+    root = tempfile.mkdtemp(prefix='weather-local-test-')
+    try:
+        hour = datetime(2024, 1, 1, 5)
+        prefix = 'year=2024/month=01/day=01/hour=05/'
+        s3_client = LocalS3Client(root)
+        for minute in range(3):
+            record = {'timestamp': hour.replace(minute=minute).isoformat(), 'city': 'London', 'country_code': 'GB'}
+            s3_client.put_object(Bucket=BUCKET, Key=create_batch_s3_key(1, hour.replace(minute=minute)),
+                                 Body=convert_to_parquet([record]))
+        failed = False
+        try:
+            compaction.compact_prefix(FailingDeletes(root), BUCKET, prefix)
+        except Exception:
+            failed = True
+        assert failed, "delete errors were ignored"
+        result = compaction.compact_prefix(s3_client, BUCKET, prefix)
+        keys = compaction.list_parquet_keys(s3_client, BUCKET, prefix)
+        rows = sum(len(read_rows(s3_client, f's3://{BUCKET}/{key}')) for key in keys)
+        assert len(keys) == 1 and rows == 3, f"{len(keys)} files, {rows} rows after re-run: {result}"
+        assert not compaction._load_manifest(s3_client, BUCKET, prefix), "manifest left behind"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+REGRESSION_CHECKS = [
+    ('Batch with duplicate coordinates writes every site', check_duplicate_coordinates),
+    ('SQS batch with a repeated message writes every item', check_fanout_duplicate_messages),
+    ('Throttled half-open probe does not wedge the circuit breaker', check_breaker_probe_throttled),
+    ('Compaction re-run after a failed delete keeps rows once', check_compaction_rerun_after_failed_delete),
+]
+
 
 if __name__ == '__main__':
     print("Testing Weather Ingestion Lambda Function Locally")
     print("=" * 50)
-    print("Using Open-Meteo API (no API key required)")
+    print("Using a local replay of the Open-Meteo API and a filesystem S3 stand-in")
     print(f"City: {event['city']}, Country: {event['country_code']}")
     print(f"Coordinates: {event['latitude']}, {event['longitude']}")
     print()
-    
+
+    root = tempfile.mkdtemp(prefix='weather-local-test-')
     try:
-        context = MockContext()
-        result = lambda_handler(event, context)
-        
-        print("Lambda Execution Result:")
-        print(json.dumps(result, indent=2))
-        
-        if result['statusCode'] == 200:
-            print("\n✅ Test passed! Lambda function executed successfully")
-            print("Note: S3 upload will fail in local test (expected)")
-        else:
-            print("\n❌ Test failed!")
-            sys.exit(1)
-            
+        with ReplayServer() as server:
+            s3_client = LocalS3Client(root)
+            lambda_handler = load_lambda(server.url, s3_client, BUCKET).lambda_handler
+
+            context = MockContext()
+            result = lambda_handler(event, context)
+
+            print("Lambda Execution Result:")
+            print(json.dumps(result, indent=2))
+
+            if result['statusCode'] != 200:
+                print("\n❌ Test failed!")
+                sys.exit(1)
+
+            # Read back the uploaded object to make sure it is valid Parquet
+            import pyarrow.parquet as pq
+            key = json.loads(result['body'])['s3_location'].split(f's3://{BUCKET}/', 1)[1]
+            table = pq.read_table(io.BytesIO(s3_client.get_object(Bucket=BUCKET, Key=key)['Body'].read()))
+            print(f"\nUploaded {key}: {table.num_rows} row(s), {table.num_columns} columns")
+
+            # The latest-observation index should now answer for the city with one GET
+            import latest_index
+            latest = latest_index.find_location(latest_index.get_latest(s3_client, BUCKET), event['city'],
+                                                event['country_code'])
+            if latest is None:
+                print("\n❌ Test failed! City missing from the latest index")
+                sys.exit(1)
+            print(f"Latest index: {latest['city']} at {latest['timestamp']}, {latest['temperature']}°C")
+
+            print("\nRegression checks:")
+            failed = 0
+            for name, check in REGRESSION_CHECKS:
+                try:
+                    check(server)
+                    print(f"  ok    {name}")
+                except Exception as e:
+                    failed += 1
+                    print(f"  FAIL  {name}: {str(e)}")
+            if failed:
+                print(f"\n❌ Test failed! {failed} regression check(s) failed")
+                sys.exit(1)
+        print("\n✅ Test passed! Lambda function executed successfully")
+
     except Exception as e:
         print(f"\n❌ Error during execution: {str(e)}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
-
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Snapshot test for the CDK stack
+Run this after changing infrastructure/stack.py to review what cdk deploy would change
+
+Synthesizes WeatherPipelineStack for each trigger topology and compares the
+CloudFormation templates with infrastructure/snapshots/. Runs offline: Lambda
+bundling is skipped and asset hashes are masked, so editing Lambda code alone
+does not change a snapshot.
+
+    python test_stack_synth.py            # compare with the snapshots
+    python test_stack_synth.py --update   # rewrite them after an intended change
+"""
+
+import difflib
+import json
+import os
+import re
+import sys
+
+os.environ.setdefault('JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION', '1')
+# Settings the stack also reads from the environment; the snapshots use context only
+for name in ('FANOUT', 'KEY_LAYOUT', 'KEY_SHARDS', 'LATEST_API', 'LATITUDE', 'LOCATIONS', 'LOCATIONS_KEY',
+             'LONGITUDE', 'PARTITION_REGISTRATION', 'TABLE_FORMAT'):
+    os.environ.pop(name, None)
+
+import aws_cdk as cdk
+from aws_cdk.assertions import Template
+
+from infrastructure.stack import WeatherPipelineStack
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'infrastructure', 'snapshots')
+
+SAMPLE_LOCATIONS = json.dumps([
+    {'city': 'London', 'country_code': 'GB', 'latitude': 51.5074, 'longitude': -0.1278},
+    {'city': 'Paris', 'country_code': 'FR', 'latitude': 48.8566, 'longitude': 2.3522},
+])
+
+# Snapshot name -> cdk context (-c key=value)
+CONFIGURATIONS = {
+    'rule': {},
+    'sqs': {'fanout': 'sqs', 'locations': SAMPLE_LOCATIONS},
+    'stepfunctions-inline': {'fanout': 'stepfunctions', 'locations_key': '_config/locations.json'},
+    'stepfunctions-distributed': {
+        'fanout': 'stepfunctions',
+        'locations_key': '_config/locations.json',
+        'sfn_map': 'distributed',
+        'sfn_max_concurrency': '200',
+        'sfn_shard_size': '100',
+        'sfn_shard_memory': '1024',
+    },
+    'iceberg': {'table_format': 'iceberg'},
+}
+
+ASSET_HASH = re.compile(r'\b[0-9a-f]{64}\b')
+
+
+def synthesize(context: dict) -> str:
+    """Normalized template JSON for one configuration"""
+    # Skip Docker bundling of the Lambda package; its hash is masked anyway
+    app = cdk.App(context={'aws:cdk:bundling-stacks': [], **context})
+    stack = WeatherPipelineStack(app, 'WeatherPipelineStack',
+                                 env=cdk.Environment(account='123456789012', region='us-east-1'))
+    template = json.dumps(Template.from_stack(stack).to_json(), indent=2, sort_keys=True)
+    return ASSET_HASH.sub('<asset-hash>', template) + '\n'
+
+
+if __name__ == '__main__':
+    update = '--update' in sys.argv[1:]
+    print("Testing CDK Stack Synthesis Against Snapshots")
+    print("=" * 50)
+
+    failed = []
+    for name, context in CONFIGURATIONS.items():
+        path = os.path.join(SNAPSHOT_DIR, f'{name}.json')
+        template = synthesize(context)
+        if update:
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            with open(path, 'w', newline='\n') as f:
+                f.write(template)
+            print(f"Updated {name}")
+            continue
+        if not os.path.exists(path):
+            print(f"❌ {name}: no snapshot (run with --update)")
+            failed.append(name)
+            continue
+        with open(path) as f:
+            expected = f.read()
+        if expected == template:
+            print(f"✅ {name}")
+            continue
+        failed.append(name)
+        print(f"❌ {name}: template differs from the snapshot")
+        diff = list(difflib.unified_diff(expected.splitlines(), template.splitlines(),
+                                         f'snapshots/{name}.json', 'synthesized', lineterm=''))
+        print('\n'.join(diff[:80]))
+        if len(diff) > 80:
+            print(f"... {len(diff) - 80} more diff lines")
+
+    if failed:
+        print()
+        print(f"{len(failed)} snapshot(s) differ; if the change is intended run: python test_stack_synth.py --update")
+        sys.exit(1)